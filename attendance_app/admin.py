@@ -1,14 +1,74 @@
 # attendance_app/admin.py
 
-from django.contrib import admin
+import io
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
 from .models import User, Subject, StudentProfile, TeacherProfile, Attendance, UserSkill, UserProject, Performance
+from .services import account_provisioning, attendance_writer
+
+
+class RosterForm(forms.Form):
+    roster = forms.FileField(help_text='CSV with roll_number, full_name and optionally username, password, class_name, email, phone_number, subjects')
+    default_password = forms.CharField(required=False, widget=forms.PasswordInput, help_text='Used for rows without a password')
+
+
+@admin.register(Subject)
+class SubjectAdmin(admin.ModelAdmin):
+    actions = ['provision_students']
+
+    @admin.action(description='Create students from a roster and enrol them in the selected subjects')
+    def provision_students(self, request, queryset):
+        form = RosterForm(request.POST, request.FILES) if 'apply' in request.POST else RosterForm()
+        if form.is_valid():
+            roster = io.TextIOWrapper(form.cleaned_data['roster'].file, encoding='utf-8-sig', newline='')
+            try:
+                entries, rejected = account_provisioning.read_roster(roster, form.cleaned_data['default_password'])
+            except (ValueError, UnicodeDecodeError) as e:
+                self.message_user(request, f'Could not read the roster: {e}', messages.ERROR)
+                return None
+
+            limit = settings.PROVISIONING_ADMIN_MAX_STUDENTS
+            if len(entries) > limit:
+                self.message_user(request, (
+                    f'This roster has {len(entries)} new students; the admin creates at most {limit} at a time. '
+                    f'Use "manage.py provision_students" for larger intakes.'
+                ), messages.ERROR)
+                return None
+
+            # Hashed in this process: a worker pool doesn't belong in a web request
+            created = account_provisioning.provision_students(entries, queryset.values_list('id', flat=True), workers=1)
+            self.message_user(request, f'{created} students created.', messages.SUCCESS)
+            for line, roll_number, reason in rejected[:20]:
+                self.message_user(request, f'Line {line} ({roll_number or "no roll number"}): {reason}', messages.WARNING)
+            if len(rejected) > 20:
+                self.message_user(request, f'...and {len(rejected) - 20} more rejected rows.', messages.WARNING)
+            return None
+
+        return TemplateResponse(request, 'admin/attendance_app/subject/provision_students.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Create students from a roster',
+            'opts': self.model._meta,
+            'form': form,
+            'subjects': queryset,
+            'max_students': settings.PROVISIONING_ADMIN_MAX_STUDENTS,
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+@admin.register(Attendance)
+class AttendanceAdmin(admin.ModelAdmin):
+    def delete_queryset(self, request, queryset):
+        # Through the writer, which updates the rollups, sync log and dashboards (as Attendance.delete() does)
+        attendance_writer.delete_marks(queryset.values_list('student_id', 'subject_id', 'date'))
+
 
 # Register your models here to make them accessible in the admin panel.
 admin.site.register(User)
-admin.site.register(Subject)
 admin.site.register(StudentProfile)
 admin.site.register(TeacherProfile)
-admin.site.register(Attendance)
 admin.site.register(UserSkill)
 admin.site.register(UserProject)
-admin.site.register(Performance)
\ No newline at end of file
+admin.site.register(Performance)
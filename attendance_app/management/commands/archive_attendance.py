@@ -0,0 +1,32 @@
+# TO RUN: python manage.py archive_attendance "2025 Odd Semester" 2025-07-01 2025-12-31 [--dry-run]
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.services import attendance_archive
+
+
+class Command(BaseCommand):
+    help = 'Moves the attendance marks of a closed academic period from Attendance into ArchivedAttendance.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Name of the period, e.g. "2025 Odd Semester"')
+        parser.add_argument('start', type=date.fromisoformat, help='First day of the period (YYYY-MM-DD)')
+        parser.add_argument('end', type=date.fromisoformat, help='Last day of the period (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Marks moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the marks that would be moved')
+
+    def handle(self, *args, **options):
+        try:
+            moved = attendance_archive.archive_period(
+                options['name'], options['start'], options['end'],
+                chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            self.stdout.write(f"{moved} marks would be archived.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Archived {moved} marks for {options['name']}."))
@@ -0,0 +1,237 @@
+# TO RUN: python manage.py benchmark_api [--seed-data --students 2000] [--concurrency 8 --requests 200] [--compare benchmarks/<previous>.json]
+
+import io
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from attendance_app import views
+from attendance_app.models import Approval, StudentFace, StudentProfile, TeacherProfile
+from attendance_app.services import dashboard_cache
+
+PREFIX = 'bench'
+ENDPOINTS = ['teacher_dashboard', 'student_dashboard', 'sheet', 'bulk_update', 'approvals', 'face_recognize']
+SAMPLE_SIZE = 200 # Users each endpoint picks from at random
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (160, 160), (128, 128, 128)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives the main API endpoints in-process at a configurable concurrency against the local database and '
+        'reports requests/sec, p50/p95/p99 latency and SQL queries per request. Results are saved as JSON '
+        'so runs can be compared across commits. Face recognition uses a stubbed embedder.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-data', action='store_true', help=f"Generate a '{PREFIX}' dataset first (see generate_load_data)")
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--teachers', type=int, default=40)
+        parser.add_argument('--subjects', type=int, default=40)
+        parser.add_argument('--days', type=int, default=120)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--warm-cache', action='store_true', help='Keep dashboard cache entries between requests')
+        parser.add_argument('--output', default=os.path.join(settings.BASE_DIR, 'benchmarks'), help='Directory for the results file (the default is git-ignored)')
+        parser.add_argument('--compare', help='A previous results file to compare against')
+        parser.add_argument('--force', action='store_true', help='Run even with DEBUG off (the benchmark writes attendance)')
+
+    # --- Fixtures ---
+    def load_fixtures(self):
+        rng = random.Random(self.seed)
+        teachers = list(TeacherProfile.objects.filter(user__username__startswith=f'{PREFIX}-').select_related('user')[:SAMPLE_SIZE])
+        students = list(StudentProfile.objects.filter(user__username__startswith=f'{PREFIX}-').select_related('user')[:SAMPLE_SIZE])
+        if not teachers or not students:
+            raise CommandError(f"No '{PREFIX}' dataset found; run with --seed-data first.")
+
+        Teaching = TeacherProfile.subjects.through
+        self.teaching = [
+            (teacher, subject_id) for teacher in teachers
+            for subject_id in Teaching.objects.filter(teacherprofile_id=teacher.pk).values_list('subject_id', flat=True)
+        ]
+        Enrolment = StudentProfile.subjects.through
+        self.enrolled = {}
+        for _, subject_id in self.teaching:
+            self.enrolled[subject_id] = list(
+                Enrolment.objects.filter(subject_id=subject_id).values_list('studentprofile_id', flat=True)[:60]
+            )
+        self.teachers, self.students = teachers, students
+        self.approvers = [teacher for teacher in teachers if Approval.objects.filter(teacher=teacher).exists()] or teachers
+        self.embeddings = [json.loads(encoding) for encoding in StudentFace.objects.values_list('face_encoding', flat=True)[:SAMPLE_SIZE]]
+        self.image = _png_bytes()
+        self.rng = rng
+
+    # --- One request per endpoint ---
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def call(self, endpoint):
+        rng = self.rng
+        if endpoint == 'teacher_dashboard':
+            return self.client_for(rng.choice(self.teachers).user).get('/api/teacher/dashboard/')
+        if endpoint == 'student_dashboard':
+            return self.client_for(rng.choice(self.students).user).get('/api/student/dashboard/')
+        if endpoint == 'approvals':
+            return self.client_for(rng.choice(self.approvers).user).get('/api/teacher/approvals/')
+
+        teacher, subject_id = rng.choice(self.teaching)
+        client = self.client_for(teacher.user)
+        day = date.today() - timedelta(days=rng.randrange(1, 28))
+        if endpoint == 'sheet':
+            return client.get('/api/teacher/attendance/sheet/', {'subject_id': subject_id, 'month': day.month, 'year': day.year})
+        if endpoint == 'bulk_update':
+            return client.post('/api/teacher/attendance/update/', {
+                'subject_id': subject_id,
+                'updates': [
+                    {'student_id': student_id, 'date': day.isoformat(), 'status': rng.choice(['present', 'absent'])}
+                    for student_id in self.enrolled[subject_id]
+                ],
+            }, format='json')
+        if endpoint == 'face_recognize':
+            image = io.BytesIO(self.image)
+            image.name = 'face.png'
+            return client.post('/api/face/recognize/', {'subject_id': subject_id, 'image': image}, format='multipart')
+        raise CommandError(f'Unknown endpoint {endpoint}')
+
+    def timed_call(self, endpoint):
+        if not self.warm_cache and endpoint.endswith('dashboard'):
+            caches[dashboard_cache.CACHE_ALIAS].clear()
+        # The connection (and so the capture) is per thread
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                status = self.call(endpoint).status_code
+            except Exception:
+                status = 'exception'
+                self.log_first_failure(endpoint)
+            elapsed = time.perf_counter() - started
+        return elapsed, status, len(queries.captured_queries)
+
+    def log_first_failure(self, endpoint):
+        # Call from an except block. Only the first traceback per endpoint: the rest are just counted as errors
+        with self.failures_lock:
+            if endpoint in self.logged_failures:
+                return
+            self.logged_failures.add(endpoint)
+        self.stderr.write(f'{endpoint} raised an exception (later ones are only counted):\n{traceback.format_exc()}')
+
+    def fake_represent(self, img_path=None, model_name=None, enforce_detection=True):
+        # Stubbed embedder: returns a known student's embedding, so recognition finds a match
+        embedding = self.rng.choice(self.embeddings) if self.embeddings else np.random.default_rng().normal(0, 1, 128).tolist()
+        return [{'embedding': embedding}]
+
+    def run_endpoint(self, endpoint, n_requests, concurrency):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: self.timed_call(endpoint), range(n_requests)))
+            wall = time.perf_counter() - started
+
+        latencies = np.array([elapsed for elapsed, _, _ in results]) * 1000
+        queries = np.array([count for _, _, count in results])
+        errors = sum(1 for _, status, _ in results if status == 'exception' or status >= 400)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            'requests': n_requests,
+            'errors': errors,
+            'requests_per_sec': round(n_requests / wall, 1),
+            'p50_ms': round(float(p50), 1),
+            'p95_ms': round(float(p95), 1),
+            'p99_ms': round(float(p99), 1),
+            'queries_mean': round(float(queries.mean()), 1),
+            'queries_max': int(queries.max()),
+        }
+
+    # --- Reporting ---
+    def report(self, results, baseline=None):
+        columns = ['requests_per_sec', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_mean', 'errors']
+        self.stdout.write(f"{'endpoint':<20}" + ''.join(f'{column:>18}' for column in columns))
+        for endpoint, stats in results.items():
+            cells = []
+            for column in columns:
+                cell = f'{stats[column]}'
+                previous = (baseline or {}).get(endpoint, {}).get(column)
+                if previous:
+                    cell += f' ({(stats[column] - previous) / previous * 100:+.0f}%)'
+                cells.append(f'{cell:>18}')
+            self.stdout.write(f'{endpoint:<20}' + ''.join(cells))
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('The benchmark writes attendance: run it against a local database (DEBUG on) or pass --force.')
+        self.seed = options['seed']
+        self.warm_cache = options['warm_cache']
+        self.logged_failures, self.failures_lock = set(), threading.Lock()
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as previous:
+                baseline = json.load(previous)['results']
+
+        if options['seed_data']:
+            call_command(
+                'generate_load_data', prefix=PREFIX, seed=options['seed'], students=options['students'],
+                teachers=options['teachers'], subjects=options['subjects'], days=options['days'],
+                faces=min(options['students'], SAMPLE_SIZE), approvals=options['students'] // 2,
+                stdout=self.stdout,
+            )
+        self.load_fixtures()
+        if connection.vendor == 'sqlite' and options['concurrency'] > 1:
+            self.stdout.write(self.style.WARNING(
+                "SQLite allows one writer at a time: concurrent bulk_update/face_recognize requests may fail with "
+                "'database is locked'. Benchmark against MySQL, or set OPTIONS['transaction_mode'] = 'IMMEDIATE'."
+            ))
+
+        results = {}
+        with mock.patch.object(views.DeepFace, 'represent', self.fake_represent):
+            for endpoint in options['endpoints']:
+                self.stdout.write(f'{endpoint}: {options["requests"]} requests x {options["concurrency"]} concurrent')
+                results[endpoint] = self.run_endpoint(endpoint, options['requests'], options['concurrency'])
+
+        self.report(results, baseline)
+
+        commit = _git_commit()
+        os.makedirs(options['output'], exist_ok=True)
+        path = os.path.join(options['output'], f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+        with open(path, 'w') as output:
+            json.dump({
+                'commit': commit,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'database': connection.vendor,
+                'options': {key: options[key] for key in ('concurrency', 'requests', 'warm_cache', 'seed')},
+                'results': results,
+            }, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results saved to {path}'))
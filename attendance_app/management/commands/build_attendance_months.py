@@ -0,0 +1,76 @@
+# TO RUN: python manage.py build_attendance_months [--verify] [--restore-rows [--fallback-teacher <username>]]
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.models import Attendance, TeacherProfile
+from attendance_app.services import attendance_store
+
+
+class Command(BaseCommand):
+    help = (
+        "With ATTENDANCE_STORAGE = 'bitmask', moves the Attendance rows into bit-packed AttendanceMonth rows. "
+        "With 'rows', builds the month rows from Attendance (or checks them with --verify), or with "
+        "--restore-rows writes the month rows back out as Attendance rows after switching back from 'bitmask'. "
+        "Month rows only keep their latest marker, so restored marks are attributed to that teacher."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only report mismatches, do not write anything')
+        parser.add_argument('--restore-rows', action='store_true', help="Recreate Attendance rows from the month rows")
+        parser.add_argument(
+            '--fallback-teacher', metavar='USERNAME',
+            help='With --restore-rows: the teacher for months whose last marking teacher no longer exists',
+        )
+
+    def handle(self, *args, **options):
+        verify_only = options['verify']
+
+        if attendance_store.bitmask_enabled():
+            if options['restore_rows']:
+                raise CommandError("Set ATTENDANCE_STORAGE back to 'rows' before restoring the Attendance rows.")
+            if verify_only:
+                remaining = Attendance.objects.count()
+                if remaining:
+                    self.stdout.write(self.style.ERROR(f"{remaining} Attendance rows have not been folded into months yet"))
+                    raise SystemExit(1)
+                self.stdout.write(self.style.SUCCESS("AttendanceMonth: OK (no Attendance rows left)"))
+                return
+            folded = attendance_store.fold_rows()
+            self.stdout.write(self.style.SUCCESS(f"{folded} Attendance rows folded into AttendanceMonth"))
+            return
+
+        if options['restore_rows']:
+            fallback_teacher_id = None
+            if options['fallback_teacher']:
+                try:
+                    fallback_teacher_id = TeacherProfile.objects.get(user__username=options['fallback_teacher']).pk
+                except TeacherProfile.DoesNotExist:
+                    raise CommandError(f"No teacher with the username {options['fallback_teacher']!r}.")
+            try:
+                result = attendance_store.restore_rows(fallback_teacher_id=fallback_teacher_id)
+            except ValueError as e:
+                raise CommandError(f"{e} (--fallback-teacher)")
+            self.stdout.write(self.style.SUCCESS(f"{result['restored']} Attendance rows restored"))
+            if result['reattributed']:
+                self.stdout.write(self.style.WARNING(
+                    f"{result['reattributed']} months were attributed to {options['fallback_teacher']}: "
+                    "their last marking teacher no longer exists"
+                ))
+            return
+
+        mismatches = attendance_store.rebuild(verify_only=verify_only)
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("AttendanceMonth: OK"))
+        elif verify_only:
+            self.stdout.write(self.style.ERROR(f"AttendanceMonth: {mismatches} rows out of date"))
+        else:
+            self.stdout.write(self.style.WARNING(f"AttendanceMonth: {mismatches} rows were out of date and have been rebuilt"))
+
+        self.stdout.write(
+            "ATTENDANCE_STORAGE is 'rows': the month rows are not kept up to date. Set it to 'bitmask' "
+            "and run this command again to move the marks into them."
+        )
+
+        if verify_only and mismatches:
+            raise SystemExit(1)
@@ -0,0 +1,42 @@
+# TO RUN: python manage.py build_question_bank --top 30 --sets 5
+
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from attendance_app.models import UserSkill
+from attendance_app.services import question_bank
+
+
+class Command(BaseCommand):
+    help = 'Pre-generates assessment question sets for the most popular student skills.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=30, help='How many of the most common skills to stock')
+        parser.add_argument('--sets', type=int, default=None, help='Question sets to keep per skill (defaults to QUESTION_BANK_TARGET_STOCK)')
+
+    def handle(self, *args, **options):
+        # Group the raw skill names by their normalised key, remembering the most common spelling
+        popularity = Counter()
+        spellings = {}
+        for skill_name, count in UserSkill.objects.values_list('skill_name').annotate(count=Count('id')):
+            skill_key = question_bank.normalise_skill_name(skill_name)
+            if not skill_key:
+                continue
+            popularity[skill_key] += count
+            if count > spellings.get(skill_key, ('', 0))[1]:
+                spellings[skill_key] = (skill_name.strip(), count)
+
+        if not popularity:
+            self.stdout.write(self.style.WARNING("No student skills found."))
+            return
+
+        total_created = 0
+        for skill_key, count in popularity.most_common(options['top']):
+            skill_name = spellings[skill_key][0]
+            created = question_bank.refill(skill_name, target=options['sets'])
+            total_created += created
+            self.stdout.write(f"{skill_name} ({count} students): {created} new sets")
+
+        self.stdout.write(self.style.SUCCESS(f"Question bank stocked. {total_created} sets generated."))
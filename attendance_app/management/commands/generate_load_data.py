@@ -0,0 +1,219 @@
+# TO RUN: python manage.py generate_load_data --students 10000 --days 365 [--teachers 50 --subjects 60 --faces 1000 --seed 42]
+
+import json
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from attendance_app.models import Approval, Attendance, StudentFace, StudentProfile, Subject, TeacherProfile, User
+from attendance_app.services import attendance_rollups, attendance_store, roll_resolver
+
+EMBEDDING_SIZE = 128 # Facenet, as used by RegisterFaceView
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a synthetic dataset for load testing: teachers, subjects, students, enrolments, '
+        'face embeddings, approval requests and a year of attendance, written with chunked bulk inserts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--subjects', type=int, default=60)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--subjects-per-student', type=int, default=6, help='Enrolments per student')
+        parser.add_argument('--days', type=int, default=365, help='Days of attendance, ending yesterday')
+        parser.add_argument('--faces', type=int, default=0, help='Students that get a face embedding')
+        parser.add_argument('--approvals', type=int, default=0, help='Approval requests from random students, some with CCs')
+        parser.add_argument('--seed', type=int, default=42, help='Same seed, same dataset')
+        parser.add_argument('--prefix', default='load', help='Prefix for usernames, roll numbers and subject names')
+        parser.add_argument('--password', default='password123', help='Password for every generated account')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per INSERT')
+
+    def bulk_insert(self, model, objects, chunk_size):
+        """bulk_create in chunks, one transaction each, from any iterable (generators are never materialised)."""
+        total = 0
+        chunk = []
+        for obj in objects:
+            chunk.append(obj)
+            if len(chunk) >= chunk_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            with transaction.atomic():
+                model.objects.bulk_create(chunk)
+            total += len(chunk)
+        return total
+
+    def insert_rows(self, model, columns, rows, chunk_size):
+        """
+        Plain executemany INSERTs for the attendance volume (millions of rows), where building a model
+        instance and preparing every field per row would cost more than the database does.
+        `rows` must already hold database-ready values for `columns`.
+        """
+        quote = connection.ops.quote_name
+        sql = (
+            f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(column) for column in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        total = 0
+        chunk = []
+        with connection.cursor() as cursor:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    with transaction.atomic():
+                        cursor.executemany(sql, chunk)
+                    total += len(chunk)
+                    chunk = []
+            if chunk:
+                with transaction.atomic():
+                    cursor.executemany(sql, chunk)
+                total += len(chunk)
+        return total
+
+    def create_users(self, usernames, role, password_hash, chunk_size):
+        self.bulk_insert(User, (User(username=name, role=role, password=password_hash) for name in usernames), chunk_size)
+        # bulk_create only returns primary keys on some databases, so read them back
+        return list(User.objects.filter(username__in=usernames).order_by('username').values_list('id', flat=True))
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        prefix = options['prefix']
+        chunk_size = options['chunk_size']
+        n_teachers, n_subjects, n_students = options['teachers'], options['subjects'], options['students']
+        per_student = min(options['subjects_per_student'], n_subjects)
+
+        if min(n_teachers, n_subjects, n_students) < 1:
+            raise CommandError('--teachers, --subjects and --students must be at least 1.')
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Users prefixed '{prefix}-' already exist; use another --prefix.")
+
+        started = time.monotonic()
+        # Hashing is deliberately slow, and every generated account shares the password: hash it once
+        password_hash = make_password(options['password'])
+
+        # --- Teachers and subjects ---
+        teacher_ids = self.create_users(
+            [f'{prefix}-t{i:05d}' for i in range(n_teachers)], 'teacher', password_hash, chunk_size
+        )
+        self.bulk_insert(TeacherProfile, (
+            TeacherProfile(user_id=user_id, full_name=f'Teacher {i + 1}') for i, user_id in enumerate(teacher_ids)
+        ), chunk_size)
+
+        subject_names = [f'{prefix.title()} Subject {i + 1:04d}' for i in range(n_subjects)]
+        self.bulk_insert(Subject, (Subject(name=name) for name in subject_names), chunk_size)
+        subject_ids = list(Subject.objects.filter(name__in=subject_names).order_by('name').values_list('id', flat=True))
+
+        # Every subject gets one teacher, round robin
+        subject_teacher = {subject_id: teacher_ids[i % n_teachers] for i, subject_id in enumerate(subject_ids)}
+        Teaching = TeacherProfile.subjects.through
+        self.bulk_insert(Teaching, (
+            Teaching(teacherprofile_id=teacher_id, subject_id=subject_id)
+            for subject_id, teacher_id in subject_teacher.items()
+        ), chunk_size)
+        self.stdout.write(f"{n_teachers} teachers, {n_subjects} subjects ({time.monotonic() - started:.1f}s)")
+
+        # --- Students and enrolments ---
+        student_ids = self.create_users(
+            [f'{prefix}-s{i:06d}' for i in range(n_students)], 'student', password_hash, chunk_size
+        )
+        self.bulk_insert(StudentProfile, (
+            StudentProfile(
+                user_id=user_id, full_name=f'Student {i + 1}', roll_number=f'{prefix.upper()}-{i + 1:06d}',
+                class_name=f'{prefix.upper()}-{i % 20 + 1}',
+            )
+            for i, user_id in enumerate(student_ids)
+        ), chunk_size)
+
+        subject_array = np.array(subject_ids)
+        enrolments = {
+            student_id: subject_array[rng.choice(n_subjects, per_student, replace=False)].tolist()
+            for student_id in student_ids
+        }
+        Enrolment = StudentProfile.subjects.through
+        enrolled = self.bulk_insert(Enrolment, (
+            Enrolment(studentprofile_id=student_id, subject_id=subject_id)
+            for student_id, subjects in enrolments.items() for subject_id in subjects
+        ), chunk_size)
+        roll_resolver.invalidate()
+        self.stdout.write(f"{n_students} students, {enrolled} enrolments ({time.monotonic() - started:.1f}s)")
+
+        # --- Face embeddings ---
+        if options['faces']:
+            # A separate stream, so the number of faces doesn't change the attendance that follows
+            face_rng = np.random.default_rng([options['seed'], 1])
+            face_students = student_ids[:options['faces']]
+            self.bulk_insert(StudentFace, (
+                StudentFace(
+                    student_id=student_id,
+                    face_encoding=json.dumps(np.round(face_rng.normal(0, 1, EMBEDDING_SIZE), 6).tolist()),
+                )
+                for student_id in face_students
+            ), chunk_size)
+            self.stdout.write(f"{len(face_students)} face embeddings ({time.monotonic() - started:.1f}s)")
+
+        # --- Approval requests ---
+        if options['approvals']:
+            approval_rng = np.random.default_rng([options['seed'], 2])
+            subject_teachers = [subject_teacher[subject_id] for subject_id in subject_ids]
+            requesters = approval_rng.choice(student_ids, options['approvals'])
+            self.bulk_insert(Approval, (
+                Approval(
+                    student_id=int(student_id), teacher_id=subject_teachers[approval_rng.integers(n_subjects)],
+                    subject=f'Leave request {i + 1}', message='Requesting leave for a family event.',
+                    status=approval_rng.choice(['pending', 'pending', 'approved', 'rejected']),
+                )
+                for i, student_id in enumerate(requesters)
+            ), chunk_size)
+            # The approvals just inserted are the newest rows
+            approval_ids = list(Approval.objects.order_by('-id').values_list('id', flat=True)[:options['approvals']])
+            CC = Approval.cc_teachers.through
+            self.bulk_insert(CC, (
+                CC(approval_id=approval_id, teacherprofile_id=int(teacher_id))
+                for approval_id in approval_ids
+                for teacher_id in set(approval_rng.choice(teacher_ids, approval_rng.integers(0, 3)).tolist())
+            ), chunk_size)
+            self.stdout.write(f"{options['approvals']} approval requests ({time.monotonic() - started:.1f}s)")
+
+        # --- Attendance ---
+        # Each subject meets on 3 weekdays; each student has their own attendance rate (mean ~80%,
+        # with a tail of low attenders) so dashboards and at-risk analytics have something to find.
+        end = date.today() - timedelta(days=1)
+        all_days = [end - timedelta(days=offset) for offset in range(options['days'])][::-1]
+        class_days = {}
+        for subject_id in subject_ids:
+            weekdays = set(rng.choice(5, 3, replace=False).tolist())
+            class_days[subject_id] = [
+                connection.ops.adapt_datefield_value(day) for day in all_days if day.weekday() in weekdays
+            ]
+        rates = dict(zip(student_ids, rng.beta(8, 2, n_students)))
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        def marks():
+            for student_id, subjects in enrolments.items():
+                for subject_id in subjects:
+                    days = class_days[subject_id]
+                    present = rng.random(len(days)) < rates[student_id]
+                    teacher_id = subject_teacher[subject_id]
+                    for day, is_present in zip(days, present):
+                        yield (student_id, subject_id, teacher_id, day, 'present' if is_present else 'absent', now, now)
+
+        written = self.insert_rows(Attendance, [
+            'student_id', 'subject_id', 'teacher_id', 'date', 'status', 'created_at', 'updated_at'
+        ], marks(), chunk_size)
+        self.stdout.write(f"{written} attendance marks ({time.monotonic() - started:.1f}s)")
+
+        # Bulk inserts skip the signals that keep the derived tables in step, so rebuild them once
+        if attendance_store.bitmask_enabled():
+            # The month rows are the storage: move the marks there, then count them
+            attendance_store.fold_rows(chunk_size)
+        attendance_rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.monotonic() - started:.1f}s."))
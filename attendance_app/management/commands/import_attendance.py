@@ -0,0 +1,50 @@
+# TO RUN: python manage.py import_attendance attendance.csv --teacher <username> [--rejects rejects.csv]
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.models import TeacherProfile
+from attendance_app.services import attendance_import
+
+
+class Command(BaseCommand):
+    help = 'Imports attendance marks from a CSV with columns roll_number, subject, date, status.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV file to import')
+        parser.add_argument('--teacher', required=True, help='Username of the teacher the marks are recorded under')
+        parser.add_argument('--rejects', help='Where to write rejected rows (defaults to <csv_path>.rejects.csv)')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows per transaction (defaults to ATTENDANCE_IMPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            teacher = TeacherProfile.objects.get(user__username=options['teacher'])
+        except TeacherProfile.DoesNotExist:
+            raise CommandError(f"No teacher with username '{options['teacher']}'")
+
+        rejects_path = options['rejects'] or f"{options['csv_path']}.rejects.csv"
+        with open(options['csv_path'], encoding='utf-8-sig', newline='') as csv_stream, \
+                open(rejects_path, 'w', encoding='utf-8', newline='') as rejects:
+            importer = attendance_import.AttendanceImporter(
+                teacher_id=teacher.pk, rejects=rejects, chunk_size=options['chunk_size']
+            )
+            try:
+                importer.run(csv_stream)
+            except (ValueError, csv.Error) as e:
+                if not importer.counts['rows']:
+                    raise CommandError(str(e))
+                # The rows read before the unreadable line were imported: say so before failing
+                self.report(importer.counts, rejects_path)
+                raise CommandError(f"Could not read the CSV after {importer.counts['rows']} rows: {e}")
+
+        self.report(importer.counts, rejects_path)
+
+    def report(self, counts, rejects_path):
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['rows']} rows read: {counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['duplicates']} duplicates, {counts['stale']} stale, "
+            f"{counts['archived']} archived, {counts['rejected']} rejected."
+        ))
+        if counts['rejected']:
+            self.stdout.write(self.style.WARNING(f"Rejected rows were written to {rejects_path}"))
@@ -0,0 +1,45 @@
+# TO RUN: python manage.py provision_students roster.csv [--subject "Computer Science"] [--default-password <pw>] [--workers 8]
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_app.models import Subject
+from attendance_app.services import account_provisioning
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates student accounts from a roster CSV (roll_number, full_name and optionally username, password, '
+        'class_name, email, phone_number, subjects), hashing passwords in parallel and inserting in bulk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='Roster CSV to read')
+        parser.add_argument('--subject', action='append', default=[], help='Enrol everyone in this subject (repeatable)')
+        parser.add_argument('--default-password', help='Password for rows that have none')
+        parser.add_argument('--workers', type=int, default=None, help='Hashing processes (defaults to PROVISIONING_HASH_WORKERS or the CPU count)')
+        parser.add_argument('--rejects', help='Where to write rejected rows (defaults to <csv_path>.rejects.csv)')
+
+    def handle(self, *args, **options):
+        subjects = dict(Subject.objects.filter(name__in=options['subject']).values_list('name', 'id'))
+        unknown = [name for name in options['subject'] if name not in subjects]
+        if unknown:
+            raise CommandError(f"Unknown subject(s): {', '.join(unknown)}")
+
+        with open(options['csv_path'], encoding='utf-8-sig', newline='') as csv_stream:
+            try:
+                entries, rejected = account_provisioning.read_roster(csv_stream, options['default_password'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        created = account_provisioning.provision_students(entries, subjects.values(), options['workers'])
+        self.stdout.write(self.style.SUCCESS(f"{created} students created, {len(rejected)} rows rejected."))
+
+        if rejected:
+            rejects_path = options['rejects'] or f"{options['csv_path']}.rejects.csv"
+            with open(rejects_path, 'w', encoding='utf-8', newline='') as rejects:
+                writer = csv.writer(rejects)
+                writer.writerow(['line', 'roll_number', 'reason'])
+                writer.writerows(rejected)
+            self.stdout.write(self.style.WARNING(f"Rejected rows were written to {rejects_path}"))
@@ -0,0 +1,16 @@
+# TO RUN: python manage.py prune_attendance_changes [--days 90]
+
+from django.core.management.base import BaseCommand
+
+from attendance_app.services import attendance_sync
+
+
+class Command(BaseCommand):
+    help = 'Deletes delta-sync change log entries older than ATTENDANCE_SYNC_RETENTION_DAYS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Keep this many days of changes instead')
+
+    def handle(self, *args, **options):
+        deleted = attendance_sync.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change log entries."))
@@ -0,0 +1,16 @@
+# TO RUN: python manage.py prune_idempotency_keys [--days 30]
+
+from django.core.management.base import BaseCommand
+
+from attendance_app.services import attendance_submissions
+
+
+class Command(BaseCommand):
+    help = 'Deletes offline submission idempotency keys older than IDEMPOTENCY_KEY_RETENTION_DAYS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Keep this many days of keys instead')
+
+    def handle(self, *args, **options):
+        deleted = attendance_submissions.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency keys."))
@@ -0,0 +1,27 @@
+# TO RUN: python manage.py rebuild_attendance_rollups [--verify]
+
+from django.core.management.base import BaseCommand
+
+from attendance_app.services import attendance_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the attendance rollup tables from raw Attendance rows, or checks them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only report mismatches, do not write anything')
+
+    def handle(self, *args, **options):
+        verify_only = options['verify']
+        report = attendance_rollups.rebuild(verify_only=verify_only)
+
+        for table, mismatches in report.items():
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS(f"{table}: OK"))
+            elif verify_only:
+                self.stdout.write(self.style.ERROR(f"{table}: {mismatches} rows out of date"))
+            else:
+                self.stdout.write(self.style.WARNING(f"{table}: {mismatches} rows were out of date and have been rebuilt"))
+
+        if verify_only and any(report.values()):
+            raise SystemExit(1)
@@ -0,0 +1,18 @@
+# TO RUN: python manage.py scan_attendance_alerts   (e.g. nightly from cron)
+
+from django.core.management.base import BaseCommand
+
+from attendance_app.services import attendance_alerts
+
+
+class Command(BaseCommand):
+    help = 'Raises low-attendance alerts from the attendance marks written since the last scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help='Marks per transaction (defaults to ALERT_SCAN_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        result = attendance_alerts.scan(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {result['rows']} marks ({result['pairs']} student/subject pairs), raised {result['alerts']} alerts."
+        ))
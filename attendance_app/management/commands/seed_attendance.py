@@ -3,13 +3,14 @@ import random
 from datetime import date, timedelta
 from django.core.management.base import BaseCommand
 from attendance_app.models import StudentProfile, Subject, Attendance, TeacherProfile
+from attendance_app.services import attendance_writer
 
 class Command(BaseCommand):
     help = 'Seeds the database with dummy attendance data for all students and subjects.'
 
     def handle(self, *args, **kwargs):
         self.stdout.write("Deleting old attendance data...")
-        Attendance.objects.all().delete()
+        attendance_writer.delete_marks(Attendance.objects.values_list('student_id', 'subject_id', 'date'))
         self.stdout.write(self.style.SUCCESS("Old data deleted."))
 
         students = StudentProfile.objects.all()
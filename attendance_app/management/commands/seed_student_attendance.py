@@ -7,6 +7,7 @@ import random
 from datetime import date, timedelta
 from django.core.management.base import BaseCommand
 from attendance_app.models import StudentProfile, Attendance, TeacherProfile, User
+from attendance_app.services import attendance_writer
 
 class Command(BaseCommand):
     help = 'Seeds attendance data for a specific student for the last 2 months.'
@@ -30,7 +31,9 @@ class Command(BaseCommand):
 
             # 3. Clear Previous Data
             # We delete ALL attendance for this student to ensure a clean slate/refresh
-            deleted_count, _ = Attendance.objects.filter(student=student).delete()
+            deleted_count = attendance_writer.delete_marks(
+                Attendance.objects.filter(student=student).values_list('student_id', 'subject_id', 'date')
+            )
             self.stdout.write(self.style.WARNING(f"Cleared {deleted_count} existing attendance records."))
 
             # 4. Generate New Data
@@ -0,0 +1,120 @@
+# attendance_app/middleware.py
+import heapq
+import logging
+import random
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger('attendance_app.requests')
+
+# "IN (%s, %s, %s)" -> "IN (...)", so the same statement with a different number of ids shares a fingerprint
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+# The column list says little in a log line; the tables and WHERE clause are what identify a query
+SELECT_COLUMNS = re.compile(r'^SELECT (DISTINCT )?.*? FROM ', re.DOTALL)
+SQL_PREVIEW_LENGTH = 300
+
+
+def fingerprint(sql):
+    return IN_LIST.sub('(...)', sql)
+
+
+def preview(sql):
+    return SELECT_COLUMNS.sub(r'SELECT \1... FROM ', sql, count=1)[:SQL_PREVIEW_LENGTH]
+
+
+class QueryRecorder:
+    """
+    A connection.execute_wrapper that counts and times every statement of a request. It keeps only a
+    counter per fingerprint and the few slowest statements, so its cost per query stays tiny.
+    """
+    def __init__(self, keep_slowest):
+        self.keep_slowest = keep_slowest
+        self.count = 0
+        self.total = 0.0
+        self.fingerprints = Counter()
+        self.slowest = [] # min-heap of (duration, sequence, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.total += duration
+            self.fingerprints[fingerprint(sql)] += 1
+            entry = (duration, self.count, sql)
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def repeated(self, threshold):
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'view_class', None)
+    return view_class.__name__ if view_class else match.func.__name__
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Opt-in per-request SQL instrumentation for a sample of requests (REQUEST_PROFILING_SAMPLE_RATE,
+    0 removes the middleware entirely). Sampled responses get a Server-Timing header with the
+    total time, SQL time and query count, and requests that are slower than their view's
+    SLOW_REQUEST_MS threshold, or that repeat a statement REPEATED_QUERY_THRESHOLD times (a likely
+    N+1), are logged to 'attendance_app.requests' with their slowest and most repeated statements.
+
+    Streaming responses are measured up to the first byte; queries made while streaming aren't counted.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(settings.REQUEST_PROFILING_TOP_QUERIES)
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        sql_ms = recorder.total * 1000
+
+        response['Server-Timing'] = (
+            f'total;dur={total_ms:.1f}, '
+            f'db;dur={sql_ms:.1f};desc="{recorder.count} queries", '
+            f'app;dur={max(total_ms - sql_ms, 0):.1f}'
+        )
+
+        view = _view_name(request)
+        thresholds = settings.SLOW_REQUEST_MS
+        slow = total_ms > thresholds.get(view, thresholds['default'])
+        repeated = recorder.repeated(settings.REPEATED_QUERY_THRESHOLD)
+        if slow or repeated:
+            logger.warning(
+                '%s %s %s (%s): %.0fms, %d queries in %.0fms%s',
+                'Slow request' if slow else 'Repeated queries in', request.method, request.path, view,
+                total_ms, recorder.count, sql_ms, self._details(recorder, repeated),
+            )
+        return response
+
+    def _details(self, recorder, repeated):
+        lines = [
+            f'\n  slow {duration * 1000:.1f}ms: {preview(sql)}'
+            for duration, _, sql in sorted(recorder.slowest, reverse=True)
+        ]
+        lines += [f'\n  x{count}: {preview(sql)}' for sql, count in repeated]
+        return ''.join(lines)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0006_ocrresultcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssessmentQuestionSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('skill_key', models.CharField(db_index=True, max_length=100)),
+                ('skill_name', models.CharField(max_length=100)),
+                ('questions', models.JSONField()),
+                ('prompt_version', models.CharField(max_length=16)),
+                ('times_served', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
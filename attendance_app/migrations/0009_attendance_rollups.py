@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_rollups(apps, schema_editor):
+    Attendance = apps.get_model('attendance_app', 'Attendance')
+    AttendanceSummary = apps.get_model('attendance_app', 'AttendanceSummary')
+    DailyAttendanceSummary = apps.get_model('attendance_app', 'DailyAttendanceSummary')
+
+    counts = dict(present_count=Count('id', filter=Q(status='present')), total_count=Count('id'))
+    AttendanceSummary.objects.bulk_create(
+        [AttendanceSummary(**row) for row in Attendance.objects.values('student_id', 'subject_id').annotate(**counts).order_by()],
+        batch_size=5000
+    )
+    DailyAttendanceSummary.objects.bulk_create(
+        [DailyAttendanceSummary(**row) for row in Attendance.objects.values('subject_id', 'date').annotate(**counts).order_by()],
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0008_attendance_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='attendance_app.studentprofile')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='attendance_app.subject')),
+            ],
+            options={
+                'unique_together': {('student', 'subject')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('total_count', models.PositiveIntegerField(default=0)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='attendance_app.subject')),
+            ],
+            options={
+                'unique_together': {('subject', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
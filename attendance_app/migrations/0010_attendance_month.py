@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0009_attendance_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('present_mask', models.PositiveIntegerField(default=0)),
+                ('recorded_mask', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_months', to='attendance_app.studentprofile')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_months', to='attendance_app.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject', 'month'], name='attendance__subject_201e44_idx')],
+                'unique_together': {('student', 'subject', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0010_attendance_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('present', 'Present'), ('absent', 'Absent')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['subject', 'date'], name='attendance__subject_c5959c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'date'], name='attendance__student_af706b_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedattendance',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to='attendance_app.studentprofile'),
+        ),
+        migrations.AddField(
+            model_name='archivedattendance',
+            name='subject',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to='attendance_app.subject'),
+        ),
+        migrations.AddField(
+            model_name='archivedattendance',
+            name='teacher',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to='attendance_app.teacherprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedperiod',
+            index=models.Index(fields=['start_date', 'end_date'], name='attendance__start_d_6adadf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedattendance',
+            index=models.Index(fields=['subject', 'date'], name='attendance__subject_d0923c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedattendance',
+            index=models.Index(fields=['student', 'date'], name='attendance__student_ca513e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedattendance',
+            unique_together={('student', 'subject', 'date')},
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0011_attendance_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(choices=[('below', 'Dropped below threshold'), ('recovered', 'Recovered above threshold')], max_length=10)),
+                ('percentage', models.FloatField()),
+                ('threshold', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AttendanceAlertState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('below_threshold', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScanWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['updated_at', 'id'], name='attendance__updated_38a3f9_idx'),
+        ),
+        migrations.AddField(
+            model_name='attendancealert',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_alerts', to='attendance_app.studentprofile'),
+        ),
+        migrations.AddField(
+            model_name='attendancealert',
+            name='subject',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_alerts', to='attendance_app.subject'),
+        ),
+        migrations.AddField(
+            model_name='attendancealertstate',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='attendance_app.studentprofile'),
+        ),
+        migrations.AddField(
+            model_name='attendancealertstate',
+            name='subject',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='attendance_app.subject'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendancealertstate',
+            unique_together={('student', 'subject')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0012_attendance_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('mark', 'Attendance mark'), ('enrolment', 'Enrolment')], max_length=10)),
+                ('subject_id', models.BigIntegerField()),
+                ('student_id', models.BigIntegerField()),
+                ('date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, max_length=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject_id', 'id'], name='attendance__subject_bcb502_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0013_attendance_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='marked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('batch', 'Batch'), ('operation', 'Operation')], max_length=10)),
+                ('key', models.CharField(max_length=64)),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='attendance_app.teacherprofile')),
+            ],
+            options={
+                'unique_together': {('teacher', 'scope', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0014_attendance_submissions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(fields=['teacher', 'created_at', 'id'], name='attendance__teacher_bacca6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(fields=['teacher', 'status', 'created_at', 'id'], name='attendance__teacher_73e9b0_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0015_approval_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancemonth',
+            name='mark_times',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='attendancemonth',
+            name='marked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendancemonth',
+            name='marked_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='attendance_app.teacherprofile'),
+        ),
+    ]
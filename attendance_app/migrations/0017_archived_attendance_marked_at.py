@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_app', '0016_attendance_month_audit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedattendance',
+            name='marked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -90,10 +90,25 @@ class Attendance(models.Model):
     date = models.DateField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True) # Bumped on every status change, used for sheet ETags
+    # When the mark was taken (on the device, for marks queued offline); the newest mark wins
+    marked_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         # A student can only have one attendance record per subject per day
         unique_together = ('student', 'subject', 'date')
+        indexes = [
+            models.Index(fields=['subject', 'date']), # Sheets, exports, per-day rollups
+            models.Index(fields=['student', 'date']), # Student trends
+            models.Index(fields=['updated_at', 'id']), # Incremental scans (see services/attendance_alerts.py)
+        ]
+
+    def delete(self, *args, **kwargs):
+        # Through the writer, which also updates the rollups, sync log and dashboards: Attendance has
+        # no per-row delete signals, which would slow down every cascade through the marks
+        from .services import attendance_writer
+        deleted = attendance_writer.delete_marks([(self.student_id, self.subject_id, self.date)])
+        return deleted, {self._meta.label: deleted}
 
 
 class Approval(models.Model):
@@ -112,6 +127,13 @@ class Approval(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # The teacher's own half of the approval inbox, newest first (see services/approval_inbox.py)
+            models.Index(fields=['teacher', 'created_at', 'id']),
+            models.Index(fields=['teacher', 'status', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.subject} - {self.student.full_name}"
 
@@ -123,4 +145,205 @@ class StudentFace(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Face Data: {self.student.full_name}"
\ No newline at end of file
+        return f"Face Data: {self.student.full_name}"
+
+class OCRResultCache(models.Model):
+    # sha256 of the normalised image bytes + the prompt/model version that produced the result
+    cache_key = models.CharField(max_length=64, unique=True)
+    task_name = models.CharField(max_length=50)
+    records = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.task_name} - {self.cache_key[:12]}"
+
+
+class AssessmentQuestionSet(models.Model):
+    # Normalised skill name (see question_bank.normalise_skill_name), so "Python", "python " and "PYTHON" share a bank
+    skill_key = models.CharField(max_length=100, db_index=True)
+    skill_name = models.CharField(max_length=100) # The name the set was generated for, used in the prompt
+    questions = models.JSONField()
+    prompt_version = models.CharField(max_length=16)
+    times_served = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.skill_name} ({self.times_served} served)"
+
+
+# --- Attendance rollups ---
+# Running present/total counts maintained on every attendance write (see services/attendance_rollups.py),
+# so dashboards read a few small rows instead of scanning Attendance.
+class AttendanceSummary(models.Model):
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='attendance_summaries')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='attendance_summaries')
+    present_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('student', 'subject')
+
+    def __str__(self):
+        return f"{self.student.full_name} - {self.subject.name}: {self.present_count}/{self.total_count}"
+
+
+class DailyAttendanceSummary(models.Model):
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='daily_summaries')
+    date = models.DateField()
+    present_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('subject', 'date')
+
+    def __str__(self):
+        return f"{self.subject.name} {self.date}: {self.present_count}/{self.total_count}"
+
+
+# --- Compact attendance storage ---
+# One row per student, subject and month instead of one per day: bit N-1 of each mask is day N.
+# When settings.ATTENDANCE_STORAGE == 'bitmask' these rows replace Attendance: marks are only
+# written here (see services/attendance_store.py).
+class AttendanceMonth(models.Model):
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='attendance_months')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='attendance_months')
+    month = models.DateField() # Always the 1st of the month
+    present_mask = models.PositiveIntegerField(default=0)
+    recorded_mask = models.PositiveIntegerField(default=0) # Days with any mark; absent = recorded & ~present
+    # Audit: who took the month's latest mark and when, plus when each day was marked (31 packed
+    # 4-byte Unix times, 0 = unknown) so that the newest mark of a day still wins
+    marked_by = models.ForeignKey(TeacherProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    marked_at = models.DateTimeField(null=True, blank=True)
+    mark_times = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'subject', 'month')
+        indexes = [models.Index(fields=['subject', 'month'])]
+
+    def __str__(self):
+        return f"{self.student.full_name} - {self.subject.name} {self.month:%Y-%m}"
+
+
+# --- Attendance archive ---
+# Marks from closed academic periods are moved out of Attendance into ArchivedAttendance
+# (see services/attendance_archive.py), so the hot table only holds the current periods.
+# The rollup tables keep counting archived marks.
+class ArchivedPeriod(models.Model):
+    name = models.CharField(max_length=100) # e.g. "2025 Odd Semester"
+    start_date = models.DateField()
+    end_date = models.DateField()
+    row_count = models.PositiveIntegerField(default=0) # Marks moved so far
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['start_date', 'end_date'])]
+
+    def __str__(self):
+        return f"{self.name} ({self.start_date} - {self.end_date})"
+
+
+class ArchivedAttendance(models.Model):
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='archived_attendance')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='archived_attendance')
+    teacher = models.ForeignKey(TeacherProfile, on_delete=models.CASCADE, related_name='archived_attendance')
+    date = models.DateField()
+    status = models.CharField(max_length=10, choices=Attendance.STATUS_CHOICES)
+    created_at = models.DateTimeField() # Copied from the Attendance row
+    updated_at = models.DateTimeField()
+    marked_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('student', 'subject', 'date')
+        indexes = [
+            models.Index(fields=['subject', 'date']),
+            models.Index(fields=['student', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.full_name} - {self.subject.name} - {self.date}: {self.status} (archived)"
+
+
+# --- Low-attendance alerts ---
+# Written by the incremental scanner (services/attendance_alerts.py, `manage.py scan_attendance_alerts`).
+class ScanWatermark(models.Model):
+    # How far an incremental scanner has got through Attendance, ordered by (updated_at, id)
+    name = models.CharField(max_length=50, unique=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.updated_at} #{self.last_id}"
+
+
+class AttendanceAlertState(models.Model):
+    # Whether each student/subject was below the threshold at the last scan, so only crossings raise alerts
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='+')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+')
+    below_threshold = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('student', 'subject')
+
+
+class AttendanceAlert(models.Model):
+    DIRECTION_CHOICES = (
+        ('below', 'Dropped below threshold'),
+        ('recovered', 'Recovered above threshold'),
+    )
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='attendance_alerts')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='attendance_alerts')
+    direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES)
+    percentage = models.FloatField()
+    threshold = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.student.full_name} - {self.subject.name}: {self.direction} ({self.percentage:.1f}%)"
+
+
+# --- Delta sync ---
+# Append-only log of attendance and enrolment changes per subject; its id is the sync cursor
+# (see services/attendance_sync.py). Plain ids rather than foreign keys, so tombstones outlive
+# the rows they describe.
+class AttendanceChange(models.Model):
+    KIND_CHOICES = (
+        ('mark', 'Attendance mark'),
+        ('enrolment', 'Enrolment'),
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    subject_id = models.BigIntegerField()
+    student_id = models.BigIntegerField()
+    date = models.DateField(null=True, blank=True) # Marks only
+    # Marks: the new status; enrolments: 'enrolled'. None is a tombstone (deleted mark / unenrolled).
+    status = models.CharField(max_length=10, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['subject_id', 'id'])]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.subject_id}/{self.student_id} {self.date}: {self.status}"
+
+
+# --- Idempotent submissions ---
+# Keys of the batches and operations already applied by the offline submission endpoint
+# (see services/attendance_submissions.py), so replays are answered without writing again.
+class IdempotencyKey(models.Model):
+    SCOPE_CHOICES = (
+        ('batch', 'Batch'),
+        ('operation', 'Operation'),
+    )
+    teacher = models.ForeignKey(TeacherProfile, on_delete=models.CASCADE, related_name='+')
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=64)
+    response = models.JSONField(null=True, blank=True) # Batches only: the counts returned the first time
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('teacher', 'scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.teacher_id})"
@@ -1,10 +1,14 @@
 # attendance_app/serializers.py
 
 from rest_framework import serializers
-from .models import User, StudentProfile, TeacherProfile, Subject, Attendance, UserSkill, UserProject, Performance, Approval
+from .models import User, StudentProfile, TeacherProfile, Subject, UserSkill, UserProject, Performance, Approval
+from .models import AttendanceSummary, DailyAttendanceSummary
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.db.models import Count, Q
+from django.db.models import Count, F, FilteredRelation, Q, Sum, prefetch_related_objects
+from django.db.models.functions import Coalesce
 from datetime import date, timedelta
+from collections import defaultdict
+from .services import attendance_store
 
 
 class AllStudentsSerializer(serializers.ModelSerializer):
@@ -92,13 +96,13 @@ class TeacherProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['username']
 
     def get_subjects_data(self, obj):
-        # Returns subject name and number of students enrolled
+        # Returns subject name and number of students enrolled (counted in the same query)
         data = []
-        for subject in obj.subjects.all():
+        for subject in obj.subjects.annotate(student_count=Count('students')):
             data.append({
                 'id': subject.id,
                 'name': subject.name,
-                'student_count': subject.students.count()
+                'student_count': subject.student_count
             })
         return data
 
@@ -188,14 +192,39 @@ class TeacherDashboardSerializer(serializers.ModelSerializer):
         fields = ['full_name', 'subjects']
 
     def get_subjects(self, obj):
-        # 'obj' is the TeacherProfile instance
-        teacher_subjects = obj.subjects.prefetch_related('students').all()
-        result = []
+        # 'obj' is the TeacherProfile instance.
+        # Everything is fetched up front in a fixed number of queries (subjects + students,
+        # one grouped read for per-student counts, one for the daily trend) and bucketed in memory,
+        # so the cost doesn't grow with the number of subjects or students.
+        prefetch_related_objects([obj], 'subjects__students') # No-op when the view already prefetched
+        teacher_subjects = list(obj.subjects.all())
+        subject_ids = [subject.id for subject in teacher_subjects]
+
+        # {subject_id: {student_id: (present, total)}} from the rollup table
+        summaries = defaultdict(dict)
+        for subject_id, student_id, present, total in AttendanceSummary.objects.filter(
+            subject_id__in=subject_ids
+        ).values_list('subject_id', 'student_id', 'present_count', 'total_count'):
+            summaries[subject_id][student_id] = (present, total)
+
+        # --- Monthly Trend Data for Bar Chart ---
+        today = date.today()
+        start_of_month = today.replace(day=1)
+        days_in_month = (today.replace(month=today.month % 12 + 1, day=1) - timedelta(days=1)).day if today.month != 12 else 31
+
+        # {subject_id: {'DD': {'presents': .., 'absents': ..}}}
+        trend_maps = defaultdict(dict)
+        for subject_id, day, present, total in DailyAttendanceSummary.objects.filter(
+            subject_id__in=subject_ids,
+            date__gte=start_of_month
+        ).values_list('subject_id', 'date', 'present_count', 'total_count'):
+            trend_maps[subject_id][day.strftime('%d')] = {'presents': present, 'absents': total - present}
 
+        result = []
         for subject in teacher_subjects:
-            attendance_records = Attendance.objects.filter(subject=subject)
-            total_records = attendance_records.count()
-            present_records = attendance_records.filter(status='present').count()
+            subject_summaries = summaries[subject.id]
+            total_records = sum(total for _, total in subject_summaries.values())
+            present_records = sum(present for present, _ in subject_summaries.values())
 
             # --- NEW: Calculate Distribution ---
             students = subject.students.all()
@@ -208,10 +237,8 @@ class TeacherDashboardSerializer(serializers.ModelSerializer):
 
             for student in students:
                 # Get individual student stats
-                s_records = attendance_records.filter(student=student)
-                s_total = s_records.count()
+                s_present, s_total = subject_summaries.get(student.pk, (0, 0))
                 if s_total > 0:
-                    s_present = s_records.filter(status='present').count()
                     percentage = (s_present / s_total) * 100
                 else:
                     percentage = 0 # Or 100 depending on policy, assuming 0 for no data
@@ -234,22 +261,8 @@ class TeacherDashboardSerializer(serializers.ModelSerializer):
             ]
             # -----------------------------------
 
-            # --- Monthly Trend Data for Bar Chart ---
-            today = date.today()
-            start_of_month = today.replace(day=1)
-            days_in_month = (today.replace(month=today.month % 12 + 1, day=1) - timedelta(days=1)).day if today.month != 12 else 31
-            
-            monthly_trend_data = attendance_records.filter(
-                date__gte=start_of_month
-            ).values('date').annotate(
-                presents=Count('id', filter=Q(status='present')),
-                absents=Count('id', filter=Q(status='absent'))
-            ).order_by('date')
-            
-            # Map data for easy lookup
-            trend_map = {item['date'].strftime('%d'): {'presents': item['presents'], 'absents': item['absents']} for item in monthly_trend_data}
-            
             # Format for the frontend chart
+            trend_map = trend_maps[subject.id]
             monthly_trend = []
             for day_num in range(1, days_in_month + 1):
                 day_str = f"{day_num:02d}"
@@ -263,10 +276,10 @@ class TeacherDashboardSerializer(serializers.ModelSerializer):
             result.append({
                 'id': subject.id,
                 'name': subject.name,
-                'total_students': subject.students.count(),
+                'total_students': len(students),
                 'present_percentage': round((present_records / total_records) * 100, 1) if total_records > 0 else 0,
                 'absent_percentage': round(((total_records - present_records) / total_records) * 100, 1) if total_records > 0 else 0,
-                'students': StudentListSerializer(subject.students.all(), many=True).data, # For the students tab
+                'students': StudentListSerializer(students, many=True).data, # For the students tab
                 'monthly_trend': monthly_trend,
                 'attendance_distribution': distribution_data, 
             })
@@ -283,9 +296,10 @@ class SubjectWithStatsSerializer(serializers.ModelSerializer):
     # CHANGE: Use many=True to handle multiple teachers for one subject
     teachers = TeacherListSerializer(many=True, read_only=True) 
     
-    total_classes = serializers.SerializerMethodField()
-    present_count = serializers.SerializerMethodField()
-    absent_count = serializers.SerializerMethodField()
+    # These come from annotations on the queryset (see StudentDashboardSerializer.get_subjects)
+    total_classes = serializers.IntegerField(read_only=True)
+    present_count = serializers.IntegerField(read_only=True)
+    absent_count = serializers.IntegerField(read_only=True)
     attendance_percentage = serializers.SerializerMethodField()
 
     class Meta:
@@ -293,29 +307,15 @@ class SubjectWithStatsSerializer(serializers.ModelSerializer):
         # CHANGE: 'teacher' field is now 'teachers'
         fields = ['id', 'name', 'teachers', 'total_classes', 'present_count', 'absent_count', 'attendance_percentage']
 
-    # ... (the get_* methods remain the same) ...
-    def get_attendance_records(self, obj):
-        student = self.context['student']
-        return Attendance.objects.filter(subject=obj, student=student)
-
-    def get_total_classes(self, obj):
-        return self.get_attendance_records(obj).count()
-
-    def get_present_count(self, obj):
-        return self.get_attendance_records(obj).filter(status='present').count()
-
-    def get_absent_count(self, obj):
-        return self.get_attendance_records(obj).filter(status='absent').count()
-
     def get_attendance_percentage(self, obj):
-        present = self.get_present_count(obj)
-        total = self.get_total_classes(obj)
+        present = obj.present_count
+        total = obj.total_classes
         return round((present / total) * 100, 2) if total > 0 else 0
 
 
 # The main serializer for the student's dashboard
 class StudentDashboardSerializer(serializers.ModelSerializer):
-    subjects = SubjectWithStatsSerializer(many=True, read_only=True)
+    subjects = serializers.SerializerMethodField()
     
     # NEW: Add fields for the KPI cards
     overall_stats = serializers.SerializerMethodField()
@@ -326,16 +326,41 @@ class StudentDashboardSerializer(serializers.ModelSerializer):
         model = StudentProfile
         fields = ['full_name', 'roll_number', 'subjects', 'overall_stats', 'attendance_trend']
 
+    def get_subjects_with_stats(self, obj):
+        # The student's subjects with their attendance counts annotated from the rollup table
+        # (one query, plus one for the teachers). Cached because overall_stats reuses it.
+        if not hasattr(self, '_subjects_with_stats'):
+            self._subjects_with_stats = {}
+        if obj.pk not in self._subjects_with_stats:
+            self._subjects_with_stats[obj.pk] = list(
+                Subject.objects.filter(students=obj).annotate(
+                    # Joins only this student's rollup row (unique on student+subject)
+                    student_summary=FilteredRelation(
+                        'attendance_summaries', condition=Q(attendance_summaries__student=obj)
+                    ),
+                ).annotate(
+                    total_classes=Coalesce('student_summary__total_count', 0),
+                    present_count=Coalesce('student_summary__present_count', 0),
+                    absent_count=F('total_classes') - F('present_count'),
+                ).prefetch_related('teachers').order_by('id')
+            )
+        return self._subjects_with_stats[obj.pk]
+
+    def get_subjects(self, obj):
+        return SubjectWithStatsSerializer(self.get_subjects_with_stats(obj), many=True, context=self.context).data
+
     def get_overall_stats(self, obj):
         # 'obj' is the StudentProfile instance
-        student_attendance = Attendance.objects.filter(student=obj)
+        totals = AttendanceSummary.objects.filter(student=obj).aggregate(
+            present=Sum('present_count'), total=Sum('total_count')
+        )
         
-        present_count = student_attendance.filter(status='present').count()
-        absent_count = student_attendance.filter(status='absent').count()
-        total_classes = present_count + absent_count
+        present_count = totals['present'] or 0
+        total_classes = totals['total'] or 0
+        absent_count = total_classes - present_count
         
         return {
-            'total_subjects': obj.subjects.count(),
+            'total_subjects': len(self.get_subjects_with_stats(obj)),
             'total_present': present_count,
             'total_absent': absent_count,
             'overall_percentage': round((present_count / total_classes) * 100, 2) if total_classes > 0 else 0
@@ -346,26 +371,16 @@ class StudentDashboardSerializer(serializers.ModelSerializer):
         today = date.today()
         thirty_days_ago = today - timedelta(days=29)
         
-        # Get all attendance records for the student in the last 30 days
-        trend_data = Attendance.objects.filter(
-            student=obj,
-            date__gte=thirty_days_ago,
-            date__lte=today
-        ).values('date').annotate(
-            presents=Count('id', filter=Q(status='present'))
-        ).order_by('date')
-        
-        # Create a dictionary for quick lookups
-        data_map = {item['date'].strftime('%Y-%m-%d'): item['presents'] for item in trend_data}
+        # Presents per day for the student in the last 30 days, {date: count}
+        presents_by_day = attendance_store.daily_presents(obj.pk, thirty_days_ago, today)
         
         # Format for the frontend chart
         chart_data = []
         for i in range(30):
             day = thirty_days_ago + timedelta(days=i)
-            day_str = day.strftime('%Y-%m-%d')
             chart_data.append({
-                'date': day_str,
-                'presents': data_map.get(day_str, 0) # Default to 0 if no record for that day
+                'date': day.strftime('%Y-%m-%d'),
+                'presents': presents_by_day.get(day, 0) # Default to 0 if no record for that day
             })
             
         return chart_data
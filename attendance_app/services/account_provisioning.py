@@ -0,0 +1,159 @@
+# attendance_app/services/account_provisioning.py
+import csv
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from ..models import StudentProfile, Subject, User
+from . import attendance_sync, dashboard_cache, roll_resolver
+
+REQUIRED_COLUMNS = ['roll_number', 'full_name']
+OPTIONAL_COLUMNS = ['username', 'password', 'class_name', 'email', 'phone_number', 'subjects']
+
+# Below this many passwords, starting worker processes costs more than it saves
+MIN_PARALLEL_PASSWORDS = 20
+
+
+def read_roster(csv_stream, default_password=None):
+    """
+    Reads a roster CSV with columns roll_number, full_name and optionally username (defaults to the
+    lower-cased roll number), password (defaults to `default_password`), class_name, email,
+    phone_number and subjects (names separated by ';').
+
+    Returns (entries, rejected): entries are dicts ready for provision_students(), rejected is a list
+    of (line, roll_number, reason). Rows clashing with existing accounts are checked with one query each
+    for usernames and roll numbers.
+    """
+    reader = csv.DictReader(csv_stream)
+    header = [column.strip().lower() for column in reader.fieldnames or []]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"The roster is missing the column(s): {', '.join(missing)}")
+    reader.fieldnames = header
+
+    subjects = {name.casefold().strip(): pk for pk, name in Subject.objects.values_list('id', 'name')}
+
+    entries, rejected = [], []
+    seen_rolls, seen_usernames = set(), set()
+    for record in reader:
+        line = reader.line_num
+        values = {column: (record.get(column) or '').strip() for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+        roll_number = values['roll_number']
+
+        if not roll_number or not values['full_name']:
+            rejected.append((line, roll_number, 'roll_number and full_name are required'))
+            continue
+        username = values['username'] or roll_number.lower()
+        password = values['password'] or default_password
+        if not password:
+            rejected.append((line, roll_number, 'No password given and no default password set'))
+            continue
+        if roll_number in seen_rolls or username in seen_usernames:
+            rejected.append((line, roll_number, 'Duplicate roll number or username in the roster'))
+            continue
+
+        subject_names = [name.strip() for name in values['subjects'].split(';') if name.strip()]
+        unknown = [name for name in subject_names if name.casefold() not in subjects]
+        if unknown:
+            rejected.append((line, roll_number, f"Unknown subject(s): {', '.join(unknown)}"))
+            continue
+
+        seen_rolls.add(roll_number)
+        seen_usernames.add(username)
+        entries.append({
+            'line': line,
+            'username': username,
+            'password': password,
+            'roll_number': roll_number,
+            'full_name': values['full_name'],
+            'class_name': values['class_name'],
+            'email': values['email'] or None,
+            'phone_number': values['phone_number'] or None,
+            'subject_ids': [subjects[name.casefold()] for name in subject_names],
+        })
+
+    taken_usernames = set(User.objects.filter(username__in=seen_usernames).values_list('username', flat=True))
+    taken_rolls = set(StudentProfile.objects.filter(roll_number__in=seen_rolls).values_list('roll_number', flat=True))
+    available = []
+    for entry in entries:
+        if entry['username'] in taken_usernames:
+            rejected.append((entry['line'], entry['roll_number'], 'Username already exists'))
+        elif entry['roll_number'] in taken_rolls:
+            rejected.append((entry['line'], entry['roll_number'], 'Roll number already exists'))
+        else:
+            available.append(entry)
+    rejected.sort()
+    return available, rejected
+
+
+def hash_passwords(passwords, workers=None) -> list:
+    """
+    make_password() for each password, spread over a pool of worker processes: each hash is
+    deliberately expensive (PBKDF2) and CPU-bound, so threads wouldn't help.
+
+    Every password gets its own salt, even when several accounts share one (a cohort's default
+    password): identical hashes would show which accounts never changed it, and one guess would
+    crack them all at once.
+
+    Each hash takes about 0.45 s of one core, so a few thousand passwords take most of an hour of
+    CPU: hash large rosters from the management command, not in a web request.
+    """
+    passwords = list(passwords)
+    workers = workers or settings.PROVISIONING_HASH_WORKERS or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < MIN_PARALLEL_PASSWORDS:
+        return [make_password(password) for password in passwords]
+    # Workers started with 'spawn' (macOS, Windows) need Django set up before they can hash
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=math.ceil(len(passwords) / (workers * 4))))
+
+
+def provision_students(entries, subject_ids=(), workers=None) -> int:
+    """
+    Creates a User, StudentProfile and enrolments for each roster entry (see read_roster), enrolled
+    in `subject_ids` as well as the entry's own subjects. Passwords are hashed first (see
+    hash_passwords), then everything is inserted with a few bulk INSERTs in one transaction.
+    Returns the number of students created.
+    """
+    if not entries:
+        return 0
+    subject_ids = list(subject_ids)
+    hashes = hash_passwords([entry['password'] for entry in entries], workers)
+
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=entry['username'], password=password_hash, role='student', email=entry['email'] or '')
+            for entry, password_hash in zip(entries, hashes)
+        ], batch_size=1000)
+        # bulk_create only returns primary keys on some databases, so read them back
+        user_ids = dict(User.objects.filter(
+            username__in=[entry['username'] for entry in entries]
+        ).values_list('username', 'id'))
+
+        StudentProfile.objects.bulk_create([
+            StudentProfile(
+                user_id=user_ids[entry['username']], full_name=entry['full_name'], roll_number=entry['roll_number'],
+                class_name=entry['class_name'], email=entry['email'], phone_number=entry['phone_number'],
+            )
+            for entry in entries
+        ], batch_size=1000)
+
+        pairs = [
+            (user_ids[entry['username']], subject_id)
+            for entry in entries for subject_id in dict.fromkeys([*subject_ids, *entry['subject_ids']])
+        ]
+        Enrolment = StudentProfile.subjects.through
+        Enrolment.objects.bulk_create([
+            Enrolment(studentprofile_id=student_id, subject_id=subject_id) for student_id, subject_id in pairs
+        ], batch_size=1000)
+
+        # Bulk inserts skip the signals that keep these in step
+        attendance_sync.log_enrolments(pairs, enrolled=True)
+        dashboard_cache.invalidate(subject_ids={subject_id for _, subject_id in pairs})
+        transaction.on_commit(roll_resolver.invalidate)
+
+    return len(entries)
@@ -0,0 +1,88 @@
+# attendance_app/services/approval_inbox.py
+import base64
+import binascii
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Q
+
+from ..models import Approval
+
+
+def encode_cursor(approval, reverse=False) -> str:
+    """An opaque cursor pointing just past `approval`: older approvals, or newer ones with `reverse`."""
+    position = f"{'p' if reverse else 'n'}|{approval.created_at.isoformat()}|{approval.pk}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (reverse, created_at, id) for a cursor from encode_cursor(), or raises ValueError."""
+    try:
+        direction, created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        if direction not in ('n', 'p'):
+            raise ValueError
+        return direction == 'p', datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def _branch(queryset, position, reverse, limit):
+    if position is not None:
+        created_at, pk = position
+        if reverse:
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        else:
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    ordering = ('created_at', 'id') if reverse else ('-created_at', '-id')
+    queryset = queryset.values_list('id', 'created_at')
+    # Limiting each branch lets it stop after one page of its index; SQLite can't limit inside a UNION
+    if connection.features.supports_slicing_ordering_in_compound:
+        queryset = queryset.order_by(*ordering)[:limit]
+    return queryset, ordering
+
+
+def page(teacher_id, status=None, cursor=None, limit=25):
+    """
+    One page of a teacher's approval inbox: the approvals sent to them or CCing them, newest first,
+    optionally only those with `status`. `cursor` comes from a previous page.
+
+    The two halves of the inbox are separate indexed queries (the teacher's own approvals on
+    (teacher, status, created_at, id), the CCs through the CC table) combined with a UNION, rather
+    than one OR across a join that has to be de-duplicated and sorted whole. Paging is keyset on
+    (created_at, id), so any page costs about the same as the first.
+
+    Returns (approvals, next_cursor, previous_cursor); a cursor is None when there is no such page.
+    Raises ValueError for a cursor that can't be decoded.
+    """
+    reverse, position = False, None
+    if cursor:
+        reverse, *position = decode_cursor(cursor)
+
+    own = Approval.objects.filter(teacher_id=teacher_id)
+    cced = Approval.objects.filter(cc_teachers=teacher_id)
+    if status:
+        own, cced = own.filter(status=status), cced.filter(status=status)
+
+    # One row more than the page, to tell whether there is another
+    own, ordering = _branch(own, position, reverse, limit + 1)
+    cced, _ = _branch(cced, position, reverse, limit + 1)
+    # UNION (not UNION ALL) drops an approval that is both sent to and CCing the teacher
+    rows = list(own.union(cced).order_by(*ordering)[:limit + 1])
+
+    has_more = len(rows) > limit
+    ids = [pk for pk, _ in rows[:limit]]
+    if reverse:
+        ids.reverse()
+    by_id = Approval.objects.select_related('student', 'teacher').prefetch_related('cc_teachers').in_bulk(ids)
+    approvals = [by_id[pk] for pk in ids if pk in by_id]
+
+    if not approvals:
+        return [], None, None
+    # Going forwards there is a previous page whenever we came from a cursor, and the other way round
+    has_next = has_more if not reverse else position is not None
+    has_previous = has_more if reverse else position is not None
+    return (
+        approvals,
+        encode_cursor(approvals[-1]) if has_next else None,
+        encode_cursor(approvals[0], reverse=True) if has_previous else None,
+    )
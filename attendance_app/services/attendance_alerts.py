@@ -0,0 +1,110 @@
+# attendance_app/services/attendance_alerts.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Attendance, AttendanceAlert, AttendanceAlertState, AttendanceMonth, AttendanceSummary, ScanWatermark
+from . import attendance_store
+
+SCANNER_NAME = 'attendance_alerts'
+
+
+def _pending_marks(watermark, cutoff):
+    # In the bitmask layout a changed mark bumps its month row's updated_at instead
+    model = AttendanceMonth if attendance_store.bitmask_enabled() else Attendance
+    marks = model.objects.filter(updated_at__lt=cutoff)
+    if watermark.updated_at is not None:
+        marks = marks.filter(
+            Q(updated_at__gt=watermark.updated_at) | Q(updated_at=watermark.updated_at, id__gt=watermark.last_id)
+        )
+    return marks.order_by('updated_at', 'id')
+
+
+def _evaluate(pairs):
+    """
+    Compares the current percentage of each (student_id, subject_id) pair with its state at the
+    last scan, and records an alert for every pair that crossed the threshold. Returns the alert count.
+    """
+    threshold = settings.AT_RISK_THRESHOLD
+    student_ids = {student_id for student_id, _ in pairs}
+    subject_ids = {subject_id for _, subject_id in pairs}
+
+    # The rollup rows are the running counters, kept up to date on every write
+    counts = {
+        (student_id, subject_id): (present, total)
+        for student_id, subject_id, present, total in AttendanceSummary.objects.filter(
+            student_id__in=student_ids, subject_id__in=subject_ids
+        ).values_list('student_id', 'subject_id', 'present_count', 'total_count')
+    }
+    states = {
+        (state.student_id, state.subject_id): state
+        for state in AttendanceAlertState.objects.select_for_update().filter(
+            student_id__in=student_ids, subject_id__in=subject_ids
+        )
+    }
+
+    alerts, new_states, changed_states = [], [], []
+    for pair in pairs:
+        present, total = counts.get(pair, (0, 0))
+        if total < settings.ALERT_MIN_MARKS:
+            continue
+        percentage = present / total * 100
+        below = percentage < threshold
+
+        state = states.get(pair)
+        if state is None:
+            state = AttendanceAlertState(student_id=pair[0], subject_id=pair[1])
+            new_states.append(state)
+        if state.below_threshold == below:
+            continue
+
+        state.below_threshold = below
+        if state.pk:
+            changed_states.append(state)
+        alerts.append(AttendanceAlert(
+            student_id=pair[0], subject_id=pair[1], direction='below' if below else 'recovered',
+            percentage=round(percentage, 2), threshold=threshold,
+        ))
+
+    AttendanceAlertState.objects.bulk_create(new_states)
+    AttendanceAlertState.objects.bulk_update(changed_states, ['below_threshold'])
+    AttendanceAlert.objects.bulk_create(alerts)
+    return len(alerts)
+
+
+def scan(chunk_size=None) -> dict:
+    """
+    Processes the Attendance (or, in the bitmask layout, AttendanceMonth) rows written since the last scan and raises alerts for students whose
+    attendance in a subject crossed AT_RISK_THRESHOLD, in either direction.
+
+    Progress is kept in a (updated_at, id) watermark that is advanced in the same transaction as the
+    alerts it produced, so a scan can be interrupted and re-run, and running it twice changes nothing.
+    Rows newer than ALERT_SCAN_LAG are left for the next run, so marks from transactions that were
+    still open when the scan started can't be skipped.
+    """
+    chunk_size = chunk_size or settings.ALERT_SCAN_CHUNK_SIZE
+    cutoff = timezone.now() - timedelta(seconds=settings.ALERT_SCAN_LAG)
+    ScanWatermark.objects.get_or_create(name=SCANNER_NAME)
+
+    result = {'rows': 0, 'pairs': 0, 'alerts': 0}
+    while True:
+        with transaction.atomic():
+            # Locking the watermark also keeps two scanners from running at once
+            watermark = ScanWatermark.objects.select_for_update().get(name=SCANNER_NAME)
+            batch = list(_pending_marks(watermark, cutoff).values_list(
+                'id', 'updated_at', 'student_id', 'subject_id'
+            )[:chunk_size])
+            if not batch:
+                break
+
+            pairs = {(student_id, subject_id) for _, _, student_id, subject_id in batch}
+            result['alerts'] += _evaluate(pairs)
+            result['rows'] += len(batch)
+            result['pairs'] += len(pairs)
+
+            watermark.last_id, watermark.updated_at = batch[-1][0], batch[-1][1]
+            watermark.save(update_fields=['last_id', 'updated_at'])
+    return result
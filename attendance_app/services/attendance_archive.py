@@ -0,0 +1,91 @@
+# attendance_app/services/attendance_archive.py
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from ..models import Attendance, ArchivedAttendance, ArchivedPeriod
+
+MARK_FIELDS = ['student_id', 'subject_id', 'teacher_id', 'date', 'status', 'created_at', 'updated_at', 'marked_at']
+
+
+def reaches_archive(start: date, end: date) -> bool:
+    """True if any archived period overlaps start..end, i.e. reads for that range must include the archive."""
+    return ArchivedPeriod.objects.filter(start_date__lte=end, end_date__gte=start).exists()
+
+
+def archived_dates(dates) -> set:
+    """The subset of `dates` that fall inside an archived period (one query)."""
+    dates = set(dates)
+    if not dates:
+        return set()
+    periods = list(ArchivedPeriod.objects.filter(
+        start_date__lte=max(dates), end_date__gte=min(dates)
+    ).values_list('start_date', 'end_date'))
+    return {day for day in dates if any(start <= day <= end for start, end in periods)}
+
+
+def mark_sources(start: date, end: date):
+    """The models holding marks for start..end: Attendance, plus ArchivedAttendance when the range reaches back into it."""
+    return (Attendance, ArchivedAttendance) if reaches_archive(start, end) else (Attendance,)
+
+
+def delete_rows(model, ids):
+    """
+    Deletes rows by primary key with a plain DELETE, without model signals (and so without their
+    per-row recounts). Only for models that nothing cascades from.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+
+
+def archive_period(name: str, start: date, end: date, chunk_size=5000, dry_run=False) -> int:
+    """
+    Moves every Attendance row dated start..end into ArchivedAttendance and returns the number moved.
+
+    The period is recorded first, so attendance_writer stops accepting marks for those dates
+    while rows are moved. Each chunk is copied and deleted in one transaction, so the command can
+    be interrupted and re-run. Rollups, month rows and cached dashboards stay valid: the marks move,
+    they don't change.
+
+    Refused in the bitmask layout: the marks live in the month rows there, so there would be nothing
+    to move, and `build_attendance_months --restore-rows` relies on every archived mark being in
+    ArchivedAttendance. Archive periods while in the 'rows' layout.
+    """
+    if settings.ATTENDANCE_STORAGE == 'bitmask':
+        raise ValueError("Periods can only be archived in the 'rows' attendance layout (ATTENDANCE_STORAGE).")
+    if end >= date.today():
+        raise ValueError("Only closed periods (ending before today) can be archived.")
+    if start > end:
+        raise ValueError("The period starts after it ends.")
+
+    rows = Attendance.objects.filter(date__range=(start, end))
+    if dry_run:
+        return rows.count()
+
+    period, _ = ArchivedPeriod.objects.get_or_create(name=name, start_date=start, end_date=end)
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(rows.select_for_update().order_by('id').values_list('id', *MARK_FIELDS)[:chunk_size])
+            if not chunk:
+                break
+
+            ArchivedAttendance.objects.bulk_create([
+                ArchivedAttendance(**dict(zip(MARK_FIELDS, row[1:]))) for row in chunk
+            ])
+            # Not attendance_writer.delete_marks(): the marks move, so there are no tombstones to log
+            delete_rows(Attendance, [row[0] for row in chunk])
+
+            ArchivedPeriod.objects.filter(pk=period.pk).update(row_count=F('row_count') + len(chunk))
+            moved += len(chunk)
+    return moved
@@ -0,0 +1,173 @@
+# attendance_app/services/attendance_export.py
+import csv
+import zipfile
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+from ..models import StudentProfile
+from . import attendance_store
+
+STATUS_CODES = {'present': 'P', 'absent': 'A'}
+
+
+def register_rows(subject_id, start, end):
+    """
+    Yields the attendance register for one subject as lists of cells: a header row, then one row
+    per enrolled student (by roll number) with a P/A/blank cell per day and their totals.
+
+    Students are processed ATTENDANCE_EXPORT_BATCH_SIZE at a time, with one query per batch,
+    so memory stays bounded by batch size x days whatever the class size.
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    column = {day: index for index, day in enumerate(days)}
+
+    yield ['Roll Number', 'Name'] + [day.isoformat() for day in days] + ['Present', 'Total', 'Percentage']
+
+    students = (
+        StudentProfile.objects.filter(subjects__id=subject_id)
+        .order_by('roll_number')
+        .values_list('user_id', 'roll_number', 'full_name')
+    )
+    batch_size = settings.ATTENDANCE_EXPORT_BATCH_SIZE
+    last_roll_number = None
+    while True:
+        # Keyset pagination on the (unique) roll number
+        page = students if last_roll_number is None else students.filter(roll_number__gt=last_roll_number)
+        batch = list(page[:batch_size])
+        if not batch:
+            break
+        last_roll_number = batch[-1][1]
+
+        cells = {student_id: [''] * len(days) for student_id, _, _ in batch}
+        for student_id, day, status in attendance_store.iter_marks(
+            subject_id, start, end, student_ids=list(cells), chunk_size=batch_size * 50
+        ):
+            cells[student_id][column[day]] = STATUS_CODES.get(status, '')
+
+        for student_id, roll_number, full_name in batch:
+            row = cells.pop(student_id)
+            present = row.count('P')
+            total = present + row.count('A')
+            percentage = round(present / total * 100, 2) if total else 0
+            yield [roll_number, full_name] + row + [present, total, percentage]
+
+
+# --- CSV ---
+class _Echo:
+    """A file-like object whose write() just returns the value, so csv.writer can produce one line at a time."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+# --- XLSX ---
+# An .xlsx file is a zip of XML parts. The worksheet is written row by row with inline strings
+# (no shared string table to build up front), and the zip is written to an unseekable buffer
+# that is drained after every row, so nothing is held in memory beyond the current row.
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Attendance" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+class _StreamBuffer:
+    """Write-only, unseekable file object: zipfile writes into it, the generator drains it."""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(row_number, values):
+    cells = []
+    for index, value in enumerate(values):
+        ref = f"{_column_letter(index)}{row_number}"
+        if isinstance(value, (int, float)):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        elif value:
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+
+def stream_xlsx(rows):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for row_number, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row_number, row).encode())
+                data = buffer.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
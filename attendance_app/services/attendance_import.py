@@ -0,0 +1,133 @@
+# attendance_app/services/attendance_import.py
+import csv
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Subject
+from . import attendance_archive, attendance_writer, roll_resolver
+
+REQUIRED_COLUMNS = ['roll_number', 'subject', 'date', 'status']
+REJECT_COLUMNS = ['line'] + REQUIRED_COLUMNS + ['reason']
+
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y']
+STATUS_ALIASES = {'present': 'present', 'p': 'present', 'absent': 'absent', 'a': 'absent'}
+
+
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+class AttendanceImporter:
+    """
+    Imports attendance marks from a CSV stream with columns roll_number, subject, date, status.
+
+    The file is read one line at a time and written through attendance_writer in chunks of
+    ATTENDANCE_IMPORT_CHUNK_SIZE rows, each in its own transaction, so memory stays bounded.
+    Rows that can't be imported are written to `rejects` (a text stream) with the reason.
+
+    Every row read is counted once: rows = inserted + updated + unchanged + duplicates + stale +
+    archived + rejected, where 'duplicates' are rows superseded by a later row for the same mark in
+    the same chunk. If the file can't be decoded part way through, the rows read before the bad
+    line are still written and the error is raised with `counts` covering them.
+    """
+    def __init__(self, teacher_id, rejects, allowed_subject_ids=None, chunk_size=None):
+        self.teacher_id = teacher_id
+        self.allowed_subject_ids = None if allowed_subject_ids is None else set(allowed_subject_ids)
+        self.chunk_size = chunk_size or settings.ATTENDANCE_IMPORT_CHUNK_SIZE
+
+        self.rejects = csv.writer(rejects)
+        self.rejects.writerow(REJECT_COLUMNS)
+
+        # Preloaded lookups: roll numbers through the shared resolver, subjects by case-insensitive name
+        self.resolver = roll_resolver.get_resolver()
+        self.subjects = {name.casefold().strip(): pk for pk, name in Subject.objects.values_list('id', 'name')}
+
+        self.counts = {
+            'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0,
+            'duplicates': 0, 'stale': 0, 'archived': 0, 'rejected': 0,
+        }
+
+    def reject(self, line, record, reason):
+        self.counts['rejected'] += 1
+        self.rejects.writerow([line] + [record.get(column, '') for column in REQUIRED_COLUMNS] + [reason])
+
+    def parse(self, line, record):
+        """
+        Returns (attendance_writer row, matched roll number) for a CSV record, or None after rejecting it.
+        """
+        match = self.resolver.resolve(record.get('roll_number') or '')
+        if match is None:
+            return self.reject(line, record, 'Unknown roll number')
+
+        subject_id = self.subjects.get((record.get('subject') or '').casefold().strip())
+        if subject_id is None:
+            return self.reject(line, record, 'Unknown subject')
+        if self.allowed_subject_ids is not None and subject_id not in self.allowed_subject_ids:
+            return self.reject(line, record, 'You do not teach this subject')
+
+        day = parse_date((record.get('date') or '').strip())
+        if day is None:
+            return self.reject(line, record, 'Invalid date')
+
+        status = STATUS_ALIASES.get((record.get('status') or '').casefold().strip())
+        if status is None:
+            return self.reject(line, record, 'Invalid status')
+
+        return (match['student_id'], subject_id, day, status, self.teacher_id), match['roll_number']
+
+    def write_chunk(self, chunk):
+        # Marks for archived periods are refused by the writer; reject them here so they're reported
+        archived = attendance_archive.archived_dates({row[2] for _, _, row, _ in chunk})
+        # The shared resolver may be stale in this process: confirm the matches in one query
+        confirmed = roll_resolver.confirm_matches({row[0]: roll_number for _, _, row, roll_number in chunk})
+        rows = []
+        for line, record, row, _ in chunk:
+            if row[2] in archived:
+                self.reject(line, record, 'Date belongs to an archived period')
+            elif row[0] not in confirmed:
+                self.reject(line, record, 'Unknown roll number')
+            else:
+                rows.append(row)
+
+        # The writer keeps the last row for each mark
+        self.counts['duplicates'] += len(rows) - len({row[:3] for row in rows})
+        with transaction.atomic():
+            counts = attendance_writer.upsert_attendance(rows, chunk_size=self.chunk_size)
+        for key in ('inserted', 'updated', 'unchanged', 'stale', 'archived'):
+            self.counts[key] += counts[key]
+
+    def run(self, csv_stream) -> dict:
+        reader = csv.DictReader(csv_stream)
+        header = [column.strip().lower() for column in reader.fieldnames or []]
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise ValueError(f"The CSV is missing the column(s): {', '.join(missing)}")
+        reader.fieldnames = header
+
+        chunk = []
+        try:
+            for record in reader:
+                self.counts['rows'] += 1
+                line = reader.line_num
+                parsed = self.parse(line, record)
+                if parsed is None:
+                    continue
+                chunk.append((line, record, *parsed))
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(chunk)
+                    chunk = []
+        except (UnicodeDecodeError, csv.Error):
+            # Earlier chunks are already committed: write the rest read so far, so `counts` is exact
+            if chunk:
+                self.write_chunk(chunk)
+            raise
+        if chunk:
+            self.write_chunk(chunk)
+        return self.counts
@@ -0,0 +1,160 @@
+# attendance_app/services/attendance_rollups.py
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from ..models import Attendance, ArchivedAttendance, AttendanceSummary, DailyAttendanceSummary
+from . import attendance_store
+
+# (model, key fields) for each rollup table
+ROLLUPS = [
+    (AttendanceSummary, ('student_id', 'subject_id')),
+    (DailyAttendanceSummary, ('subject_id', 'date')),
+]
+
+
+def _unique_fields(key_fields):
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    if not connection.features.supports_update_conflicts_with_target:
+        return None
+    return [field.removesuffix('_id') for field in key_fields]
+
+
+def _key_filter(key_fields, keys):
+    """A filter that covers `keys` (it may over-match; callers re-check keys in memory)."""
+    return {f"{field}__in": {key[i] for key in keys} for i, field in enumerate(key_fields)}
+
+
+def _apply_deltas(model, key_fields, deltas):
+    """
+    Adds {key: [present_delta, total_delta]} onto the rollup rows, creating missing rows and
+    removing rows left without marks. Rows are locked first so concurrent writers can't lose each
+    other's increments.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta != [0, 0]}
+    if not deltas:
+        return
+
+    # 1. Make sure every row exists (a no-op for rows that already do)
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in deltas],
+        ignore_conflicts=True,
+    )
+
+    # 2. Lock, adjust in memory and write back in one UPDATE
+    rows = []
+    for row in model.objects.select_for_update().filter(**_key_filter(key_fields, deltas)):
+        delta = deltas.get(tuple(getattr(row, field) for field in key_fields))
+        if delta:
+            row.present_count += delta[0]
+            row.total_count += delta[1]
+            rows.append(row)
+    model.objects.bulk_update(rows, ['present_count', 'total_count'])
+    emptied = [row.pk for row in rows if not row.total_count]
+    if emptied:
+        model.objects.filter(pk__in=emptied).delete()
+
+
+def apply_changes(changes):
+    """
+    Updates the rollups for a batch of attendance writes. Must run in the same transaction as the writes.
+
+    `changes` is an iterable of (student_id, subject_id, date, old_status, new_status);
+    old_status is None for a new mark, new_status is None for a deleted one.
+    """
+    per_student = defaultdict(lambda: [0, 0])
+    per_day = defaultdict(lambda: [0, 0])
+
+    for student_id, subject_id, date, old_status, new_status in changes:
+        present = (new_status == 'present') - (old_status == 'present')
+        total = (new_status is not None) - (old_status is not None)
+        for bucket in (per_student[(student_id, subject_id)], per_day[(subject_id, date)]):
+            bucket[0] += present
+            bucket[1] += total
+
+    with transaction.atomic():
+        _apply_deltas(AttendanceSummary, ROLLUPS[0][1], per_student)
+        _apply_deltas(DailyAttendanceSummary, ROLLUPS[1][1], per_day)
+
+
+def _count(key_fields, **filters):
+    """{key: (present, total)} computed from raw marks, hot and archived (archived marks keep counting)."""
+    if attendance_store.bitmask_enabled():
+        return attendance_store.count_months(key_fields, **filters)
+    counts = defaultdict(lambda: (0, 0))
+    for model in (Attendance, ArchivedAttendance):
+        for row in model.objects.filter(**filters).values(*key_fields).annotate(
+            present=Count('id', filter=Q(status='present')),
+            total=Count('id'),
+        ).order_by():
+            key = tuple(row[field] for field in key_fields)
+            counts[key] = (counts[key][0] + row['present'], counts[key][1] + row['total'])
+    return dict(counts)
+
+
+def _write_absolute(model, key_fields, keys, counts):
+    """Sets the rollup rows for `keys` to `counts`; keys without marks are removed."""
+    empty = {key for key in keys if key not in counts}
+    if empty:
+        stale_ids = [
+            row[0] for row in model.objects.filter(**_key_filter(key_fields, empty)).values_list('pk', *key_fields)
+            if tuple(row[1:]) in empty
+        ]
+        model.objects.filter(pk__in=stale_ids).delete()
+
+    if counts:
+        model.objects.bulk_create(
+            [
+                model(**dict(zip(key_fields, key)), present_count=present, total_count=total)
+                for key, (present, total) in counts.items()
+            ],
+            update_conflicts=True,
+            update_fields=['present_count', 'total_count'],
+            unique_fields=_unique_fields(key_fields),
+        )
+
+
+def recompute(student_subject_pairs=(), subject_days=()):
+    """
+    Recounts specific rollup rows from the marks. Used for single-row writes that go through
+    model save()/delete() (admin, cascades, scripts), where the previous status isn't known.
+    """
+    student_subject_pairs, subject_days = set(student_subject_pairs), set(subject_days)
+
+    with transaction.atomic():
+        for (model, key_fields), keys in zip(ROLLUPS, (student_subject_pairs, subject_days)):
+            if not keys:
+                continue
+            counts = _count(key_fields, **_key_filter(key_fields, keys))
+            counts = {key: value for key, value in counts.items() if key in keys}
+            _write_absolute(model, key_fields, keys, counts)
+
+
+def rebuild(verify_only=False, chunk_size=5000):
+    """
+    Recomputes both rollup tables from scratch.
+    Returns {table name: number of rows that were wrong, missing or extra}.
+    With verify_only, nothing is written.
+    """
+    report = {}
+    with transaction.atomic():
+        for model, key_fields in ROLLUPS:
+            expected = _count(key_fields)
+            current = {
+                tuple(row[:-2]): tuple(row[-2:])
+                for row in model.objects.values_list(*key_fields, 'present_count', 'total_count')
+            }
+            report[model.__name__] = sum(
+                1 for key in set(expected) | set(current) if expected.get(key) != current.get(key)
+            )
+
+            if not verify_only and report[model.__name__]:
+                model.objects.all().delete()
+                items = list(expected.items())
+                for start in range(0, len(items), chunk_size):
+                    model.objects.bulk_create([
+                        model(**dict(zip(key_fields, key)), present_count=present, total_count=total)
+                        for key, (present, total) in items[start:start + chunk_size]
+                    ])
+    return report
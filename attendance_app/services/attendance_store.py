@@ -0,0 +1,574 @@
+# attendance_app/services/attendance_store.py
+# Read and write API for attendance marks over the two storage layouts:
+#  - 'rows' (default): one Attendance row per student, subject and day.
+#  - 'bitmask': one AttendanceMonth row per student, subject and month, with a bit per day. The month
+#    rows replace the Attendance rows: marks are only written there, with a small audit (the month's
+#    latest marker and when each day was marked), and the hot Attendance table stays empty.
+# Row reads include ArchivedAttendance when the date range reaches an archived period.
+# To switch to 'bitmask', set settings.ATTENDANCE_STORAGE and run `manage.py build_attendance_months`
+# (folds the rows into months); to switch back, `manage.py build_attendance_months --restore-rows`.
+# The month rows don't keep a teacher per day, so a round trip attributes every mark of a month to
+# the teacher who took its latest mark (exact when one teacher marks a subject all month).
+import struct
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Attendance, ArchivedAttendance, ArchivedPeriod, AttendanceMonth
+from . import attendance_archive
+
+# AttendanceMonth.mark_times: a Unix time (seconds) per day of the month, 0 when unknown
+MARK_TIMES = struct.Struct('<31I')
+
+
+def bitmask_enabled() -> bool:
+    return settings.ATTENDANCE_STORAGE == 'bitmask'
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _month_end(month: date) -> date:
+    return (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def day_bit(day: date) -> int:
+    return 1 << (day.day - 1)
+
+
+def _unpack_times(blob) -> list:
+    return list(MARK_TIMES.unpack(bytes(blob))) if blob else [0] * 31
+
+
+def _to_seconds(moment) -> int:
+    return int(moment.timestamp()) if moment else 0
+
+
+def _from_seconds(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc) if seconds else None
+
+
+def decode(month: date, present_mask: int, recorded_mask: int):
+    """Yields (date, status) for every recorded day of the month, in order."""
+    day_index = 0
+    while recorded_mask >> day_index:
+        if recorded_mask >> day_index & 1:
+            status = 'present' if present_mask >> day_index & 1 else 'absent'
+            yield month + timedelta(days=day_index), status
+        day_index += 1
+
+
+# --- Reads ---
+def month_masks(subject_id, month: date) -> dict:
+    """{student_id: (present_mask, recorded_mask)} for one subject and month."""
+    month = month_start(month)
+    if bitmask_enabled():
+        return {
+            student_id: (present, recorded)
+            for student_id, present, recorded in AttendanceMonth.objects.filter(
+                subject_id=subject_id, month=month
+            ).values_list('student_id', 'present_mask', 'recorded_mask')
+        }
+
+    month_end = _month_end(month)
+    masks = defaultdict(lambda: [0, 0])
+    for model in attendance_archive.mark_sources(month, month_end):
+        for student_id, day, status in model.objects.filter(
+            subject_id=subject_id, date__range=(month, month_end)
+        ).values_list('student_id', 'date', 'status'):
+            bit = day_bit(day)
+            masks[student_id][1] |= bit
+            if status == 'present':
+                masks[student_id][0] |= bit
+    return {student_id: tuple(pair) for student_id, pair in masks.items()}
+
+
+def month_version(subject_id, month: date) -> dict:
+    """{'last_modified': datetime or None, 'count': int}; changes whenever the month's marks do."""
+    month = month_start(month)
+    if bitmask_enabled():
+        return AttendanceMonth.objects.filter(subject_id=subject_id, month=month).aggregate(
+            last_modified=Max('updated_at'), count=Count('id')
+        )
+
+    month_end = _month_end(month)
+    version = {'last_modified': None, 'count': 0}
+    for model in attendance_archive.mark_sources(month, month_end):
+        part = model.objects.filter(subject_id=subject_id, date__range=(month, month_end)).aggregate(
+            last_modified=Max('updated_at'), count=Count('id')
+        )
+        version['count'] += part['count']
+        if part['last_modified'] and (version['last_modified'] is None or part['last_modified'] > version['last_modified']):
+            version['last_modified'] = part['last_modified']
+    return version
+
+
+def daily_presents(student_id, start: date, end: date) -> dict:
+    """{date: number of subjects the student was present in} for start..end (days without presents omitted)."""
+    presents = defaultdict(int)
+    if not bitmask_enabled():
+        for model in attendance_archive.mark_sources(start, end):
+            for row in model.objects.filter(student_id=student_id, date__range=(start, end), status='present') \
+                    .values('date').annotate(presents=Count('id')).order_by():
+                presents[row['date']] += row['presents']
+        return dict(presents)
+
+    for month, present_mask, recorded_mask in AttendanceMonth.objects.filter(
+        student_id=student_id, month__range=(month_start(start), end)
+    ).values_list('month', 'present_mask', 'recorded_mask'):
+        for day, status in decode(month, present_mask, recorded_mask):
+            if status == 'present' and start <= day <= end:
+                presents[day] += 1
+    return {day: count for day, count in presents.items() if count}
+
+
+def iter_marks(subject_id, start: date, end: date, student_ids=None, chunk_size=2000):
+    """
+    Yields (student_id, date, status) for one subject between start and end (optionally only
+    for `student_ids`), ordered by student then date, streaming from the database in chunks.
+    """
+    students = {} if student_ids is None else {'student_id__in': student_ids}
+
+    if not bitmask_enabled():
+        marks = [
+            model.objects.filter(subject_id=subject_id, date__range=(start, end), **students)
+            .values_list('student_id', 'date', 'status')
+            for model in attendance_archive.mark_sources(start, end)
+        ]
+        marks = marks[0].union(*marks[1:], all=True) if len(marks) > 1 else marks[0]
+        yield from marks.order_by('student_id', 'date').iterator(chunk_size=chunk_size)
+        return
+
+    for student_id, month, present_mask, recorded_mask in AttendanceMonth.objects.filter(
+        subject_id=subject_id, month__range=(month_start(start), end), **students
+    ).order_by('student_id', 'month').values_list(
+        'student_id', 'month', 'present_mask', 'recorded_mask'
+    ).iterator(chunk_size=chunk_size):
+        for day, status in decode(month, present_mask, recorded_mask):
+            if start <= day <= end:
+                yield student_id, day, status
+
+
+def marks_between(start: date, end: date, subject_ids, student_ids=None):
+    """Yields (student_id, subject_id, date, status) for `subject_ids` between start and end, unordered."""
+    filters = {'subject_id__in': subject_ids}
+    if student_ids is not None:
+        filters['student_id__in'] = student_ids
+
+    if not bitmask_enabled():
+        for model in attendance_archive.mark_sources(start, end):
+            yield from model.objects.filter(date__range=(start, end), **filters).values_list(
+                'student_id', 'subject_id', 'date', 'status'
+            ).order_by().iterator(chunk_size=5000)
+        return
+
+    for student_id, subject_id, month, present_mask, recorded_mask in AttendanceMonth.objects.filter(
+        month__range=(month_start(start), end), **filters
+    ).values_list('student_id', 'subject_id', 'month', 'present_mask', 'recorded_mask').iterator(chunk_size=5000):
+        for day, status in decode(month, present_mask, recorded_mask):
+            if start <= day <= end:
+                yield student_id, subject_id, day, status
+
+
+def count_months(key_fields, **filters) -> dict:
+    """
+    Bitmask layout: {key: (present, total)} counted from the month rows, for attendance_rollups.
+    `key_fields` is ('student_id', 'subject_id') or ('subject_id', 'date'); `filters` are the same
+    *__in filters the rollups use on the marks (date__in is widened to whole months).
+    """
+    if 'date__in' in filters:
+        filters['month__in'] = {month_start(day) for day in filters.pop('date__in')}
+    per_day = 'date' in key_fields
+
+    counts = defaultdict(lambda: [0, 0])
+    for student_id, subject_id, month, present_mask, recorded_mask in AttendanceMonth.objects.filter(
+        **filters
+    ).values_list('student_id', 'subject_id', 'month', 'present_mask', 'recorded_mask').iterator(chunk_size=5000):
+        if per_day:
+            for day, status in decode(month, present_mask, recorded_mask):
+                count = counts[(subject_id, day)]
+                count[0] += status == 'present'
+                count[1] += 1
+        else:
+            count = counts[(student_id, subject_id)]
+            count[0] += bin(present_mask).count('1')
+            count[1] += bin(recorded_mask).count('1')
+    return {key: tuple(count) for key, count in counts.items()}
+
+
+def marks_of(**owner) -> list:
+    """
+    [(student_id, subject_id, date, status)] for every mark, hot and archived, of one student, subject
+    or teacher (student_id=, subject_id= or teacher_id=): the marks that are deleted along with them.
+    In the bitmask layout month rows outlive the teacher who marked them, so a teacher has none.
+    """
+    if not bitmask_enabled():
+        return [
+            mark for model in (Attendance, ArchivedAttendance)
+            for mark in model.objects.filter(**owner).values_list('student_id', 'subject_id', 'date', 'status')
+        ]
+    if 'teacher_id' in owner:
+        return []
+    return [
+        (student_id, subject_id, day, status)
+        for student_id, subject_id, month, present_mask, recorded_mask in AttendanceMonth.objects.filter(
+            **owner
+        ).values_list('student_id', 'subject_id', 'month', 'present_mask', 'recorded_mask')
+        for day, status in decode(month, present_mask, recorded_mask)
+    ]
+
+
+# --- Writes ---
+def read_marks(keys, lock=False) -> dict:
+    """
+    {(student_id, subject_id, date): (status, teacher_id, marked_at)} for the stored marks among `keys`.
+    With `lock` the rows are read with SELECT ... FOR UPDATE, which also sees the latest committed rows.
+    In the bitmask layout teacher_id is None (only the month's latest marker is kept) and marked_at
+    is to the second.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    filters = {
+        'student_id__in': {key[0] for key in keys},
+        'subject_id__in': {key[1] for key in keys},
+    }
+
+    if not bitmask_enabled():
+        marks = Attendance.objects.select_for_update() if lock else Attendance.objects
+        return {
+            (student_id, subject_id, day): (status, teacher_id, marked_at)
+            for student_id, subject_id, day, status, teacher_id, marked_at in marks.filter(
+                date__in={key[2] for key in keys}, **filters
+            ).values_list('student_id', 'subject_id', 'date', 'status', 'teacher_id', 'marked_at')
+            if (student_id, subject_id, day) in keys
+        }
+
+    days = defaultdict(list)
+    for student_id, subject_id, day in keys:
+        days[(student_id, subject_id, month_start(day))].append(day)
+    months = AttendanceMonth.objects.select_for_update() if lock else AttendanceMonth.objects
+
+    marks = {}
+    for student_id, subject_id, month, present_mask, recorded_mask, mark_times in months.filter(
+        month__in={key[2] for key in days}, **filters
+    ).values_list('student_id', 'subject_id', 'month', 'present_mask', 'recorded_mask', 'mark_times'):
+        wanted = days.get((student_id, subject_id, month))
+        if not wanted:
+            continue
+        times = _unpack_times(mark_times)
+        for day in wanted:
+            bit = day_bit(day)
+            if recorded_mask & bit:
+                status = 'present' if present_mask & bit else 'absent'
+                marks[(student_id, subject_id, day)] = (status, None, _from_seconds(times[day.day - 1]))
+    return marks
+
+
+def write_marks(marks):
+    """
+    Stores marks, each (student_id, subject_id, date, status, teacher_id, marked_at), replacing any
+    stored mark for the same day. Skips model signals: callers update the rollups, sync log and caches.
+    """
+    marks = list(marks)
+    if not marks:
+        return
+
+    if not bitmask_enabled():
+        # MySQL upserts on any unique key (ON DUPLICATE KEY UPDATE) and rejects an explicit
+        # conflict target; PostgreSQL and SQLite require one.
+        unique_fields = ['student', 'subject', 'date'] if connection.features.supports_update_conflicts_with_target else None
+        Attendance.objects.bulk_create(
+            [
+                Attendance(student_id=student_id, subject_id=subject_id, date=day, status=status,
+                           teacher_id=teacher_id, marked_at=marked_at)
+                for student_id, subject_id, day, status, teacher_id, marked_at in marks
+            ],
+            update_conflicts=True,
+            update_fields=['status', 'teacher', 'marked_at', 'updated_at'],
+            unique_fields=unique_fields,
+        )
+        return
+
+    updates = defaultdict(list)
+    for student_id, subject_id, day, status, teacher_id, marked_at in marks:
+        updates[(student_id, subject_id, month_start(day))].append((day, status, teacher_id, marked_at))
+    _update_months(updates)
+
+
+def delete_marks(keys):
+    """
+    Deletes the stored marks for (student_id, subject_id, date) keys. Skips model signals: callers
+    update the rollups, sync log and caches.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+
+    if not bitmask_enabled():
+        ids = [
+            pk for pk, student_id, subject_id, day in Attendance.objects.filter(
+                student_id__in={key[0] for key in keys},
+                subject_id__in={key[1] for key in keys},
+                date__in={key[2] for key in keys},
+            ).values_list('pk', 'student_id', 'subject_id', 'date')
+            if (student_id, subject_id, day) in keys
+        ]
+        attendance_archive.delete_rows(Attendance, ids)
+        return
+
+    updates = defaultdict(list)
+    for student_id, subject_id, day in keys:
+        updates[(student_id, subject_id, month_start(day))].append((day, None, None, None))
+    _update_months(updates)
+
+
+def _update_months(updates):
+    """
+    Applies {(student_id, subject_id, month): [(date, status, teacher_id, marked_at)]} to the month rows;
+    a status of None clears the day. Rows are locked first so concurrent writers can't lose each other's bits.
+    """
+    key_fields = ('student_id', 'subject_id', 'month')
+    with transaction.atomic():
+        AttendanceMonth.objects.bulk_create(
+            [AttendanceMonth(**dict(zip(key_fields, key))) for key in updates],
+            ignore_conflicts=True,
+        )
+
+        now = timezone.now()
+        changed, emptied = [], []
+        for row in AttendanceMonth.objects.select_for_update().filter(
+            student_id__in={key[0] for key in updates},
+            subject_id__in={key[1] for key in updates},
+            month__in={key[2] for key in updates},
+        ):
+            marks = updates.get((row.student_id, row.subject_id, row.month))
+            if marks is None:
+                continue
+            times = _unpack_times(row.mark_times)
+            for day, status, teacher_id, marked_at in marks:
+                bit = day_bit(day)
+                if status is None:
+                    row.recorded_mask &= ~bit
+                    row.present_mask &= ~bit
+                    times[day.day - 1] = 0
+                    continue
+                row.recorded_mask |= bit
+                if status == 'present':
+                    row.present_mask |= bit
+                else:
+                    row.present_mask &= ~bit
+                times[day.day - 1] = _to_seconds(marked_at)
+                if marked_at and (row.marked_at is None or marked_at >= row.marked_at):
+                    row.marked_by_id, row.marked_at = teacher_id, marked_at
+            row.mark_times = MARK_TIMES.pack(*times)
+            row.updated_at = now # bulk_update doesn't apply auto_now
+            (changed if row.recorded_mask else emptied).append(row)
+
+        AttendanceMonth.objects.bulk_update(
+            changed, ['present_mask', 'recorded_mask', 'mark_times', 'marked_by', 'marked_at', 'updated_at']
+        )
+        AttendanceMonth.objects.filter(pk__in=[row.pk for row in emptied]).delete()
+
+
+def absorb(mark):
+    """
+    Bitmask layout: applies one Attendance or ArchivedAttendance row saved through the ORM (admin,
+    scripts) to its month row. An Attendance row is then deleted, so the mark only lives in the
+    month row; archived rows stay as the record of their period.
+    """
+    marked_at = getattr(mark, 'marked_at', None) or mark.updated_at
+    _update_months({
+        (mark.student_id, mark.subject_id, month_start(mark.date)):
+            [(mark.date, mark.status, mark.teacher_id, marked_at)],
+    })
+    if isinstance(mark, Attendance):
+        attendance_archive.delete_rows(Attendance, [mark.pk])
+
+
+# --- Converting between the layouts ---
+def _expected_months(keys=None, chunk_size=5000) -> dict:
+    """
+    {(student_id, subject_id, month): AttendanceMonth} built from hot and archived marks, for every
+    month or only `keys` (read with an over-matching filter, then checked in memory).
+    """
+    filters = {}
+    if keys is not None:
+        filters = {
+            'student_id__in': {key[0] for key in keys},
+            'subject_id__in': {key[1] for key in keys},
+            'date__range': (min(key[2] for key in keys), _month_end(max(key[2] for key in keys))),
+        }
+
+    months = {}
+    for model in (Attendance, ArchivedAttendance):
+        # Rows from before offline marking have no marked_at: use their last change
+        for student_id, subject_id, day, status, teacher_id, marked_at in model.objects.filter(
+            **filters
+        ).values_list(
+            'student_id', 'subject_id', 'date', 'status', 'teacher_id', Coalesce('marked_at', 'updated_at')
+        ).iterator(chunk_size=chunk_size):
+            key = (student_id, subject_id, month_start(day))
+            if keys is not None and key not in keys:
+                continue
+            row = months.get(key)
+            if row is None:
+                row = months[key] = AttendanceMonth(student_id=student_id, subject_id=subject_id, month=key[2])
+                row.times = [0] * 31
+            bit = day_bit(day)
+            row.recorded_mask |= bit
+            if status == 'present':
+                row.present_mask |= bit
+            row.times[day.day - 1] = _to_seconds(marked_at)
+            if row.marked_at is None or marked_at >= row.marked_at:
+                row.marked_by_id, row.marked_at = teacher_id, marked_at
+
+    for row in months.values():
+        row.mark_times = MARK_TIMES.pack(*row.times)
+    return months
+
+
+def fold_rows(chunk_size=5000) -> int:
+    """
+    Bitmask layout: moves the hot Attendance rows into month rows and returns the number of rows moved.
+    Every month that has rows is rewritten from them (hot and archived), then its hot rows are
+    deleted, a batch at a time, so it can be interrupted and re-run. Archived marks stay where they
+    are; months that only have archived marks are built if they are missing. Run after switching
+    to 'bitmask', and after anything that inserts Attendance rows in bulk.
+    """
+    if not bitmask_enabled():
+        raise RuntimeError("Attendance rows are only folded into months when ATTENDANCE_STORAGE is 'bitmask'.")
+
+    # Archived periods are read-only, so a month row built from their marks stays right
+    missing = {
+        (student_id, subject_id, month_start(day))
+        for student_id, subject_id, day in ArchivedAttendance.objects.values_list(
+            'student_id', 'subject_id', 'date'
+        ).iterator(chunk_size=chunk_size)
+    }
+    missing -= set(AttendanceMonth.objects.values_list('student_id', 'subject_id', 'month').iterator(chunk_size=chunk_size))
+    missing = sorted(missing)
+    for start in range(0, len(missing), chunk_size):
+        AttendanceMonth.objects.bulk_create(
+            _expected_months(set(missing[start:start + chunk_size]), chunk_size).values(), ignore_conflicts=True
+        )
+
+    folded = 0
+    while True:
+        with transaction.atomic():
+            keys = {
+                (student_id, subject_id, month_start(day))
+                for student_id, subject_id, day in Attendance.objects.order_by('id').values_list(
+                    'student_id', 'subject_id', 'date'
+                )[:chunk_size]
+            }
+            if not keys:
+                break
+            months = _expected_months(keys, chunk_size)
+
+            ids = [
+                pk for pk, student_id, subject_id, day in Attendance.objects.filter(
+                    student_id__in={key[0] for key in keys},
+                    subject_id__in={key[1] for key in keys},
+                    date__range=(min(key[2] for key in keys), _month_end(max(key[2] for key in keys))),
+                ).select_for_update().values_list('pk', 'student_id', 'subject_id', 'date')
+                if (student_id, subject_id, month_start(day)) in keys
+            ]
+            existing = [
+                pk for pk, student_id, subject_id, month in AttendanceMonth.objects.filter(
+                    student_id__in={key[0] for key in keys},
+                    subject_id__in={key[1] for key in keys},
+                    month__in={key[2] for key in keys},
+                ).values_list('pk', 'student_id', 'subject_id', 'month')
+                if (student_id, subject_id, month) in keys
+            ]
+            AttendanceMonth.objects.filter(pk__in=existing).delete()
+            AttendanceMonth.objects.bulk_create(months.values(), batch_size=chunk_size)
+            attendance_archive.delete_rows(Attendance, ids)
+            folded += len(ids)
+    return folded
+
+
+def restore_rows(fallback_teacher_id=None, chunk_size=5000) -> dict:
+    """
+    Writes the month rows back out as Attendance rows, for switching from 'bitmask' back to 'rows'.
+
+    Month rows only keep the teacher who took their latest mark, so every day of a month is
+    attributed to that teacher: the original teacher of each day is lost when marks are folded.
+    Months whose teacher has since been deleted are attributed to `fallback_teacher_id`; without
+    one, ValueError is raised before anything is written, rather than dropping their marks (the
+    rollups still count them). Days in archived periods are already in ArchivedAttendance and
+    existing rows are kept. Returns {'restored': marks written, 'reattributed': months given to the
+    fallback teacher}.
+    """
+    unattributed = AttendanceMonth.objects.filter(marked_by__isnull=True).count()
+    if unattributed and fallback_teacher_id is None:
+        raise ValueError(
+            f"{unattributed} months were last marked by a teacher who no longer exists: "
+            "give a teacher to attribute their marks to."
+        )
+
+    periods = list(ArchivedPeriod.objects.values_list('start_date', 'end_date'))
+    result = {'restored': 0, 'reattributed': 0}
+    batch = []
+
+    def flush():
+        Attendance.objects.bulk_create(batch, ignore_conflicts=True)
+        result['restored'] += len(batch)
+        batch.clear()
+
+    for student_id, subject_id, month, present_mask, recorded_mask, mark_times, teacher_id, updated_at in (
+        AttendanceMonth.objects.order_by('id').values_list(
+            'student_id', 'subject_id', 'month', 'present_mask', 'recorded_mask', 'mark_times', 'marked_by_id', 'updated_at'
+        ).iterator(chunk_size=chunk_size)
+    ):
+        if teacher_id is None:
+            teacher_id = fallback_teacher_id
+            result['reattributed'] += 1
+        times = _unpack_times(mark_times)
+        for day, status in decode(month, present_mask, recorded_mask):
+            if any(start <= day <= end for start, end in periods):
+                continue
+            batch.append(Attendance(
+                student_id=student_id, subject_id=subject_id, teacher_id=teacher_id, date=day, status=status,
+                marked_at=_from_seconds(times[day.day - 1]) or updated_at,
+            ))
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+    return result
+
+
+def rebuild(verify_only=False, chunk_size=5000) -> int:
+    """
+    Recomputes every AttendanceMonth row from the hot and archived marks, in the 'rows' layout
+    (in the 'bitmask' layout the month rows are the marks; see fold_rows). Returns the number of
+    month rows whose statuses were wrong, missing or extra; with verify_only nothing is written.
+    """
+    if bitmask_enabled():
+        raise RuntimeError("In the 'bitmask' layout the month rows are the marks and can't be rebuilt from rows.")
+
+    with transaction.atomic():
+        expected = _expected_months(chunk_size=chunk_size)
+        current = {
+            tuple(row[:3]): tuple(row[3:])
+            for row in AttendanceMonth.objects.values_list(
+                'student_id', 'subject_id', 'month', 'present_mask', 'recorded_mask'
+            ).iterator(chunk_size=chunk_size)
+        }
+        mismatches = sum(
+            1 for key in set(expected) | set(current)
+            if (key in expected and (expected[key].present_mask, expected[key].recorded_mask)) != current.get(key)
+        )
+
+        if not verify_only and mismatches:
+            AttendanceMonth.objects.all().delete()
+            AttendanceMonth.objects.bulk_create(expected.values(), batch_size=chunk_size)
+    return mismatches
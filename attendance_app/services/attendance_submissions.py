@@ -0,0 +1,149 @@
+# attendance_app/services/attendance_submissions.py
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import IdempotencyKey, StudentProfile
+from . import attendance_writer
+
+KEY_MAX_LENGTH = 64
+
+
+def _stored_response(teacher_id, batch_key):
+    # One lookup on the (teacher, scope, key) unique index
+    return IdempotencyKey.objects.filter(
+        teacher_id=teacher_id, scope='batch', key=batch_key
+    ).values_list('response', flat=True).first()
+
+
+def _claim_batch(teacher_id, batch_key) -> bool:
+    """
+    Inserts the batch key, or returns False if another request already has. A concurrent request with
+    the same key waits on the unique index until this transaction ends, then fails here.
+    """
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(teacher_id=teacher_id, scope='batch', key=batch_key)
+        return True
+    except IntegrityError:
+        return False
+
+
+def _parse(operation, allowed_subject_ids, now):
+    """Returns (key, writer row, marked_at) for one operation, or raises ValueError with the reason."""
+    key = operation.get('key')
+    if key is not None and (not isinstance(key, str) or not key or len(key) > KEY_MAX_LENGTH):
+        raise ValueError(f'key must be a string of at most {KEY_MAX_LENGTH} characters')
+    try:
+        student_id = int(operation['student_id'])
+        subject_id = int(operation['subject_id'])
+        day = datetime.strptime(str(operation['date']), '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('student_id, subject_id and date (YYYY-MM-DD) are required')
+    if subject_id not in allowed_subject_ids:
+        raise ValueError('You do not teach this subject')
+    if operation.get('status') not in attendance_writer.VALID_STATUSES:
+        raise ValueError('Invalid status')
+
+    marked_at = parse_datetime(str(operation.get('marked_at') or ''))
+    if marked_at is None:
+        raise ValueError('marked_at (ISO 8601 timestamp) is required')
+    if timezone.is_naive(marked_at):
+        marked_at = timezone.make_aware(marked_at)
+    # A device clock running fast must not make its marks unbeatable
+    marked_at = min(marked_at, now)
+
+    return key, (student_id, subject_id, day, operation['status']), marked_at
+
+
+def submit(teacher_id, batch_key, operations, allowed_subject_ids) -> dict:
+    """
+    Applies a batch of attendance operations queued on a device, each
+    {key, student_id, subject_id, date, status, marked_at}, and returns their counts.
+
+    A batch whose key was already applied gets the stored counts back with 'replayed': True, after
+    one indexed lookup and no writes. Operations whose key was applied by an earlier batch are
+    counted as 'duplicates' and skipped. The rest go through attendance_writer with their client
+    timestamps, so a mark only replaces one taken earlier (last writer wins).
+    A response of None means the same batch is being applied by another request right now.
+    """
+    if batch_key:
+        stored = _stored_response(teacher_id, batch_key)
+        if stored is not None:
+            return {**stored, 'replayed': True}
+
+    now = timezone.now()
+    allowed_subject_ids = set(allowed_subject_ids)
+    rejected, parsed = [], []
+    for index, operation in enumerate(operations):
+        try:
+            parsed.append((index, *_parse(operation if isinstance(operation, dict) else {}, allowed_subject_ids, now)))
+        except ValueError as e:
+            key = operation.get('key') if isinstance(operation, dict) else None
+            rejected.append({'index': index, 'key': key, 'reason': str(e)})
+
+    with transaction.atomic():
+        if batch_key and not _claim_batch(teacher_id, batch_key):
+            stored = _stored_response(teacher_id, batch_key)
+            return None if stored is None else {**stored, 'replayed': True}
+
+        op_keys = {key for _, key, _, _ in parsed if key}
+        seen = set(IdempotencyKey.objects.filter(
+            teacher_id=teacher_id, scope='operation', key__in=op_keys
+        ).values_list('key', flat=True)) if op_keys else set()
+
+        known_students = set(StudentProfile.objects.filter(
+            user_id__in={row[0] for _, _, row, _ in parsed}
+        ).values_list('user_id', flat=True))
+
+        duplicates = superseded = 0
+        rows, marked_at, applied_keys = [], {}, set()
+        for index, key, row, client_at in parsed:
+            if key in seen or key in applied_keys:
+                duplicates += 1
+                continue
+            if row[0] not in known_students:
+                rejected.append({'index': index, 'key': key, 'reason': 'Student not found'})
+                continue
+            if key:
+                applied_keys.add(key)
+            # Within the batch, too, the newest mark for a (student, subject, date) wins
+            mark = row[:3]
+            if mark in marked_at:
+                superseded += 1
+                if marked_at[mark] > client_at:
+                    continue
+            marked_at[mark] = client_at
+            rows.append((*row, teacher_id))
+
+        counts = attendance_writer.upsert_attendance(rows, marked_at=marked_at)
+        IdempotencyKey.objects.bulk_create(
+            [IdempotencyKey(teacher_id=teacher_id, scope='operation', key=key) for key in applied_keys],
+            ignore_conflicts=True,
+        )
+
+        response = {
+            'batch_key': batch_key,
+            'applied': counts['inserted'] + counts['updated'],
+            'unchanged': counts['unchanged'],
+            'stale': counts['stale'] + superseded,
+            'archived': counts['archived'],
+            'duplicates': duplicates,
+            'rejected': rejected,
+        }
+        if batch_key:
+            IdempotencyKey.objects.filter(
+                teacher_id=teacher_id, scope='batch', key=batch_key
+            ).update(response=response)
+
+    return {**response, 'replayed': False}
+
+
+def prune(older_than_days=None) -> int:
+    older_than_days = older_than_days or settings.IDEMPOTENCY_KEY_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
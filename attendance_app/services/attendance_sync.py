@@ -0,0 +1,111 @@
+# attendance_app/services/attendance_sync.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from ..models import AttendanceChange, StudentProfile
+
+STATUS_CODES = {'present': 'P', 'absent': 'A'}
+
+
+# --- Writing the log ---
+def log_marks(changes):
+    """
+    Appends attendance mark changes to the log. `changes` is an iterable of
+    (student_id, subject_id, date, old_status, new_status), as for attendance_rollups;
+    new_status None logs a tombstone.
+    """
+    AttendanceChange.objects.bulk_create([
+        AttendanceChange(kind='mark', student_id=student_id, subject_id=subject_id, date=day, status=new_status)
+        for student_id, subject_id, day, _, new_status in changes
+    ])
+
+
+def log_enrolments(pairs, enrolled):
+    """Appends enrolment changes for (student_id, subject_id) pairs; enrolled=False logs tombstones."""
+    AttendanceChange.objects.bulk_create([
+        AttendanceChange(kind='enrolment', student_id=student_id, subject_id=subject_id,
+                         status='enrolled' if enrolled else None)
+        for student_id, subject_id in pairs
+    ])
+
+
+def prune(older_than_days=None) -> int:
+    older_than_days = older_than_days or settings.ATTENDANCE_SYNC_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    # The newest change is always kept: its id is how changes_since() tells that older ones were pruned
+    newest = current_cursor(settled=False)
+    deleted, _ = AttendanceChange.objects.filter(created_at__lt=cutoff, id__lt=newest).delete()
+    return deleted
+
+
+# --- Reading it ---
+def _settled():
+    return timezone.now() - timedelta(seconds=settings.ATTENDANCE_SYNC_LAG)
+
+
+def current_cursor(settled=True) -> int:
+    """The newest change id, only counting settled changes (older than SYNC_LAG) unless `settled` is False."""
+    changes = AttendanceChange.objects.filter(created_at__lt=_settled()) if settled else AttendanceChange.objects
+    return changes.aggregate(last=Max('id'))['last'] or 0
+
+
+def changes_since(subject_id, cursor, limit=None) -> dict:
+    """
+    The changes for one subject after `cursor`, compacted so each mark or enrolment appears once
+    (its latest state), in the order they were last changed:
+      ["m", student_id, "YYYY-MM-DD", "P" | "A" | null]
+      ["e", student_id, 1, roll_number, full_name] or ["e", student_id, 0]
+
+    Returns {'cursor', 'more', 'changes'}, or {'reset': True, 'cursor'} when there is no cursor yet
+    or it is older than the retained log, and the client has to re-download the sheet first.
+    Changes from the last SYNC_LAG seconds are held back: their transactions may still be open,
+    and a later commit with a lower id would otherwise be skipped. The cursor only ever moves to
+    the id of a change that was returned, never past unreturned ones.
+    """
+    limit = limit or settings.ATTENDANCE_SYNC_PAGE_SIZE
+
+    # Any id between the cursor and the oldest change kept may have been pruned
+    oldest = AttendanceChange.objects.aggregate(first=Min('id'))['first']
+    if cursor is None or (oldest is not None and cursor < oldest - 1):
+        return {'reset': True, 'cursor': current_cursor()}
+
+    settled = _settled()
+    rows = list(
+        AttendanceChange.objects.filter(subject_id=subject_id, id__gt=cursor, created_at__lt=settled)
+        .order_by('id').values_list('id', 'kind', 'student_id', 'date', 'status')[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Latest state per mark/enrolment; dicts keep insertion order, so re-insert to move to the end
+    latest = {}
+    for _, kind, student_id, day, status in rows:
+        key = (kind, student_id, day)
+        latest.pop(key, None)
+        latest[key] = status
+
+    enrolled_ids = [student_id for (kind, student_id, _), status in latest.items() if kind == 'enrolment' and status]
+    students = {
+        user_id: (roll_number, full_name)
+        for user_id, roll_number, full_name in StudentProfile.objects.filter(
+            user_id__in=enrolled_ids
+        ).values_list('user_id', 'roll_number', 'full_name')
+    } if enrolled_ids else {}
+
+    changes = []
+    for (kind, student_id, day), status in latest.items():
+        if kind == 'mark':
+            changes.append(['m', student_id, day.isoformat(), STATUS_CODES.get(status)])
+        elif status and student_id in students:
+            changes.append(['e', student_id, 1, *students[student_id]])
+        else:
+            changes.append(['e', student_id, 0])
+
+    return {
+        'cursor': rows[-1][0] if rows else cursor,
+        'more': more,
+        'changes': changes,
+    }
@@ -0,0 +1,138 @@
+# attendance_app/services/attendance_writer.py
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Attendance, Subject
+from . import attendance_archive, attendance_rollups, attendance_store, attendance_sync, dashboard_cache
+
+VALID_STATUSES = {choice for choice, _ in Attendance.STATUS_CHOICES}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def upsert_attendance(rows, chunk_size=None, marked_at=None) -> dict:
+    """
+    Writes many attendance marks with a handful of queries per chunk instead of
+    one update_or_create per mark.
+
+    `rows` is an iterable of (student_id, subject_id, date, status, teacher_id) tuples,
+    with `date` a datetime.date.
+    If the same (student, subject, date) appears more than once, the last row wins.
+
+    `marked_at` optionally maps (student_id, subject_id, date) to the time the mark was taken on
+    the client, for marks queued offline; other marks are taken now. A mark older than the one
+    already stored loses (last writer wins) and is counted as 'stale' instead of being written.
+
+    Returns counts of 'inserted', 'updated' and 'unchanged' rows (marks that already
+    had the same status and teacher are not rewritten), of 'stale' rows, and of 'archived'
+    rows that were refused because their date belongs to an archived period.
+    """
+    chunk_size = chunk_size or settings.ATTENDANCE_UPSERT_CHUNK_SIZE
+    marked_at = marked_at or {}
+    now = timezone.now()
+
+    # Deduplicate in memory, keyed the same way as the unique constraint
+    latest = {}
+    for student_id, subject_id, date, status, teacher_id in rows:
+        latest[(student_id, subject_id, date)] = (status, teacher_id)
+
+    # Closed periods are read-only once archived
+    archived = attendance_archive.archived_dates({date for _, _, date in latest})
+    # Sorted by subject, so chunks take the subject locks below in one global order (no deadlocks)
+    keys = sorted((key for key in latest if key[2] not in archived), key=lambda key: (key[1], key[0], key[2]))
+
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'stale': 0, 'archived': len(latest) - len(keys)}
+    for chunk in _chunks(keys, chunk_size):
+        with transaction.atomic():
+            # Two writers of the same new mark would both read "no row" and both count an insert, so
+            # writers of a subject take turns: lock its row, then read the marks with a locking read
+            # (which sees the latest committed rows, not this transaction's snapshot).
+            list(Subject.objects.select_for_update().filter(
+                pk__in={key[1] for key in chunk}
+            ).order_by('pk').values_list('pk', flat=True))
+            existing = attendance_store.read_marks(chunk, lock=True)
+
+            to_write = []
+            changes = []
+            for key in chunk:
+                current = existing.get(key)
+                client_at = marked_at.get(key)
+                student_id, subject_id, date = key
+                status, teacher_id = latest[key]
+
+                if current and client_at and current[2] and client_at < current[2]:
+                    counts['stale'] += 1
+                    continue
+                # The bitmask layout doesn't keep a teacher per mark (None): the status decides
+                if current and current[0] == status and current[1] in (teacher_id, None):
+                    counts['unchanged'] += 1
+                    if client_at and (current[2] is None or client_at > current[2]):
+                        # Same mark, taken later: keep the newer time so older replays still lose to it
+                        to_write.append((student_id, subject_id, date, status, teacher_id, client_at))
+                    continue
+                counts['updated' if current else 'inserted'] += 1
+
+                to_write.append((student_id, subject_id, date, status, teacher_id, client_at or now))
+                changes.append((student_id, subject_id, date, current[0] if current else None, status))
+
+            attendance_store.write_marks(to_write)
+            if changes:
+                _update_dependents(changes)
+
+    return counts
+
+
+def _update_dependents(changes, rollups=True):
+    # Marks are stored without model signals, so dependent tables are updated here, in the same transaction
+    if rollups:
+        attendance_rollups.apply_changes(changes)
+    attendance_sync.log_marks(changes)
+    dashboard_cache.invalidate(
+        subject_ids={change[1] for change in changes},
+        student_ids={change[0] for change in changes},
+    )
+
+
+def delete_marks(keys, chunk_size=None) -> int:
+    """
+    Deletes the marks for (student_id, subject_id, date) keys, in either storage layout, and returns
+    the number deleted. Like upsert_attendance it updates the rollups, sync log and cached dashboards
+    once per chunk, and leaves archived periods alone. Attendance has no per-row delete signals, so
+    deletes must come through here (Attendance.delete() does) rather than QuerySet.delete().
+    """
+    chunk_size = chunk_size or settings.ATTENDANCE_UPSERT_CHUNK_SIZE
+    keys = set(keys)
+    archived = attendance_archive.archived_dates({date for _, _, date in keys})
+    keys = sorted((key for key in keys if key[2] not in archived), key=lambda key: (key[1], key[0], key[2]))
+
+    deleted = 0
+    for chunk in _chunks(keys, chunk_size):
+        with transaction.atomic():
+            # Same locking as upsert_attendance, so a concurrent write of these marks can't be miscounted
+            list(Subject.objects.select_for_update().filter(
+                pk__in={key[1] for key in chunk}
+            ).order_by('pk').values_list('pk', flat=True))
+            existing = attendance_store.read_marks(chunk, lock=True)
+            if not existing:
+                continue
+            attendance_store.delete_marks(existing)
+            _update_dependents([key + (mark[0], None) for key, mark in existing.items()])
+        deleted += len(existing)
+    return deleted
+
+
+def marks_deleted(marks, owner):
+    """
+    Updates the dependents of marks that were deleted along with their owner, `owner` being
+    'student_id', 'subject_id' or 'teacher_id'. `marks` are (student_id, subject_id, date, status)
+    from attendance_store.marks_of(), read before the delete. A deleted student takes its
+    per-student rollup rows with it, and a deleted subject all of its rollup rows.
+    """
+    changes = [(student_id, subject_id, day, status, None) for student_id, subject_id, day, status in marks]
+    if owner == 'student_id':
+        attendance_rollups.recompute(subject_days={(subject_id, day) for _, subject_id, day, _ in marks})
+    _update_dependents(changes, rollups=owner == 'teacher_id')
@@ -0,0 +1,103 @@
+# attendance_app/services/cohort_analytics.py
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import attendance_store
+
+KEYS = ['student_id', 'subject_id']
+WINDOW = timedelta(weeks=4)
+
+
+def load_marks(start, end, subject_ids, student_ids=None) -> pd.DataFrame:
+    """
+    One query per storage table for the cohort's marks, loaded as compact columns:
+    student_id, subject_id, date (datetime64) and present (int8).
+    """
+    df = pd.DataFrame.from_records(
+        attendance_store.marks_between(start, end, subject_ids, student_ids),
+        columns=['student_id', 'subject_id', 'date', 'status'],
+    )
+    df['date'] = pd.to_datetime(df['date'])
+    df['present'] = (df.pop('status') == 'present').to_numpy(np.int8)
+    return df
+
+
+def _window_percentage(df, mask):
+    windowed = df[mask].groupby(KEYS)['present'].agg(['sum', 'size'])
+    return windowed['sum'] / windowed['size'] * 100
+
+
+def _absence_streaks(df):
+    """(longest, current) run of consecutive absent marks per (student, subject); df must be sorted."""
+    absent = df['present'].to_numpy() == 0
+    student = df['student_id'].to_numpy()
+    subject = df['subject_id'].to_numpy()
+
+    # A new run starts at every change of student, subject or present/absent
+    run_start = np.ones(len(df), dtype=bool)
+    run_start[1:] = (student[1:] != student[:-1]) | (subject[1:] != subject[:-1]) | (absent[1:] != absent[:-1])
+    run_id = np.cumsum(run_start)
+
+    runs = df[KEYS].assign(run_id=run_id, absent=absent)
+    run_lengths = runs[absent].groupby(KEYS + ['run_id']).size()
+    longest = run_lengths.groupby(level=KEYS).max()
+
+    # The current streak is the last run of each key, when that run is absences (run ids are unique)
+    last = runs.groupby(KEYS).tail(1).set_index(KEYS)
+    lengths_by_run = run_lengths.droplevel(KEYS)
+    current = pd.Series(
+        np.where(last['absent'], lengths_by_run.reindex(last['run_id']).fillna(0).to_numpy(), 0).astype(int),
+        index=last.index,
+    )
+    return longest, current
+
+
+def cohort_stats(df, today, term_end=None) -> pd.DataFrame:
+    """
+    Per (student_id, subject_id): present, total, percentage, recent_percentage (last 4 weeks),
+    trend (last 4 weeks minus the 4 weeks before), longest/current absence streaks and,
+    when term_end is given, the projected end-of-term percentage.
+    """
+    df = df.sort_values(KEYS + ['date'], kind='stable', ignore_index=True)
+
+    stats = df.groupby(KEYS)['present'].agg(present='sum', total='size')
+    stats['percentage'] = stats['present'] / stats['total'] * 100
+
+    today = pd.Timestamp(today)
+    recent = (df['date'] > today - WINDOW) & (df['date'] <= today)
+    previous = (df['date'] > today - 2 * WINDOW) & (df['date'] <= today - WINDOW)
+    stats['recent_percentage'] = _window_percentage(df, recent)
+    stats['trend'] = stats['recent_percentage'] - _window_percentage(df, previous)
+
+    longest, current = _absence_streaks(df)
+    stats['longest_absence_streak'] = longest.reindex(stats.index, fill_value=0)
+    stats['current_absence_streak'] = current.reindex(stats.index, fill_value=0)
+
+    if term_end is not None:
+        # Sessions still to come, from each subject's class frequency so far
+        dates = df.groupby('subject_id')['date']
+        span_days = (dates.max() - dates.min()).dt.days + 1
+        sessions_per_day = dates.nunique() / span_days
+        remaining_days = max((pd.Timestamp(term_end) - today).days, 0)
+        remaining = np.round(
+            sessions_per_day.reindex(stats.index.get_level_values('subject_id')).to_numpy() * remaining_days
+        )
+
+        # Assume the recent rate carries on (the overall rate when there's nothing recent)
+        future_rate = stats['recent_percentage'].fillna(stats['percentage']).to_numpy() / 100
+        stats['projected_percentage'] = (
+            (stats['present'].to_numpy() + future_rate * remaining) / (stats['total'].to_numpy() + remaining) * 100
+        )
+    else:
+        stats['projected_percentage'] = np.nan
+
+    threshold = settings.AT_RISK_THRESHOLD
+    stats['below_threshold'] = stats['percentage'] < threshold
+    stats['dropping'] = stats['trend'] <= -settings.AT_RISK_DROP_POINTS
+    stats['absence_streak'] = stats['longest_absence_streak'] >= settings.AT_RISK_ABSENCE_STREAK
+    stats['projected_below_threshold'] = stats['projected_percentage'] < threshold
+    stats['at_risk'] = stats[['below_threshold', 'dropping', 'absence_streak', 'projected_below_threshold']].any(axis=1)
+    return stats
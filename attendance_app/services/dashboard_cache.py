@@ -0,0 +1,94 @@
+# attendance_app/services/dashboard_cache.py
+import hashlib
+import uuid
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'dashboards'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(kind, pk):
+    return f"version:{kind}:{pk}"
+
+
+def _versions(version_keys):
+    """
+    Current version token for each key. Tokens are random rather than counters, so a
+    version key that was evicted and recreated can never line up with an old entry.
+    """
+    cache = _cache()
+    found = cache.get_many(version_keys)
+    missing = [key for key in version_keys if key not in found]
+    if missing:
+        fresh = {key: uuid.uuid4().hex for key in missing}
+        for key, token in fresh.items():
+            # add() so concurrent readers settle on the same token
+            cache.add(key, token, timeout=None)
+        stored = cache.get_many(missing)
+        found.update({key: stored.get(key, fresh[key]) for key in missing})
+    return [found[key] for key in version_keys]
+
+
+def _entry_key(name, user_id, version_keys):
+    # The dashboards show day-relative windows (this month, last 30 days), so the date is part of the key
+    versions = ':'.join(_versions(version_keys))
+    digest = hashlib.md5(versions.encode()).hexdigest()
+    return f"{name}:{user_id}:{date.today().isoformat()}:{digest}"
+
+
+def get_or_build(name, user_id, subject_ids=(), student_ids=(), teacher_ids=(), build=None):
+    """
+    Returns the cached payload for this user's dashboard, or calls `build()` and caches its result.
+
+    The entry is keyed by the current versions of every subject, student and teacher it depends on.
+    Versions are read before `build()` runs, so a write that commits while the payload is being
+    built bumps a version and the (possibly stale) payload is stored under a key nobody asks for.
+    """
+    version_keys = (
+        [_version_key('teacher', pk) for pk in sorted(teacher_ids)]
+        + [_version_key('student', pk) for pk in sorted(student_ids)]
+        + [_version_key('subject', pk) for pk in sorted(subject_ids)]
+    )
+    key = _entry_key(name, user_id, version_keys)
+
+    cache = _cache()
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def subject_version(subject_id) -> str:
+    """
+    The subject's current version token. It changes with its marks, its enrolments and its students'
+    profiles (see signals.py), so it can also validate other views of the subject.
+    """
+    return _versions([_version_key('subject', subject_id)])[0]
+
+
+def bump(subject_ids=(), student_ids=(), teacher_ids=()):
+    """Gives new versions to these subjects, students and teachers, orphaning every entry built from them."""
+    tokens = {}
+    for kind, ids in (('subject', subject_ids), ('student', student_ids), ('teacher', teacher_ids)):
+        for pk in set(ids):
+            tokens[_version_key(kind, pk)] = uuid.uuid4().hex
+    if tokens:
+        _cache().set_many(tokens, timeout=None)
+
+
+def invalidate(subject_ids=(), student_ids=(), teacher_ids=()):
+    """
+    Bumps the versions once the current transaction commits (immediately outside one).
+    Bumping before the commit would let a reader rebuild from the old rows under the new version.
+    """
+    subject_ids, student_ids, teacher_ids = set(subject_ids), set(student_ids), set(teacher_ids)
+    if subject_ids or student_ids or teacher_ids:
+        transaction.on_commit(lambda: bump(subject_ids, student_ids, teacher_ids))
@@ -0,0 +1,158 @@
+# attendance_app/services/gemini_metrics.py
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger('attendance_app.gemini')
+
+# Histogram bucket upper bounds. Anything larger falls in the final +inf bucket.
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2500, 5000, 10000, 20000, 40000, 60000]
+TOKEN_BUCKETS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000]
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram. Cheap to update and small enough to keep one per task in memory.
+    """
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (None if empty or in +inf)."""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        running = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            running += bucket_count
+            if running >= rank:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 2),
+            'mean': round(self.total / self.count, 2) if self.count else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': {str(bound): c for bound, c in zip(self.bounds + ['+inf'], self.counts)},
+        }
+
+
+class TaskMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.parse_failures = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cost_usd = 0.0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.response_tokens = Histogram(TOKEN_BUCKETS)
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'parse_failures': self.parse_failures,
+            'retries': self.retries,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cost_usd': round(self.cost_usd, 6),
+            'latency_ms': self.latency_ms.to_dict(),
+            'prompt_tokens': self.prompt_tokens.to_dict(),
+            'response_tokens': self.response_tokens.to_dict(),
+        }
+
+
+# Metrics are per process: each worker reports what it has served since it started.
+_lock = threading.Lock()
+_tasks = {}
+_recent_calls = deque(maxlen=settings.GEMINI_METRICS_LOG_SIZE)
+
+
+def _task(task_name):
+    if task_name not in _tasks:
+        _tasks[task_name] = TaskMetrics()
+    return _tasks[task_name]
+
+
+def estimate_cost(model_name, prompt_tokens, response_tokens):
+    pricing = settings.GEMINI_PRICING.get(model_name)
+    if not pricing:
+        return 0.0
+    return (prompt_tokens * pricing['input_per_million'] + response_tokens * pricing['output_per_million']) / 1_000_000
+
+
+def record_call(task_name, model_name, wall_ms, prompt_tokens=0, response_tokens=0,
+                retries=0, parse_failed=False, error=None):
+    cost = estimate_cost(model_name, prompt_tokens, response_tokens)
+    event = {
+        'event': 'gemini_call',
+        'timestamp': time.time(),
+        'task': task_name,
+        'model': model_name,
+        'wall_ms': round(wall_ms, 1),
+        'prompt_tokens': prompt_tokens,
+        'response_tokens': response_tokens,
+        'retries': retries,
+        'parse_failed': parse_failed,
+        'cost_usd': round(cost, 6),
+        'error': error,
+    }
+
+    with _lock:
+        metrics = _task(task_name)
+        metrics.calls += 1
+        metrics.retries += retries
+        metrics.cost_usd += cost
+        if parse_failed:
+            metrics.parse_failures += 1
+        if error:
+            metrics.errors += 1
+        metrics.latency_ms.observe(wall_ms)
+        metrics.prompt_tokens.observe(prompt_tokens)
+        metrics.response_tokens.observe(response_tokens)
+        _recent_calls.append(event)
+
+    logger.info(json.dumps(event))
+
+
+def record_cache(task_name, hit):
+    """Records whether a cached AI result (OCR cache, question bank, ...) saved a Gemini call."""
+    event = {'event': 'gemini_cache', 'timestamp': time.time(), 'task': task_name, 'hit': hit}
+
+    with _lock:
+        metrics = _task(task_name)
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+        _recent_calls.append(event)
+
+    logger.info(json.dumps(event))
+
+
+def snapshot():
+    with _lock:
+        return {
+            'tasks': {name: metrics.to_dict() for name, metrics in _tasks.items()},
+            'recent': list(_recent_calls),
+        }
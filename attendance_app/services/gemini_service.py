@@ -1,10 +1,16 @@
 # attendance_app/services/gemini_service.py
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+import requests
 from django.conf import settings
 import json
+import hashlib
+import time
 
 import traceback # Added for detailed error logs
 
+from . import gemini_metrics
+
 # Configure the Gemini client with the API key from settings
 # Configure API Key
 if not settings.GEMINI_API_KEY:
@@ -13,6 +19,11 @@ else:
     genai.configure(api_key=settings.GEMINI_API_KEY)
 
 
+# The model every task is sent to. Cached AI results are keyed on this too,
+# so switching models never serves answers produced by the old one.
+GEMINI_MODEL_NAME = 'models/gemini-2.5-pro'
+
+
 # A centralized dictionary for all our AI prompts and configurations
 GEMINI_PROMPT_CONFIG = {
     'GENERATE_QUESTIONS': {
@@ -145,6 +156,16 @@ GEMINI_PROMPT_CONFIG.update({
 })
 
 
+def get_prompt_version(task_name: str) -> str:
+    """
+    Returns a short fingerprint of the prompt template and model used for a task.
+    Any edit to the prompt (or a model switch) yields a new version.
+    """
+    prompt_template = GEMINI_PROMPT_CONFIG[task_name]['prompt']
+    fingerprint = f"{GEMINI_MODEL_NAME}\n{prompt_template}".encode('utf-8')
+    return hashlib.sha256(fingerprint).hexdigest()[:16]
+
+
 # def call_gemini_api(task_name: str, context: dict) -> dict:
 #     """
 #     A centralized function to call the Gemini API.
@@ -178,6 +199,39 @@ GEMINI_PROMPT_CONFIG.update({
 #         return {"error": f"An API error occurred: {e}"}
     
 
+# Failures worth another attempt: the service briefly down or slow, or the connection dropping.
+# Rate limiting (ResourceExhausted) is only retried when the error says how long to wait.
+TRANSIENT_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    requests.exceptions.ConnectionError,
+)
+
+
+def _retry_after(error):
+    """Seconds a rate-limit error asks us to wait (gRPC RetryInfo or a Retry-After header), or None."""
+    for detail in getattr(error, 'details', None) or ():
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(error, retries):
+    """Seconds to wait before retrying a failed call, or None if it must not be retried."""
+    if isinstance(error, google_exceptions.ResourceExhausted):
+        delay = _retry_after(error)
+        return delay if delay is not None and delay <= settings.GEMINI_MAX_RETRY_AFTER else None
+    if isinstance(error, TRANSIENT_ERRORS):
+        return 0.5 * 2 ** retries
+    return None
+
+
 def call_gemini_api(task_name: str, context: dict, image=None) -> dict:
     if task_name not in GEMINI_PROMPT_CONFIG:
         return {"error": "Invalid task name."}
@@ -190,18 +244,32 @@ def call_gemini_api(task_name: str, context: dict, image=None) -> dict:
         print(f"❌ Prompt Formatting Error: {e}")
         return {"error": f"Prompt formatting failed. Missing key: {e}"}
 
-    # 2. Call Gemini
+    # 2. Call Gemini (transient API failures are retried, see TRANSIENT_ERRORS)
+    started = time.perf_counter()
+    retries = 0
+    response = None
     try:
         # We use 'gemini-1.5-flash' for speed and stability. 
         # You can switch back to 'gemini-1.5-pro' later if needed.
-        model = genai.GenerativeModel('models/gemini-2.5-pro') 
+        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
         
         print(f"🤖 Calling Gemini Model ({task_name})...")
         
-        if image:
-            response = model.generate_content([prompt_text, image])
-        else:
-            response = model.generate_content(prompt_text)
+        while True:
+            try:
+                if image:
+                    response = model.generate_content([prompt_text, image])
+                else:
+                    response = model.generate_content(prompt_text)
+                break
+            except Exception as e:
+                # Bad requests, auth errors and the like fail the same way every time: raise them at once
+                delay = _retry_delay(e, retries + 1)
+                if delay is None or retries >= settings.GEMINI_MAX_RETRIES:
+                    raise
+                retries += 1
+                print(f"🔁 Gemini call failed ({type(e).__name__}), retrying ({retries}/{settings.GEMINI_MAX_RETRIES})...")
+                time.sleep(delay)
             
         print("✅ Gemini Response Received.")
         
@@ -213,10 +281,31 @@ def call_gemini_api(task_name: str, context: dict, image=None) -> dict:
             if cleaned_response.startswith("json"):
                 cleaned_response = cleaned_response[4:]
         
-        return json.loads(cleaned_response.strip())
+        result = json.loads(cleaned_response.strip())
+        _record_call(task_name, started, response, retries)
+        return result
 
+    except json.JSONDecodeError:
+        print("❌ Gemini response was not valid JSON.")
+        _record_call(task_name, started, response, retries, parse_failed=True)
+        return {"error": "Failed to parse AI response."}
     except Exception as e:
         # Print full traceback to console so we can debug
         print("❌ Gemini API Error Details:")
         traceback.print_exc()
+        _record_call(task_name, started, response, retries, error=str(e))
         return {"error": str(e)}
+
+
+def _record_call(task_name, started, response, retries, parse_failed=False, error=None):
+    usage = getattr(response, 'usage_metadata', None)
+    gemini_metrics.record_call(
+        task_name,
+        GEMINI_MODEL_NAME,
+        wall_ms=(time.perf_counter() - started) * 1000,
+        prompt_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+        response_tokens=getattr(usage, 'candidates_token_count', 0) or 0,
+        retries=retries,
+        parse_failed=parse_failed,
+        error=error,
+    )
@@ -0,0 +1,87 @@
+# attendance_app/services/image_preprocessing.py
+import io
+
+import numpy as np
+from django.conf import settings
+from PIL import Image, ImageOps
+
+
+# A row/column counts as part of the grid when at least this share of its pixels is "ink"
+GRID_LINE_MIN_INK = 0.02
+# Grey level (0-255) below which a pixel is treated as ink after auto-contrast
+INK_THRESHOLD = 128
+# Extra border kept around the detected grid, as a fraction of the image size
+CROP_MARGIN = 0.02
+# Size of the preview the grid is detected on (detection does not need full resolution)
+DETECTION_EDGE = 800
+
+
+def _find_grid_box(gray):
+    """
+    Returns the (left, upper, right, lower) box around the ruled grid of a sheet,
+    in the coordinates of `gray`, or None if no sensible grid was found.
+    """
+    preview = gray.copy()
+    preview.thumbnail((DETECTION_EDGE, DETECTION_EDGE))
+    preview = ImageOps.autocontrast(preview, cutoff=1)
+
+    ink = np.asarray(preview) < INK_THRESHOLD
+    rows = np.flatnonzero(ink.mean(axis=1) >= GRID_LINE_MIN_INK)
+    cols = np.flatnonzero(ink.mean(axis=0) >= GRID_LINE_MIN_INK)
+    if rows.size == 0 or cols.size == 0:
+        return None
+
+    height, width = ink.shape
+    top, bottom = rows[0], rows[-1] + 1
+    left, right = cols[0], cols[-1] + 1
+
+    # Tiny detections are specks or shadows, not the sheet
+    if (bottom - top) < height * 0.25 or (right - left) < width * 0.25:
+        return None
+
+    margin_y, margin_x = int(height * CROP_MARGIN), int(width * CROP_MARGIN)
+    scale_x, scale_y = gray.width / width, gray.height / height
+    return (
+        int(max(left - margin_x, 0) * scale_x),
+        int(max(top - margin_y, 0) * scale_y),
+        int(min(right + margin_x, width) * scale_x),
+        int(min(bottom + margin_y, height) * scale_y),
+    )
+
+
+def prepare_attendance_sheet(uploaded_file):
+    """
+    Compacts a phone photo of an attendance sheet before it is sent to Gemini:
+    fixes EXIF rotation, converts to grayscale, crops to the grid, downscales and
+    re-encodes as JPEG.
+
+    Returns (jpeg_bytes, stats) where stats records the size reduction.
+    """
+    original_bytes = uploaded_file.size
+
+    img = Image.open(uploaded_file)
+    original_dimensions = img.size
+
+    img = ImageOps.exif_transpose(img)
+    img = img.convert('L')
+
+    box = _find_grid_box(img)
+    if box:
+        img = img.crop(box)
+
+    max_edge = settings.OCR_IMAGE_MAX_EDGE
+    img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=settings.OCR_IMAGE_JPEG_QUALITY, optimize=True)
+    jpeg_bytes = buffer.getvalue()
+
+    stats = {
+        'original_bytes': original_bytes,
+        'processed_bytes': len(jpeg_bytes),
+        'bytes_saved': original_bytes - len(jpeg_bytes),
+        'original_dimensions': original_dimensions,
+        'processed_dimensions': img.size,
+        'cropped': box is not None,
+    }
+    return jpeg_bytes, stats
@@ -0,0 +1,48 @@
+# attendance_app/services/ocr_cache.py
+import hashlib
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import OCRResultCache
+from . import gemini_metrics
+from .gemini_service import get_prompt_version
+
+
+def build_cache_key(image_bytes: bytes, task_name: str) -> str:
+    """
+    `image_bytes` should be the preprocessed sheet (see image_preprocessing), which is
+    already rotation-corrected and re-encoded, so identical photos hash identically.
+    """
+    digest = hashlib.sha256()
+    digest.update(get_prompt_version(task_name).encode('ascii'))
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+def get_cached_records(cache_key: str, task_name: str):
+    """
+    Returns the cached list of OCR records for this key, or None on a miss / expired entry.
+    """
+    entry = OCRResultCache.objects.filter(
+        cache_key=cache_key,
+        expires_at__gt=timezone.now()
+    ).values_list('records', flat=True).first()
+    gemini_metrics.record_cache(task_name, hit=entry is not None)
+    return entry
+
+
+def store_records(cache_key: str, task_name: str, records: list):
+    now = timezone.now()
+
+    # Expired entries are dropped opportunistically (expires_at is indexed)
+    OCRResultCache.objects.filter(expires_at__lte=now).delete()
+
+    OCRResultCache.objects.update_or_create(
+        cache_key=cache_key,
+        defaults={
+            'task_name': task_name,
+            'records': records,
+            'expires_at': now + settings.OCR_CACHE_TTL,
+        }
+    )
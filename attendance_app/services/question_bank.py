@@ -0,0 +1,121 @@
+# attendance_app/services/question_bank.py
+import random
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from ..models import AssessmentQuestionSet, UserSkill
+from . import gemini_metrics, gemini_service
+
+TASK_NAME = 'GENERATE_QUESTIONS'
+
+# Skills currently being refilled by this process, so concurrent requests don't all start a refill
+_refilling = set()
+_refilling_lock = threading.Lock()
+
+
+def normalise_skill_name(skill_name: str) -> str:
+    """
+    Maps the different ways students type a skill onto one bank key:
+    "  Python ", "python" and "PYTHON" -> "python"; "Node JS" and "node  js" -> "node js".
+    Characters that change meaning in skill names (+, #, .) are kept, so "C++" != "C".
+    """
+    name = skill_name.casefold().strip()
+    name = re.sub(r"[^\w+#.\s-]", "", name)
+    name = re.sub(r"[\s_-]+", " ", name)
+    return name.strip(" .")
+
+
+def is_known_skill(skill_name: str, student_profile_id) -> bool:
+    """True if the student has a UserSkill that normalises to the same bank key as `skill_name`."""
+    skill_key = normalise_skill_name(skill_name)
+    return any(
+        normalise_skill_name(name) == skill_key
+        for name in UserSkill.objects.filter(student_profile_id=student_profile_id).values_list('skill_name', flat=True)
+    )
+
+
+def _available_sets(skill_key):
+    return AssessmentQuestionSet.objects.filter(
+        skill_key=skill_key,
+        prompt_version=gemini_service.get_prompt_version(TASK_NAME),
+        times_served__lt=settings.QUESTION_BANK_MAX_SERVES
+    )
+
+
+def get_question_set(skill_name: str, refill_allowed=False):
+    """
+    Serves a random stored question set for this skill, or None if the bank is empty.
+    With `refill_allowed` (only for known skills, see is_known_skill), schedules a background refill
+    when the remaining stock runs low. An empty bank isn't refilled here: the caller generates a set
+    on the spot, which stocks the bank, and later requests top it up.
+    """
+    skill_key = normalise_skill_name(skill_name)
+    set_ids = list(_available_sets(skill_key).values_list('id', flat=True))
+    gemini_metrics.record_cache(TASK_NAME, hit=bool(set_ids))
+
+    if not set_ids:
+        return None
+
+    if refill_allowed and len(set_ids) < settings.QUESTION_BANK_MIN_STOCK:
+        schedule_refill(skill_name)
+
+    set_id = random.choice(set_ids)
+    AssessmentQuestionSet.objects.filter(id=set_id).update(times_served=F('times_served') + 1)
+    questions = AssessmentQuestionSet.objects.values_list('questions', flat=True).get(id=set_id)
+    return {'questions': questions}
+
+
+def generate_question_set(skill_name: str) -> dict:
+    """
+    Asks Gemini for a new set of questions and stores it in the bank.
+    Returns the Gemini response (which contains "error" on failure).
+    """
+    questions_data = gemini_service.call_gemini_api(TASK_NAME, {'skill_name': skill_name})
+    if "error" in questions_data or not questions_data.get('questions'):
+        return questions_data
+
+    AssessmentQuestionSet.objects.create(
+        skill_key=normalise_skill_name(skill_name),
+        skill_name=skill_name.strip(),
+        questions=questions_data['questions'],
+        prompt_version=gemini_service.get_prompt_version(TASK_NAME)
+    )
+    return questions_data
+
+
+def refill(skill_name: str, target=None) -> int:
+    """
+    Generates sets until the skill has `target` unused sets in stock. Returns the number created.
+    """
+    target = target or settings.QUESTION_BANK_TARGET_STOCK
+    missing = target - _available_sets(normalise_skill_name(skill_name)).count()
+
+    created = 0
+    for _ in range(missing):
+        if "error" in generate_question_set(skill_name):
+            break
+        created += 1
+    return created
+
+
+def schedule_refill(skill_name: str):
+    skill_key = normalise_skill_name(skill_name)
+    with _refilling_lock:
+        if skill_key in _refilling:
+            return
+        _refilling.add(skill_key)
+
+    def run():
+        try:
+            refill(skill_name)
+        finally:
+            with _refilling_lock:
+                _refilling.discard(skill_key)
+            # Threads get their own DB connection; don't leave it open
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
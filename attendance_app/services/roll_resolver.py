@@ -0,0 +1,186 @@
+# attendance_app/services/roll_resolver.py
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from ..models import StudentProfile
+
+# Separators students and OCR put between the parts of a roll number ("25 MCA-31", "25MCA_31")
+SEPARATORS = re.compile(r"[\s\-_./\\]+")
+
+# Characters handwriting recognition routinely confuses with digits
+CONFUSABLES = str.maketrans({'O': '0', 'Q': '0', 'I': '1', 'L': '1', '|': '1'})
+
+AMBIGUOUS = object()
+
+
+def normalise_roll_number(raw: str) -> str:
+    """ "25mca-31", "25 MCA 31" and "25MCA_31" -> "25MCA31" """
+    return SEPARATORS.sub('', (raw or '').upper())
+
+
+def fold_confusables(normalised: str) -> str:
+    """ "25MCA3L" -> "25MCA31". Applied to both sides, so letters in real roll numbers still match. """
+    return normalised.translate(CONFUSABLES)
+
+
+def levenshtein(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over edit distance: finds every key within `max_distance`
+    of a query while only visiting a small part of the tree.
+    """
+    def __init__(self):
+        self.root = None
+
+    def add(self, key):
+        if self.root is None:
+            self.root = (key, {})
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(key, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (key, {})
+                return
+            node = child
+
+    def search(self, query, max_distance):
+        """Returns [(distance, key)] for all keys within max_distance of query."""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            key, children = stack.pop()
+            distance = levenshtein(query, key)
+            if distance <= max_distance:
+                matches.append((distance, key))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+
+class RollNumberResolver:
+    """
+    In-memory index of every student's roll number.
+    Exact (normalised) lookups are dictionary hits; near misses go through a BK-tree.
+    """
+    def __init__(self, students):
+        # students: iterable of (user_id, roll_number, full_name)
+        self.exact = {}
+        self.folded = {}
+        self.tree = BKTree()
+
+        for user_id, roll_number, full_name in students:
+            entry = {'student_id': user_id, 'roll_number': roll_number, 'full_name': full_name}
+            key = normalise_roll_number(roll_number)
+            self.exact[key] = AMBIGUOUS if key in self.exact else entry
+
+            folded_key = fold_confusables(key)
+            self.folded[folded_key] = AMBIGUOUS if folded_key in self.folded else entry
+
+            self.tree.add(key)
+
+    def resolve(self, raw: str):
+        """
+        Returns the matching student entry (with 'score' and 'method') or None.
+        Only unambiguous matches are returned; fuzzy candidates are left for the teacher to confirm.
+        """
+        key = normalise_roll_number(raw)
+        if not key:
+            return None
+
+        entry = self.exact.get(key)
+        if entry is not None and entry is not AMBIGUOUS:
+            return {**entry, 'score': 1.0, 'method': 'exact'}
+
+        entry = self.folded.get(fold_confusables(key))
+        if entry is not None and entry is not AMBIGUOUS:
+            return {**entry, 'score': 0.95, 'method': 'confusable'}
+
+        return None
+
+    def candidates(self, raw: str, max_distance=None, limit=5):
+        """Near-miss roll numbers for `raw`, best first, each with a 0-1 similarity score."""
+        key = normalise_roll_number(raw)
+        if not key:
+            return []
+        max_distance = settings.ROLL_FUZZY_MAX_DISTANCE if max_distance is None else max_distance
+
+        folded_key = fold_confusables(key)
+        ranked = []
+        for distance, match_key in self.tree.search(key, max_distance):
+            entry = self.exact[match_key]
+            if entry is AMBIGUOUS:
+                continue
+            score = 1 - distance / max(len(key), len(match_key))
+            # Differences explained by look-alike characters rank first
+            lookalike = fold_confusables(match_key) == folded_key
+            ranked.append((not lookalike, -score, {**entry, 'score': round(score, 3), 'distance': distance}))
+
+        ranked.sort(key=lambda item: item[:2])
+        return [entry for _, _, entry in ranked[:limit]]
+
+
+# One resolver per process, rebuilt after StudentProfile changes (see signals.py) or TTL expiry.
+# The TTL bounds staleness for changes made by other worker processes; writes confirm their
+# matches against the database first (confirm_matches).
+_resolver = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_resolver() -> RollNumberResolver:
+    global _resolver, _loaded_at
+    with _lock:
+        if _resolver is None or time.monotonic() - _loaded_at > settings.ROLL_RESOLVER_TTL:
+            students = StudentProfile.objects.values_list('user_id', 'roll_number', 'full_name')
+            _resolver = RollNumberResolver(students)
+            _loaded_at = time.monotonic()
+        return _resolver
+
+
+def confirm_matches(matches) -> set:
+    """
+    Checks resolver matches against the database before marks are written for them, with one query:
+    another process may have reassigned a roll number up to ROLL_RESOLVER_TTL ago without this
+    process's index noticing. `matches` is {student_id: roll_number} as resolved; returns the
+    student_ids that still have that roll number.
+    """
+    if not matches:
+        return set()
+    return {
+        student_id
+        for student_id, roll_number in StudentProfile.objects.filter(
+            user_id__in=matches
+        ).values_list('user_id', 'roll_number')
+        if matches[student_id] == roll_number
+    }
+
+
+def invalidate():
+    global _resolver
+    with _lock:
+        _resolver = None
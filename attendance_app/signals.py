@@ -0,0 +1,131 @@
+# attendance_app/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import ArchivedAttendance, Attendance, StudentProfile, Subject, TeacherProfile
+from .services import attendance_rollups, attendance_store, attendance_sync, attendance_writer, dashboard_cache, roll_resolver
+
+
+@receiver([post_save, post_delete], sender=StudentProfile)
+def invalidate_roll_resolver(sender, **kwargs):
+    # Roll numbers (or the set of students) may have changed
+    roll_resolver.invalidate()
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_save, sender=ArchivedAttendance)
+def update_attendance_dependents(sender, instance, **kwargs):
+    # Bulk writes go through attendance_writer, which updates the rollups, month rows and cache itself.
+    # This covers single rows saved through the ORM (admin, scripts); the recounts read both the hot
+    # and the archived marks. There are no per-row delete receivers: they would turn every cascade
+    # into a query storm, so deletes go through attendance_writer.delete_marks or the cascade below.
+    if attendance_store.bitmask_enabled():
+        # The month rows hold the marks: move this one there first, so the recounts see it
+        attendance_store.absorb(instance)
+    attendance_rollups.recompute(
+        [(instance.student_id, instance.subject_id)],
+        [(instance.subject_id, instance.date)]
+    )
+    dashboard_cache.invalidate(subject_ids=[instance.subject_id], student_ids=[instance.student_id])
+
+
+@receiver(post_save, sender=Attendance)
+def log_attendance_change(sender, instance, **kwargs):
+    # Archiving moves marks without changing them, so ArchivedAttendance isn't logged
+    attendance_sync.log_marks([(instance.student_id, instance.subject_id, instance.date, None, instance.status)])
+
+
+# --- Marks deleted along with their student, subject or teacher ---
+# The marks about to cascade are read once before the delete and their dependents updated once
+# after it, whatever the number of marks.
+MARK_OWNERS = {StudentProfile: 'student_id', Subject: 'subject_id', TeacherProfile: 'teacher_id'}
+
+
+@receiver(pre_delete, sender=StudentProfile)
+@receiver(pre_delete, sender=Subject)
+@receiver(pre_delete, sender=TeacherProfile)
+def collect_cascaded_marks(sender, instance, **kwargs):
+    instance._cascaded_marks = attendance_store.marks_of(**{MARK_OWNERS[sender]: instance.pk})
+
+
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_delete, sender=Subject)
+@receiver(post_delete, sender=TeacherProfile)
+def update_cascaded_marks(sender, instance, **kwargs):
+    marks = getattr(instance, '_cascaded_marks', None)
+    if marks:
+        attendance_writer.marks_deleted(marks, owner=MARK_OWNERS[sender])
+
+
+# --- Dashboard cache invalidation ---
+# Student names and photos appear on their teachers' dashboards, and teacher names on their
+# students' dashboards, so profile changes also bump the subjects the profile is linked to.
+@receiver([post_save, pre_delete], sender=StudentProfile)
+def invalidate_student_dashboards(sender, instance, **kwargs):
+    # pre_delete: the enrolments are still there to read (the cascade doesn't send m2m_changed)
+    subject_ids = instance.subjects.values_list('id', flat=True)
+    dashboard_cache.invalidate(subject_ids=subject_ids, student_ids=[instance.pk])
+
+
+@receiver([post_save, pre_delete], sender=TeacherProfile)
+def invalidate_teacher_dashboards(sender, instance, **kwargs):
+    subject_ids = instance.subjects.values_list('id', flat=True)
+    dashboard_cache.invalidate(subject_ids=subject_ids, teacher_ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Subject)
+def invalidate_subject_dashboards(sender, instance, **kwargs):
+    dashboard_cache.invalidate(subject_ids=[instance.pk])
+
+
+def _changed_links(instance, action, pk_set, field_name):
+    """The other side's ids for an m2m change, or None for actions that don't change anything."""
+    if action in ('post_add', 'post_remove'):
+        return pk_set
+    if action == 'pre_clear':
+        # post_clear doesn't say what was removed
+        return set(getattr(instance, field_name).values_list('pk', flat=True))
+    return None
+
+
+@receiver(m2m_changed, sender=StudentProfile.subjects.through)
+def invalidate_enrolment(sender, instance, action, reverse, pk_set, **kwargs):
+    # Forward: student.subjects.add(...); reverse: subject.students.add(...)
+    linked = _changed_links(instance, action, pk_set, 'students' if reverse else 'subjects')
+    if linked is None:
+        return
+    if reverse:
+        dashboard_cache.invalidate(subject_ids=[instance.pk], student_ids=linked)
+    else:
+        dashboard_cache.invalidate(subject_ids=linked, student_ids=[instance.pk])
+
+
+@receiver(m2m_changed, sender=TeacherProfile.subjects.through)
+def invalidate_teaching_assignment(sender, instance, action, reverse, pk_set, **kwargs):
+    linked = _changed_links(instance, action, pk_set, 'teachers' if reverse else 'subjects')
+    if linked is None:
+        return
+    if reverse:
+        dashboard_cache.invalidate(subject_ids=[instance.pk], teacher_ids=linked)
+    else:
+        dashboard_cache.invalidate(subject_ids=linked, teacher_ids=[instance.pk])
+
+
+# --- Delta sync log (enrolments; marks are logged above and by attendance_writer) ---
+@receiver(m2m_changed, sender=StudentProfile.subjects.through)
+def log_enrolment_change(sender, instance, action, reverse, pk_set, **kwargs):
+    linked = _changed_links(instance, action, pk_set, 'students' if reverse else 'subjects')
+    if not linked:
+        return
+    if reverse:
+        pairs = [(student_id, instance.pk) for student_id in linked]
+    else:
+        pairs = [(instance.pk, subject_id) for subject_id in linked]
+    attendance_sync.log_enrolments(pairs, enrolled=action == 'post_add')
+
+
+@receiver(pre_delete, sender=StudentProfile)
+def log_student_removal(sender, instance, **kwargs):
+    # The cascade removes the enrolments without an m2m_changed signal
+    subject_ids = instance.subjects.values_list('id', flat=True)
+    attendance_sync.log_enrolments([(instance.pk, subject_id) for subject_id in subject_ids], enrolled=False)
@@ -1,3 +1,1006 @@
-from django.test import TestCase
+import base64
+import io
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    User, TeacherProfile, StudentProfile, Subject, Approval, ArchivedAttendance, Attendance, AttendanceChange,
+    AttendanceSummary, DailyAttendanceSummary, IdempotencyKey,
+)
+from .services import (
+    attendance_archive, attendance_rollups, attendance_store, attendance_sync, attendance_writer, dashboard_cache,
+    roll_resolver,
+)
+
+# The dashboards cache is file based in settings; tests get their own in-memory one
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'dashboards': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-dashboards'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TeacherDashboardQueryCountTests(TestCase):
+    """
+    The teacher dashboard must be built from a fixed number of grouped queries,
+    whatever the number of students per subject.
+    """
+
+    def setUp(self):
+        # Cached dashboards from other tests would be served for the same ids
+        caches[dashboard_cache.CACHE_ALIAS].clear()
+
+    def create_teacher(self, username, subject_count, class_size):
+        user = User.objects.create_user(username=username, password='password123', role='teacher')
+        teacher = TeacherProfile.objects.create(user=user, full_name=username)
+
+        rows = []
+        today = date.today()
+        for s in range(subject_count):
+            subject = Subject.objects.create(name=f"{username} subject {s}")
+            teacher.subjects.add(subject)
+            for n in range(class_size):
+                student_user = User.objects.create_user(username=f"{username}-{s}-{n}", role='student')
+                student = StudentProfile.objects.create(
+                    user=student_user, full_name=f"Student {n}", roll_number=f"{username}-{s}-{n}"
+                )
+                student.subjects.add(subject)
+                for day in range(5):
+                    status = 'present' if (n + day) % 3 else 'absent'
+                    rows.append((student.pk, subject.id, today - timedelta(days=day), status, teacher.pk))
+
+        attendance_writer.upsert_attendance(rows)
+        return user
+
+    def get_dashboard(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/teacher/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_is_constant_as_class_size_grows(self):
+        small_teacher = self.create_teacher('small', subject_count=4, class_size=3)
+        large_teacher = self.create_teacher('large', subject_count=4, class_size=30)
+
+        _, small_queries = self.get_dashboard(small_teacher)
+        _, large_queries = self.get_dashboard(large_teacher)
+
+        self.assertEqual(small_queries, large_queries)
+
+    def test_response_shape(self):
+        teacher = self.create_teacher('shape', subject_count=1, class_size=3)
+        data, _ = self.get_dashboard(teacher)
+
+        subject = data['subjects'][0]
+        self.assertEqual(set(subject), {
+            'id', 'name', 'total_students', 'present_percentage', 'absent_percentage',
+            'students', 'monthly_trend', 'attendance_distribution',
+        })
+        self.assertEqual(subject['total_students'], 3)
+        self.assertEqual(len(subject['students']), 3)
+        self.assertEqual(sum(bucket['count'] for bucket in subject['attendance_distribution']), 3)
+        # 15 marks, 5 of them absent
+        self.assertEqual(subject['present_percentage'], 66.7)
+        self.assertEqual(subject['absent_percentage'], 33.3)
+
+    def test_cached_dashboard_is_rebuilt_after_a_mark(self):
+        teacher = self.create_teacher('cached', subject_count=1, class_size=3)
+        data, _ = self.get_dashboard(teacher)
+        cached, queries = self.get_dashboard(teacher)
+        self.assertEqual(cached, data)
+        # Only the profile lookups: the payload itself comes from the cache
+        self.assertLessEqual(queries, 2)
+
+        subject = Subject.objects.get(name='cached subject 0')
+        student = subject.students.order_by('user_id').first()
+        absent_day = Attendance.objects.filter(student=student, status='absent').values_list('date', flat=True)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance_writer.upsert_attendance([(student.pk, subject.id, absent_day, 'present', teacher.teacherprofile.pk)])
+
+        data, _ = self.get_dashboard(teacher)
+        # 11 of the 15 marks are now present
+        self.assertEqual(data['subjects'][0]['present_percentage'], 73.3)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class HotEndpointQueryBudgetTests(TestCase):
+    """
+    The hot endpoints must run a fixed number of queries whatever the class size: each one is
+    requested against a small and a large fixture, and both counts must be equal and within
+    the endpoint's budget. Raise a budget only together with the change that needs it.
+    """
+    # (students per subject, subjects)
+    SMALL, LARGE = (10, 2), (200, 4)
+
+    # Savepoints count: the bulk update runs one write chunk in nested transactions
+    QUERY_BUDGETS = {
+        'teacher_dashboard': 6,
+        'student_dashboard': 7,
+        'attendance_sheet': 8,
+        'bulk_update': 20, # Includes locking the subject row for the write chunk
+        'teacher_approvals': 4, # Profile, the inbox page's ids, the approvals, their CCs
+        'student_approvals': 3,
+        'teacher_profile': 2,
+        'student_profile': 5,
+        'student_list': 1,
+    }
+
+    def setUp(self):
+        caches[dashboard_cache.CACHE_ALIAS].clear()
+        # Students are bulk-created below, which skips the signal that refreshes the resolver
+        roll_resolver.invalidate()
+
+    def build(self, name, class_size, subject_count):
+        """
+        A teacher with `subject_count` subjects of `class_size` students, a week of marks, an approval
+        per student (CCing two teachers) and more approvals the larger the class for the first student.
+        """
+        teacher_user = User.objects.create_user(username=f'{name}-teacher', password='password123', role='teacher')
+        teacher = TeacherProfile.objects.create(user=teacher_user, full_name=f'{name} teacher')
+        cc_teachers = [
+            TeacherProfile.objects.create(user=User.objects.create_user(username=f'{name}-cc{i}', role='teacher'), full_name=f'CC {i}')
+            for i in range(2)
+        ]
+        subjects = [Subject.objects.create(name=f'{name} subject {i}') for i in range(subject_count)]
+        teacher.subjects.add(*subjects)
+
+        User.objects.bulk_create([
+            User(username=f'{name}-student-{n}', role='student') for n in range(class_size)
+        ])
+        users = User.objects.filter(username__startswith=f'{name}-student-').order_by('id')
+        StudentProfile.objects.bulk_create([
+            StudentProfile(user=user, full_name=f'Student {n}', roll_number=f'{name}-{n}') for n, user in enumerate(users)
+        ])
+        students = list(StudentProfile.objects.filter(roll_number__startswith=f'{name}-').order_by('user_id'))
+        for subject in subjects:
+            subject.students.add(*students)
+
+        today = date.today()
+        attendance_writer.upsert_attendance([
+            (student.pk, subject.id, today - timedelta(days=day), 'present' if (n + day) % 3 else 'absent', teacher.pk)
+            for n, student in enumerate(students) for subject in subjects for day in range(7)
+        ])
+
+        for student in students + [students[0]] * (class_size // 10):
+            approval = Approval.objects.create(student=student, teacher=teacher, subject='Leave', message='Family event')
+            approval.cc_teachers.add(*cc_teachers)
+
+        return teacher, subjects[0], students
+
+    def count_queries(self, user, method, url, data=None):
+        client = APIClient()
+        # A fresh instance, so nothing cached on it from the fixtures (like user.teacherprofile) is reused
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, data, format='json' if method == 'post' else None)
+        self.assertLess(response.status_code, 300, response.content[:500])
+        return len(queries)
+
+    def requests_for(self, teacher, subject, students):
+        today = date.today()
+        student = students[0].user
+        return {
+            'teacher_dashboard': (teacher.user, 'get', '/api/teacher/dashboard/', None),
+            'student_dashboard': (student, 'get', '/api/student/dashboard/', None),
+            'attendance_sheet': (teacher.user, 'get', '/api/teacher/attendance/sheet/', {
+                'subject_id': subject.id, 'month': today.month, 'year': today.year,
+            }),
+            'bulk_update': (teacher.user, 'post', '/api/teacher/attendance/update/', {
+                'subject_id': subject.id,
+                'updates': [
+                    {'student_id': s.pk, 'date': today.isoformat(), 'status': 'absent' if n % 2 else 'present'}
+                    for n, s in enumerate(students)
+                ],
+            }),
+            'teacher_approvals': (teacher.user, 'get', '/api/teacher/approvals/', None),
+            'student_approvals': (student, 'get', '/api/student/approvals/', None),
+            'teacher_profile': (teacher.user, 'get', '/api/profile/', None),
+            'student_profile': (student, 'get', '/api/profile/', None),
+            'student_list': (teacher.user, 'get', '/api/students/all/', None),
+        }
+
+    def test_query_counts_do_not_grow_with_class_size(self):
+        small = self.requests_for(*self.build('small', *self.SMALL))
+        large = self.requests_for(*self.build('large', *self.LARGE))
+
+        for endpoint, budget in self.QUERY_BUDGETS.items():
+            with self.subTest(endpoint=endpoint):
+                small_queries = self.count_queries(*small[endpoint])
+                large_queries = self.count_queries(*large[endpoint])
+                self.assertEqual(small_queries, large_queries, f'{endpoint} runs more queries for a larger class')
+                self.assertLessEqual(large_queries, budget, f'{endpoint} is over its query budget')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RollResolverWriteTests(TestCase):
+    """
+    The resolver index is per process and may be stale: a roll number reassigned by another
+    process must not have marks written to its previous owner.
+    """
+
+    def test_stale_match_is_not_confirmed(self):
+        students = [
+            StudentProfile.objects.create(
+                user=User.objects.create_user(username=f'resolver-student-{n}', role='student'),
+                full_name=f'Student {n}', roll_number=f'R-{n}',
+            )
+            for n in range(2)
+        ]
+
+        roll_resolver.invalidate()
+        match = roll_resolver.get_resolver().resolve('R-0')
+        # A queryset update skips the signal, like a change made by another worker process
+        StudentProfile.objects.filter(pk=students[0].pk).update(roll_number='R-9')
+
+        self.assertEqual(roll_resolver.get_resolver().resolve('R-0')['student_id'], students[0].pk)
+        confirmed = roll_resolver.confirm_matches({match['student_id']: match['roll_number']})
+        self.assertEqual(confirmed, set())
+        current = roll_resolver.confirm_matches({students[1].pk: 'R-1'})
+        self.assertEqual(current, {students[1].pk})
+
+    def test_ocr_and_manual_updates_accept_the_same_students(self):
+        teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='resolver-teacher', role='teacher'), full_name='Teacher'
+        )
+        subject = Subject.objects.create(name='Resolver subject')
+        # Neither student is enrolled: like the manual branch, OCR only needs the roll number to match
+        students = [
+            StudentProfile.objects.create(
+                user=User.objects.create_user(username=f'resolver-ocr-{n}', role='student'),
+                full_name=f'Student {n}', roll_number=f'O-{n}',
+            )
+            for n in range(2)
+        ]
+        roll_resolver.invalidate()
+        roll_resolver.get_resolver()
+        StudentProfile.objects.filter(pk=students[1].pk).update(roll_number='O-9')
+        client = APIClient()
+        client.force_authenticate(teacher.user)
+        day = date.today() - timedelta(days=1)
+
+        ocr = client.post('/api/teacher/attendance/update/', {
+            'subject_ids': [subject.id], 'is_ocr': True,
+            'ocr_data': [
+                {'roll_number': f'O-{n}', 'attendance': [{'date': day.strftime('%d/%m/%Y'), 'status': 'present'}]}
+                for n in range(2)
+            ],
+        }, format='json').json()
+        manual = client.post('/api/teacher/attendance/update/', {
+            'subject_ids': [subject.id],
+            'updates': [{'student_id': students[0].pk, 'date': day.isoformat(), 'status': 'absent'}],
+        }, format='json').json()
+
+        self.assertEqual((ocr['inserted'], ocr['skipped']), (1, 1))
+        self.assertEqual((manual['updated'], manual['skipped']), (1, 0))
+        self.assertEqual(list(Attendance.objects.values_list('student_id', 'status')), [(students[0].pk, 'absent')])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceWriterRollupTests(TransactionTestCase):
+    """
+    Writing the same mark twice, in separate transactions, must count it once in the rollups:
+    the second writer has to see the first one's row and treat its write as an update.
+    """
+
+    def test_same_mark_from_two_transactions_is_counted_once(self):
+        teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='writer-teacher', role='teacher'), full_name='Teacher'
+        )
+        student = StudentProfile.objects.create(
+            user=User.objects.create_user(username='writer-student', role='student'), full_name='Student', roll_number='W-1'
+        )
+        subject = Subject.objects.create(name='Writer subject')
+        today = date.today()
+
+        with transaction.atomic():
+            first = attendance_writer.upsert_attendance([(student.pk, subject.id, today, 'present', teacher.pk)])
+        with transaction.atomic():
+            second = attendance_writer.upsert_attendance([(student.pk, subject.id, today, 'absent', teacher.pk)])
+
+        self.assertEqual((first['inserted'], second['inserted'], second['updated']), (1, 0, 1))
+        summary = AttendanceSummary.objects.get(student=student, subject=subject)
+        self.assertEqual((summary.present_count, summary.total_count), (0, 1))
+        daily = DailyAttendanceSummary.objects.get(subject=subject, date=today)
+        self.assertEqual((daily.present_count, daily.total_count), (0, 1))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceDeleteTests(TestCase):
+    """
+    Deleting marks, directly or along with their student, subject or teacher, must keep the rollups
+    and sync log right with a fixed number of queries, however many marks go.
+    """
+
+    def setUp(self):
+        self.teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='delete-teacher', role='teacher'), full_name='Teacher'
+        )
+
+    def student_with_marks(self, name, days):
+        """A student alone in a subject of their own, with `days` marks in it."""
+        student = StudentProfile.objects.create(
+            user=User.objects.create_user(username=name, role='student'), full_name=name, roll_number=name
+        )
+        subject = Subject.objects.create(name=f'{name} subject')
+        subject.students.add(student)
+        today = date.today()
+        attendance_writer.upsert_attendance([
+            (student.pk, subject.id, today - timedelta(days=day), 'present' if day % 2 else 'absent', self.teacher.pk)
+            for day in range(days)
+        ])
+        return student, subject
+
+    def assertRollupsCorrect(self):
+        self.assertEqual(attendance_rollups.rebuild(verify_only=True), {'AttendanceSummary': 0, 'DailyAttendanceSummary': 0})
+
+    def delete_queries(self, obj):
+        with CaptureQueriesContext(connection) as queries:
+            obj.delete()
+        return len(queries)
+
+    def test_cascades_do_not_grow_with_marks(self):
+        for owner in (lambda student, subject: student.user, lambda student, subject: subject):
+            few, many = self.student_with_marks('few', 10), self.student_with_marks('many', 40)
+            with self.subTest(owner=type(owner(*few)).__name__):
+                self.assertEqual(self.delete_queries(owner(*few)), self.delete_queries(owner(*many)))
+                self.assertFalse(Attendance.objects.exists())
+                self.assertRollupsCorrect()
+            User.objects.filter(role='student').delete()
+            Subject.objects.all().delete()
+        self.assertEqual(AttendanceChange.objects.filter(kind='mark', status=None).count(), 100)
+
+    def test_teacher_cascade_updates_rollups(self):
+        student, subject = self.student_with_marks('student', 10)
+        self.teacher.user.delete()
+        self.assertFalse(Attendance.objects.exists())
+        self.assertRollupsCorrect()
+        self.assertFalse(AttendanceSummary.objects.filter(student=student, subject=subject).exists())
+
+    def test_delete_marks_updates_rollups_and_log(self):
+        student, subject = self.student_with_marks('student', 10)
+        presents = Attendance.objects.filter(student=student, status='present').values_list('student_id', 'subject_id', 'date')
+        self.assertEqual(attendance_writer.delete_marks(presents, chunk_size=3), 5)
+        Attendance.objects.filter(student=student).first().delete()
+        self.assertRollupsCorrect()
+        summary = AttendanceSummary.objects.get(student=student, subject=subject)
+        self.assertEqual((summary.present_count, summary.total_count), (0, 4))
+        self.assertEqual(AttendanceChange.objects.filter(kind='mark', status=None).count(), 6)
+
+
+@override_settings(ATTENDANCE_STORAGE='rows', CACHES=TEST_CACHES)
+class AttendanceStorageLayoutTests(TestCase):
+    """
+    The 'rows' and 'bitmask' layouts must hold the same marks: folding the rows into months, reading
+    and writing there and restoring the rows must round-trip them, with archived periods included.
+    """
+
+    def setUp(self):
+        self.teachers = [
+            TeacherProfile.objects.create(
+                user=User.objects.create_user(username=f'layout-teacher-{n}', role='teacher'), full_name=f'Teacher {n}'
+            )
+            for n in range(2)
+        ]
+        self.subject = Subject.objects.create(name='Layout subject')
+        self.students = [
+            StudentProfile.objects.create(
+                user=User.objects.create_user(username=f'layout-student-{n}', role='student'),
+                full_name=f'Student {n}', roll_number=f'L-{n}',
+            )
+            for n in range(3)
+        ]
+        this_month = date.today().replace(day=1)
+        self.last_month = (this_month - timedelta(days=1)).replace(day=1)
+        self.last_month_end = this_month - timedelta(days=1)
+        self.days = [self.last_month + timedelta(days=4), self.last_month + timedelta(days=9), this_month]
+        attendance_writer.upsert_attendance([
+            (student.pk, self.subject.id, day, 'present' if (n + i) % 2 else 'absent', self.teachers[0].pk)
+            for n, student in enumerate(self.students) for i, day in enumerate(self.days)
+        ])
+
+    def marks(self):
+        """Every mark as (student_id, date, status), read through the store in the current layout."""
+        return sorted(attendance_store.iter_marks(self.subject.id, self.days[0], self.days[-1]))
+
+    def assertRollupsCorrect(self):
+        self.assertEqual(attendance_rollups.rebuild(verify_only=True), {'AttendanceSummary': 0, 'DailyAttendanceSummary': 0})
+
+    def test_fold_read_write_restore(self):
+        before = self.marks()
+        months = {day.replace(day=1) for day in self.days}
+        masks = {month: attendance_store.month_masks(self.subject.id, month) for month in months}
+        student_id, day = self.students[0].pk, self.days[1]
+        key = (student_id, self.subject.id, day)
+
+        with override_settings(ATTENDANCE_STORAGE='bitmask'):
+            self.assertEqual(attendance_store.fold_rows(), 9)
+            self.assertFalse(Attendance.objects.exists())
+            self.assertEqual(self.marks(), before)
+            self.assertEqual({month: attendance_store.month_masks(self.subject.id, month) for month in months}, masks)
+            self.assertRollupsCorrect()
+
+            status = attendance_store.read_marks([key])[key][0]
+            flipped = 'absent' if status == 'present' else 'present'
+            self.assertEqual(attendance_writer.upsert_attendance([key + (flipped, self.teachers[1].pk)])['updated'], 1)
+            self.assertEqual(attendance_store.read_marks([key])[key][0], flipped)
+            self.assertEqual(attendance_writer.delete_marks([(self.students[1].pk, self.subject.id, self.days[0])]), 1)
+            self.assertFalse(Attendance.objects.exists())
+            self.assertRollupsCorrect()
+            after = self.marks()
+
+        self.assertEqual(len(after), 8)
+        self.assertEqual(attendance_store.restore_rows(), {'restored': 8, 'reattributed': 0})
+        self.assertEqual(self.marks(), after)
+        self.assertRollupsCorrect()
+        # Month rows only keep their latest marker, who is given every mark of the month
+        restored_teachers = Attendance.objects.filter(student_id=student_id, date__range=(self.last_month, self.last_month_end))
+        self.assertEqual(set(restored_teachers.values_list('teacher_id', flat=True)), {self.teachers[1].pk})
+
+    def test_restore_needs_a_teacher_for_months_whose_marker_was_deleted(self):
+        with override_settings(ATTENDANCE_STORAGE='bitmask'):
+            attendance_store.fold_rows()
+            self.teachers[0].user.delete()
+            self.assertRollupsCorrect()
+
+        with self.assertRaises(ValueError):
+            attendance_store.restore_rows()
+        self.assertFalse(Attendance.objects.exists())
+        result = attendance_store.restore_rows(fallback_teacher_id=self.teachers[1].pk)
+        self.assertEqual(result, {'restored': 9, 'reattributed': 6})
+        self.assertRollupsCorrect()
+
+    def test_archive_in_both_layouts(self):
+        before = self.marks()
+        with override_settings(ATTENDANCE_STORAGE='bitmask'), self.assertRaises(ValueError):
+            attendance_archive.archive_period('Last month', self.last_month, self.last_month_end)
+
+        self.assertEqual(attendance_archive.archive_period('Last month', self.last_month, self.last_month_end), 6)
+        self.assertEqual(Attendance.objects.count(), 3)
+        self.assertEqual(self.marks(), before)
+        self.assertRollupsCorrect()
+        archived_mark = (self.students[0].pk, self.subject.id, self.days[0], 'present', self.teachers[0].pk)
+        self.assertEqual(attendance_writer.upsert_attendance([archived_mark])['archived'], 1)
+
+        with override_settings(ATTENDANCE_STORAGE='bitmask'):
+            # Months with only archived marks are built too
+            self.assertEqual(attendance_store.fold_rows(), 3)
+            self.assertEqual(self.marks(), before)
+            self.assertRollupsCorrect()
+            self.assertEqual(attendance_writer.upsert_attendance([archived_mark])['archived'], 1)
+
+        # Archived days are already in ArchivedAttendance: only the current month's marks come back
+        self.assertEqual(attendance_store.restore_rows()['restored'], 3)
+        self.assertEqual(self.marks(), before)
+        self.assertRollupsCorrect()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceSubmitTests(TestCase):
+    """
+    The offline submission endpoint must be safe to retry: replayed batches and operations change
+    nothing, a batch still being applied gets a 409, and the newest mark wins by its client time.
+    """
+    URL = '/api/teacher/attendance/submit/'
+
+    def setUp(self):
+        self.teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='submit-teacher', role='teacher'), full_name='Teacher'
+        )
+        self.subject = Subject.objects.create(name='Submit subject')
+        self.teacher.subjects.add(self.subject)
+        self.student = StudentProfile.objects.create(
+            user=User.objects.create_user(username='submit-student', role='student'), full_name='Student', roll_number='S-1'
+        )
+        self.day = date.today() - timedelta(days=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def operation(self, key, status, marked_at, day=None):
+        return {
+            'key': key, 'student_id': self.student.pk, 'subject_id': self.subject.id,
+            'date': (day or self.day).isoformat(), 'status': status, 'marked_at': marked_at.isoformat(),
+        }
+
+    def submit(self, batch_key, *operations):
+        response = self.client.post(self.URL, {'batch_key': batch_key, 'operations': list(operations)}, format='json')
+        return response.status_code, response.json()
+
+    def stored(self, day=None):
+        return Attendance.objects.values_list('status', 'marked_at').get(student=self.student, date=day or self.day)
+
+    def test_replayed_batch_returns_the_stored_counts_without_writing(self):
+        now = timezone.now()
+        batch = [self.operation('op-1', 'present', now), self.operation('op-2', 'absent', now, day=self.day - timedelta(days=1))]
+        status, first = self.submit('batch-1', *batch)
+        self.assertEqual((status, first['applied'], first['replayed']), (200, 2, False))
+        changes = AttendanceChange.objects.count()
+
+        status, replay = self.submit('batch-1', *batch)
+        self.assertEqual(status, 200)
+        self.assertEqual({**replay, 'replayed': False}, first)
+        self.assertTrue(replay['replayed'])
+        self.assertEqual(AttendanceChange.objects.count(), changes)
+
+    def test_operation_applied_by_an_earlier_batch_is_a_duplicate(self):
+        now = timezone.now()
+        self.submit('batch-1', self.operation('op-1', 'present', now))
+        status, result = self.submit('batch-2', self.operation('op-1', 'absent', now + timedelta(seconds=1)))
+        self.assertEqual((status, result['duplicates'], result['applied']), (200, 1, 0))
+        self.assertEqual(self.stored()[0], 'present')
+
+    def test_batch_being_applied_elsewhere_gets_a_conflict(self):
+        # Claimed by another request that hasn't stored its response yet
+        IdempotencyKey.objects.create(teacher=self.teacher, scope='batch', key='batch-1')
+        status, result = self.submit('batch-1', self.operation('op-1', 'present', timezone.now()))
+        self.assertEqual(status, 409)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_newest_mark_wins_by_client_time(self):
+        now = timezone.now()
+        self.submit('batch-1', self.operation('op-1', 'present', now - timedelta(minutes=5)))
+        # Taken earlier, synced later: loses
+        status, result = self.submit('batch-2', self.operation('op-2', 'absent', now - timedelta(minutes=10)))
+        self.assertEqual((result['stale'], result['applied']), (1, 0))
+        self.assertEqual(self.stored()[0], 'present')
+        # Taken later: wins
+        status, result = self.submit('batch-3', self.operation('op-3', 'absent', now - timedelta(minutes=1)))
+        self.assertEqual(result['applied'], 1)
+        self.assertEqual(self.stored()[0], 'absent')
+        # Within one batch, too
+        status, result = self.submit(
+            'batch-4', self.operation('op-5', 'present', now), self.operation('op-4', 'absent', now - timedelta(seconds=30)),
+        )
+        self.assertEqual(self.stored()[0], 'present')
+
+    def test_future_timestamps_are_clamped_to_the_server_time(self):
+        before = timezone.now()
+        self.submit('batch-1', self.operation('op-1', 'present', before + timedelta(days=1)))
+        status, marked_at = self.stored()
+        self.assertLessEqual(marked_at, timezone.now())
+        # A fast device clock doesn't make the mark unbeatable
+        status, result = self.submit('batch-2', self.operation('op-2', 'absent', timezone.now()))
+        self.assertEqual(result['applied'], 1)
+        self.assertEqual(self.stored()[0], 'absent')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceSyncTests(TestCase):
+    """
+    The delta sync log: changes come back compacted and paged by cursor, the last
+    ATTENDANCE_SYNC_LAG seconds are held back, and a cursor from before a prune gets a reset.
+    """
+
+    def setUp(self):
+        self.teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='sync-teacher', role='teacher'), full_name='Teacher'
+        )
+        self.subject = Subject.objects.create(name='Sync subject')
+        self.students = [
+            StudentProfile.objects.create(
+                user=User.objects.create_user(username=f'sync-student-{n}', role='student'),
+                full_name=f'Student {n}', roll_number=f'Y-{n}',
+            )
+            for n in range(3)
+        ]
+        self.today = date.today()
+
+    def mark(self, student, status, days_ago=0):
+        attendance_writer.upsert_attendance([
+            (student.pk, self.subject.id, self.today - timedelta(days=days_ago), status, self.teacher.pk)
+        ])
+
+    def settle(self, seconds=None):
+        """Ages every logged change by `seconds` (default: just past the lag), as if written that long ago."""
+        seconds = settings.ATTENDANCE_SYNC_LAG + 1 if seconds is None else seconds
+        AttendanceChange.objects.update(created_at=F('created_at') - timedelta(seconds=seconds))
+
+    def sync(self, cursor, limit=None):
+        return attendance_sync.changes_since(self.subject.id, cursor, limit)
+
+    def test_recent_changes_are_held_back(self):
+        self.mark(self.students[0], 'present')
+        self.assertEqual(self.sync(0), {'cursor': 0, 'more': False, 'changes': []})
+        self.assertEqual(attendance_sync.current_cursor(), 0)
+
+        with override_settings(ATTENDANCE_SYNC_LAG=0):
+            self.assertEqual(self.sync(0)['changes'], [['m', self.students[0].pk, self.today.isoformat(), 'P']])
+
+        self.settle()
+        result = self.sync(0)
+        self.assertEqual(len(result['changes']), 1)
+        self.assertEqual(result['cursor'], attendance_sync.current_cursor())
+
+    def test_pages_follow_the_cursor_and_compact_each_mark(self):
+        for n, student in enumerate(self.students):
+            self.mark(student, 'present', days_ago=n)
+        self.mark(self.students[0], 'absent')
+        self.settle()
+
+        first = self.sync(0, limit=2)
+        self.assertTrue(first['more'])
+        self.assertEqual(len(first['changes']), 2)
+        rest = self.sync(first['cursor'], limit=2)
+        self.assertFalse(rest['more'])
+        # The first student's mark was rewritten on the second page: it appears there with its latest status
+        self.assertEqual(rest['changes'][-1], ['m', self.students[0].pk, self.today.isoformat(), 'A'])
+        self.assertEqual(self.sync(rest['cursor']), {'cursor': rest['cursor'], 'more': False, 'changes': []})
+
+        everything = self.sync(0)['changes']
+        self.assertEqual(len(everything), 3)
+        self.assertEqual(everything[-1][3], 'A')
+
+    def test_enrolments_and_their_tombstones(self):
+        student, leaving = self.students[0], self.students[1]
+        self.subject.students.add(student, leaving)
+        self.subject.students.remove(leaving)
+        self.mark(student, 'present')
+        student.user.delete()
+        self.settle()
+
+        changes = self.sync(0)['changes']
+        self.assertIn(['e', leaving.pk, 0], changes)
+        self.assertIn(['e', student.pk, 0], changes)
+        self.assertIn(['m', student.pk, self.today.isoformat(), None], changes)
+        self.assertNotIn(['e', leaving.pk, 1, leaving.roll_number, leaving.full_name], changes)
+
+        self.subject.students.add(leaving)
+        self.settle()
+        changes = self.sync(0)['changes']
+        self.assertIn(['e', leaving.pk, 1, leaving.roll_number, leaving.full_name], changes)
+
+    def test_cursor_from_before_a_prune_is_reset(self):
+        self.assertEqual(self.sync(None), {'reset': True, 'cursor': 0})
+        self.mark(self.students[0], 'present')
+        self.mark(self.students[1], 'present')
+        self.settle(seconds=(settings.ATTENDANCE_SYNC_RETENTION_DAYS + 1) * 86400)
+        stale_cursor = self.sync(0)['cursor'] - 1
+        self.mark(self.students[2], 'absent')
+        self.settle()
+
+        # The newest change is always kept, so the log can tell that older ones are gone
+        self.assertEqual(attendance_sync.prune(), 2)
+        self.assertEqual(self.sync(stale_cursor), {'reset': True, 'cursor': attendance_sync.current_cursor()})
+        result = self.sync(self.sync(stale_cursor)['cursor'])
+        self.assertEqual(result['changes'], [])
+
+
+@override_settings(ATTENDANCE_STORAGE='rows', CACHES=TEST_CACHES)
+class AttendanceArchiveTests(TestCase):
+    """
+    Archiving moves a closed period's marks out of the hot table without changing what anyone sees:
+    the sheet, the export and the rollups still include them, and they become read-only.
+    """
+
+    def setUp(self):
+        self.teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='archive-teacher', role='teacher'), full_name='Teacher'
+        )
+        self.subject = Subject.objects.create(name='Archive subject')
+        self.teacher.subjects.add(self.subject)
+        self.students = [
+            StudentProfile.objects.create(
+                user=User.objects.create_user(username=f'archive-student-{n}', role='student'),
+                full_name=f'Student {n}', roll_number=f'A-{n}',
+            )
+            for n in range(2)
+        ]
+        self.subject.students.add(*self.students)
+
+        this_month = date.today().replace(day=1)
+        self.period = ((this_month - timedelta(days=1)).replace(day=1), this_month - timedelta(days=1))
+        self.archived_day, self.current_day = self.period[0] + timedelta(days=2), this_month
+        marked_at = timezone.now() - timedelta(days=1)
+        rows = [
+            (student.pk, self.subject.id, day, 'present' if n else 'absent', self.teacher.pk)
+            for n, student in enumerate(self.students) for day in (self.archived_day, self.current_day)
+        ]
+        attendance_writer.upsert_attendance(rows, marked_at={row[:3]: marked_at for row in rows})
+        self.marked_at = marked_at
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def sheet(self, day):
+        response = self.client.get('/api/teacher/attendance/sheet/', {
+            'subject_id': self.subject.id, 'month': day.month, 'year': day.year,
+        })
+        return {student['id']: student['attendance'] for student in response.json()['students']}
+
+    def export(self):
+        response = self.client.get('/api/teacher/attendance/export/', {
+            'subject_id': self.subject.id, 'start': self.archived_day.isoformat(), 'end': self.current_day.isoformat(),
+        })
+        return b''.join(response.streaming_content).decode()
+
+    def test_archived_marks_are_still_read(self):
+        sheets = {day: self.sheet(day) for day in (self.archived_day, self.current_day)}
+        export = self.export()
+        summaries = list(AttendanceSummary.objects.values_list('student_id', 'present_count', 'total_count').order_by('student_id'))
+
+        self.assertEqual(attendance_archive.archive_period('Last month', *self.period), 2)
+        self.assertEqual(set(Attendance.objects.values_list('date', flat=True)), {self.current_day})
+
+        self.assertEqual({day: self.sheet(day) for day in sheets}, sheets)
+        self.assertEqual(sheets[self.archived_day][self.students[1].pk], {str(self.archived_day.day): 'present'})
+        self.assertEqual(self.export(), export)
+        self.assertEqual(
+            list(AttendanceSummary.objects.values_list('student_id', 'present_count', 'total_count').order_by('student_id')),
+            summaries,
+        )
+        self.assertEqual(attendance_rollups.rebuild(verify_only=True), {'AttendanceSummary': 0, 'DailyAttendanceSummary': 0})
+
+    def test_archived_marks_keep_their_marked_at_and_are_read_only(self):
+        attendance_archive.archive_period('Last month', *self.period)
+        self.assertEqual(set(ArchivedAttendance.objects.values_list('marked_at', flat=True)), {self.marked_at})
+
+        counts = attendance_writer.upsert_attendance([
+            (self.students[0].pk, self.subject.id, self.archived_day, 'present', self.teacher.pk),
+        ])
+        self.assertEqual((counts['archived'], counts['updated'], counts['inserted']), (1, 0, 0))
+        self.assertEqual(ArchivedAttendance.objects.get(student=self.students[0]).status, 'absent')
+        self.assertEqual(attendance_writer.delete_marks([(self.students[0].pk, self.subject.id, self.archived_day)]), 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceImportTests(TestCase):
+    """
+    The import summary accounts for every row read, and a file that can't be decoded part way
+    through reports the rows already written instead of hiding them behind an error.
+    """
+    URL = '/api/teacher/attendance/import/'
+
+    def setUp(self):
+        self.teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='import-teacher', role='teacher'), full_name='Teacher'
+        )
+        self.subject = Subject.objects.create(name='Import subject')
+        self.teacher.subjects.add(self.subject)
+        self.students = [
+            StudentProfile.objects.create(
+                user=User.objects.create_user(username=f'import-student-{n}', role='student'),
+                full_name=f'Student {n}', roll_number=f'I-{n}',
+            )
+            for n in range(3)
+        ]
+        roll_resolver.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def upload(self, data):
+        response = self.client.post(self.URL, {'file': io.BytesIO(data)}, format='multipart')
+        return response.status_code, response.json()
+
+    def test_summary_counts_every_row(self):
+        attendance_writer.upsert_attendance([(self.students[0].pk, self.subject.id, date(2026, 1, 1), 'present', self.teacher.pk)])
+        lines = [
+            'roll_number,subject,date,status',
+            'I-0,Import subject,2026-01-01,P',   # unchanged
+            'I-1,Import subject,2026-01-01,A',   # superseded by the next row
+            'I-1,Import subject,2026-01-01,P',   # inserted
+            'I-9,Import subject,2026-01-01,P',   # rejected
+        ]
+        status, body = self.upload(('\n'.join(lines) + '\n').encode())
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            {key: body[key] for key in ('rows', 'inserted', 'unchanged', 'duplicates', 'rejected')},
+            {'rows': 4, 'inserted': 1, 'unchanged': 1, 'duplicates': 1, 'rejected': 1},
+        )
+        self.assertEqual(body['rows'], sum(body[key] for key in (
+            'inserted', 'updated', 'unchanged', 'duplicates', 'stale', 'archived', 'rejected',
+        )))
+
+    @override_settings(ATTENDANCE_IMPORT_CHUNK_SIZE=10)
+    def test_unreadable_file_reports_the_rows_already_written(self):
+        # Well past the text decoder's read size, so earlier chunks are committed before the bad byte
+        rows = [
+            f'I-{n % 3},Import subject,{date(2025, 1, 1) + timedelta(days=n // 3)},P'.encode() for n in range(600)
+        ]
+        data = b'roll_number,subject,date,status\n' + b'\n'.join(rows) + b'\n\xff\xfe,bad\n'
+        status, body = self.upload(data)
+
+        self.assertEqual(status, 400)
+        self.assertIn('Could not read the CSV', body['error'])
+        # The file is decoded a block at a time, so the error surfaces a little before the bad line
+        self.assertTrue(0 < body['rows'] <= 600)
+        self.assertEqual(body['inserted'], body['rows'])
+        self.assertEqual(Attendance.objects.count(), body['rows'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AttendanceSheetTests(TestCase):
+    """
+    The sheet's ETag must change with anything shown on it (marks, enrolments, student profiles),
+    so polling clients get 304 only while their copy is current.
+    """
+    URL = '/api/teacher/attendance/sheet/'
+
+    def setUp(self):
+        self.teacher = TeacherProfile.objects.create(
+            user=User.objects.create_user(username='sheet-teacher', role='teacher'), full_name='Teacher'
+        )
+        self.subject = Subject.objects.create(name='Sheet subject')
+        self.teacher.subjects.add(self.subject)
+        self.students = [
+            StudentProfile.objects.create(
+                user=User.objects.create_user(username=f'sheet-student-{n}', role='student'),
+                full_name=f'Student {n}', roll_number=f'SH-{n}',
+            )
+            for n in range(3)
+        ]
+        self.subject.students.add(*self.students[:2])
+        self.day = date.today().replace(day=2)
+        attendance_writer.upsert_attendance([(self.students[0].pk, self.subject.id, self.day, 'present', self.teacher.pk)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def get(self, etag=None, **params):
+        params = {'subject_id': self.subject.id, 'month': self.day.month, 'year': self.day.year, **params}
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.URL, params, **headers)
+
+    def assertChangesETag(self, change):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_sheet_is_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+
+        revalidated = self.get(response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+        self.assertEqual(revalidated.content, b'')
+
+    def test_etag_changes_after_a_mark(self):
+        self.assertChangesETag(lambda: attendance_writer.upsert_attendance([
+            (self.students[1].pk, self.subject.id, self.day, 'absent', self.teacher.pk),
+        ]))
+
+    def test_etag_changes_after_an_enrolment(self):
+        self.assertChangesETag(lambda: self.subject.students.add(self.students[2]))
+
+    def test_etag_changes_after_a_rename(self):
+        def rename():
+            self.students[1].full_name = 'Renamed'
+            self.students[1].save()
+        self.assertChangesETag(rename)
+        self.assertEqual(self.get().json()['students'][1]['full_name'], 'Renamed')
+
+    def test_compact_layout(self):
+        full = self.get()
+        compact = self.get(layout='compact')
+        self.assertNotEqual(compact['ETag'], full['ETag'])
+
+        data = compact.json()
+        days = data['days_in_month']
+        self.assertEqual([student['id'] for student in data['students']], [student.pk for student in self.students[:2]])
+        self.assertEqual(data['attendance'], ['-' + 'P' + '-' * (days - 2), '-' * days])
+        self.assertEqual(self.get(compact['ETag'], layout='compact').status_code, 304)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ApprovalInboxTests(TestCase):
+    """
+    The inbox pages through the teacher's own and CC'd approvals, newest first, without skipping or
+    repeating an approval when several share a created_at, in either direction.
+    """
+    URL = '/api/teacher/approvals/'
+
+    def setUp(self):
+        self.teacher, other = [
+            TeacherProfile.objects.create(
+                user=User.objects.create_user(username=f'inbox-teacher-{n}', role='teacher'), full_name=f'Teacher {n}'
+            )
+            for n in range(2)
+        ]
+        student = StudentProfile.objects.create(
+            user=User.objects.create_user(username='inbox-student', role='student'), full_name='Student', roll_number='IN-1'
+        )
+
+        def approval(teacher, *cc_teachers):
+            created = Approval.objects.create(student=student, teacher=teacher, subject='Leave', message='Family event')
+            created.cc_teachers.add(*cc_teachers)
+            return created
+
+        own = [approval(self.teacher) for _ in range(5)]
+        cced = [approval(other, self.teacher) for _ in range(3)]
+        both = approval(self.teacher, self.teacher, other)
+        approval(other)  # Not in this teacher's inbox
+
+        # Three timestamps, each shared by several approvals from both halves of the inbox
+        now = timezone.now()
+        inbox = own + cced + [both]
+        for n, item in enumerate(inbox):
+            Approval.objects.filter(pk=item.pk).update(created_at=now - timedelta(minutes=n % 3))
+        self.expected = [
+            pk for pk, _ in sorted(
+                Approval.objects.filter(pk__in=[item.pk for item in inbox]).values_list('pk', 'created_at'),
+                key=lambda row: (row[1], row[0]), reverse=True,
+            )
+        ]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.json()
+
+    def test_paging_forward_and_back_with_ties(self):
+        pages = [self.get(self.URL, limit=4)]
+        self.assertIsNone(pages[0]['previous'])
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+
+        forward = [[item['id'] for item in page['results']] for page in pages]
+        self.assertEqual([pk for ids in forward for pk in ids], self.expected)
+        self.assertEqual([len(ids) for ids in forward], [4, 4, 1])
+
+        backward = [forward[-1]]
+        page = pages[-1]
+        while page['previous']:
+            page = self.get(page['previous'])
+            backward.append([item['id'] for item in page['results']])
+        self.assertEqual(backward[::-1], forward)
+
+    def test_cced_approvals_are_listed_once(self):
+        results = self.get(self.URL)['results']
+        self.assertEqual([item['id'] for item in results], self.expected)
+        self.assertEqual(sum(item['teacher'] != self.teacher.pk for item in results), 3)
+
+        pending = self.get(self.URL, status='pending')['results']
+        self.assertEqual(len(pending), len(self.expected))
+        self.assertEqual(self.get(self.URL, status='approved')['results'], [])
+
+    def test_bad_cursor_or_limit_is_rejected(self):
+        bad_cursor = base64.urlsafe_b64encode(b'x|not-a-date|1').decode()
+        for params in ({'cursor': 'not-a-cursor'}, {'cursor': bad_cursor}, {'limit': 'ten'}, {'status': 'lost'}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.URL, params).status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES, PROVISIONING_ADMIN_MAX_STUDENTS=2)
+class ProvisionStudentsAdminTests(TestCase):
+    """
+    The Subject admin action hashes passwords inside the request, so it only takes small rosters;
+    larger ones are refused whole and left to the provision_students command.
+    """
+    URL = '/admin/attendance_app/subject/'
+
+    def setUp(self):
+        self.subject = Subject.objects.create(name='Provisioning subject')
+        self.client.force_login(User.objects.create_superuser('provision-admin', password='password123'))
+
+    def provision(self, *roll_numbers):
+        roster = 'roll_number,full_name\n' + ''.join(f'{roll},Student {roll}\n' for roll in roll_numbers)
+        response = self.client.post(self.URL, {
+            'action': 'provision_students', '_selected_action': [self.subject.pk], 'apply': '1',
+            'roster': SimpleUploadedFile('roster.csv', roster.encode()), 'default_password': 'secret',
+        }, follow=True)
+        return [str(message) for message in response.context['messages']]
+
+    def test_small_roster_is_created(self):
+        self.assertEqual(self.provision('PR-1', 'PR-2'), ['2 students created.'])
+        self.assertEqual(self.subject.students.count(), 2)
+
+    def test_large_roster_is_sent_to_the_command(self):
+        messages = self.provision('PR-1', 'PR-2', 'PR-3')
+        self.assertIn('manage.py provision_students', messages[0])
+        self.assertFalse(StudentProfile.objects.exists())
@@ -8,6 +8,7 @@ from .views import (
 )
 from .views import AssessmentStartView, AssessmentSubmitView, TeacherApprovalListView, TeacherListView,AIEnhanceView, StudentApprovalView, TeacherApprovalUpdateView,GetAttendanceSheetView, BulkAttendanceUpdateView, ProcessAttendanceSheetView
 from .views import RegisterFaceView, RecognizeFaceView
+from .views import GeminiMetricsView, AttendanceExportView, AttendanceImportView, CohortAnalyticsView, AttendanceSyncView, AttendanceSubmitView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -39,6 +40,7 @@ urlpatterns = [
 
     path('teachers/list/', TeacherListView.as_view()),
     path('ai/enhance/', AIEnhanceView.as_view()),
+    path('ai/metrics/', GeminiMetricsView.as_view()),
     
     path('student/approvals/', StudentApprovalView.as_view()),
     
@@ -47,6 +49,11 @@ urlpatterns = [
 
     path('teacher/attendance/sheet/', GetAttendanceSheetView.as_view()),
     path('teacher/attendance/update/', BulkAttendanceUpdateView.as_view()),
+    path('teacher/attendance/export/', AttendanceExportView.as_view()),
+    path('teacher/attendance/import/', AttendanceImportView.as_view()),
+    path('teacher/attendance/sync/', AttendanceSyncView.as_view()),
+    path('teacher/attendance/submit/', AttendanceSubmitView.as_view()),
+    path('teacher/analytics/at-risk/', CohortAnalyticsView.as_view()),
 
     path('teacher/attendance/ocr/', ProcessAttendanceSheetView.as_view()),
 
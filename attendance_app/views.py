@@ -7,31 +7,46 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import MyTokenObtainPairSerializer
 from .models import StudentProfile, TeacherProfile,Subject
 from .serializers import StudentProfileSerializer, TeacherProfileSerializer, SubjectSerializer
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from .permissions import IsTeacher,IsStudent
 from .serializers import TeacherDashboardSerializer, StudentDashboardSerializer, ApprovalReadSerializer, ApprovalWriteSerializer, TeacherSelectSerializer, AIEnhanceSerializer
 from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
 from .serializers import UserSkillWriteSerializer, UserProjectWriteSerializer, PerformanceWriteSerializer
-from .models import UserSkill, UserProject, Performance,Approval, Attendance, StudentFace
+from .models import UserSkill, UserProject, Performance,Approval, StudentFace, ArchivedPeriod
 from .services import gemini_service
 from django.db import models
 
 import calendar
-from datetime import datetime
+import csv
+import io
+import tempfile
+import itertools
+import hashlib
+from datetime import date, datetime, timedelta
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.http import StreamingHttpResponse
+from django.conf import settings
 from django.db import transaction
 
 import PIL.Image
-from .services import gemini_service
+from .services import gemini_service, ocr_cache, image_preprocessing, gemini_metrics, question_bank, attendance_writer, roll_resolver, dashboard_cache, attendance_store, attendance_export, attendance_import, cohort_analytics, attendance_sync, attendance_submissions, approval_inbox
 
 from django.core.exceptions import ObjectDoesNotExist
 
 import numpy as np
+import pandas as pd
 import json
+import logging
 import cv2
 from PIL import Image
 from deepface import DeepFace
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
+logger = logging.getLogger(__name__)
+
 
 
 class AssessmentStartView(APIView):
@@ -42,8 +57,13 @@ class AssessmentStartView(APIView):
         if not skill_name:
             return Response({'error': 'skill_name is required.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        context = {'skill_name': skill_name}
-        questions_data = gemini_service.call_gemini_api('GENERATE_QUESTIONS', context)
+        # Serve a pre-generated set from the question bank; only fall back to a
+        # live Gemini call (which also stocks the bank) for skills not seen before.
+        # skill_name is free text, so only the student's own skills are refilled in the background.
+        refill_allowed = question_bank.is_known_skill(skill_name, request.user.studentprofile.pk)
+        questions_data = question_bank.get_question_set(skill_name, refill_allowed)
+        if questions_data is None:
+            questions_data = question_bank.generate_question_set(skill_name)
 
         if "error" in questions_data:
             return Response(questions_data, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -151,11 +171,10 @@ class StudentDashboardForTeacherView(generics.RetrieveAPIView):
     lookup_field = 'roll_number' # We'll fetch the student by their roll number from the URL
     queryset = StudentProfile.objects.all()
 
-    def get_serializer_context(self):
-        # This is the same logic as the student's own dashboard view
-        context = super().get_serializer_context()
-        context['student'] = self.get_object()
-        return context
+    def retrieve(self, request, *args, **kwargs):
+        # Same payload as the student's own dashboard, so it shares their cache entry
+        student = self.get_object()
+        return Response(get_cached_student_dashboard(self, student))
 
 # --- Skill Management Views ---
 class SkillCreateView(generics.CreateAPIView):
@@ -285,6 +304,32 @@ class TeacherDashboardView(generics.RetrieveAPIView):
         # This is a major performance optimization.
         return TeacherProfile.objects.prefetch_related('subjects__students').get(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        # A cache hit skips get_object() and the serializer entirely
+        teacher_id = request.user.pk
+        subject_ids = TeacherProfile.subjects.through.objects.filter(
+            teacherprofile_id=teacher_id
+        ).values_list('subject_id', flat=True)
+        data = dashboard_cache.get_or_build(
+            'teacher', teacher_id,
+            subject_ids=subject_ids,
+            teacher_ids=[teacher_id],
+            build=lambda: self.get_serializer(self.get_object()).data,
+        )
+        return Response(data)
+
+
+def get_cached_student_dashboard(view, student):
+    subject_ids = StudentProfile.subjects.through.objects.filter(
+        studentprofile_id=student.pk
+    ).values_list('subject_id', flat=True)
+    return dashboard_cache.get_or_build(
+        'student', student.pk,
+        subject_ids=subject_ids,
+        student_ids=[student.pk],
+        build=lambda: view.get_serializer(student).data,
+    )
+
 
 class StudentDashboardView(generics.RetrieveAPIView):
     """
@@ -295,15 +340,12 @@ class StudentDashboardView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated, IsStudent]
 
     def get_object(self):
-        # The object is the profile of the logged-in student
-        return StudentProfile.objects.prefetch_related('subjects__teachers').get(user=self.request.user)
-    
-    def get_serializer_context(self):
-        # We need to pass the student object to the serializer context
-        # so our custom methods in SubjectWithStatsSerializer can access it
-        context = super().get_serializer_context()
-        context['student'] = self.get_object()
-        return context
+        # The object is the profile of the logged-in student.
+        # The serializer fetches the subjects itself, already annotated with attendance stats.
+        return StudentProfile.objects.get(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(get_cached_student_dashboard(self, self.get_object()))
 
 
 # --- Helper to get list of teachers for dropdown ---
@@ -328,12 +370,21 @@ class AIEnhanceView(APIView):
             return Response(result)
         return Response(serializer.errors, status=400)
 
+# --- Gemini usage metrics (per worker process) ---
+class GeminiMetricsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(gemini_metrics.snapshot())
+
 # --- Student: List & Create Approvals ---
 class StudentApprovalView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsStudent]
     
     def get_queryset(self):
-        return Approval.objects.filter(student=self.request.user.studentprofile).order_by('-created_at')
+        return Approval.objects.filter(student=self.request.user.studentprofile).select_related(
+            'student', 'teacher'
+        ).prefetch_related('cc_teachers').order_by('-created_at')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -344,16 +395,33 @@ class StudentApprovalView(generics.ListCreateAPIView):
         serializer.save(student=self.request.user.studentprofile)
 
 # --- Teacher: List & Update Approvals ---
-class TeacherApprovalListView(generics.ListAPIView):
+class TeacherApprovalListView(APIView):
+    """
+    The teacher's approval inbox (approvals sent to them or CCing them), newest first, a page at a time:
+    {"next", "previous", "results"}, where next/previous are URLs carrying a ?cursor=.
+    Filter with ?status=pending|approved|rejected; ?limit= sets the page size, up to APPROVAL_INBOX_PAGE_SIZE.
+    """
     permission_classes = [IsAuthenticated, IsTeacher]
-    serializer_class = ApprovalReadSerializer
 
-    def get_queryset(self):
-        # Show approvals where teacher is main recipient OR in CC
-        return Approval.objects.filter(
-            models.Q(teacher=self.request.user.teacherprofile) | 
-            models.Q(cc_teachers=self.request.user.teacherprofile)
-        ).distinct().order_by('-created_at')
+    def get(self, request):
+        status_filter = request.query_params.get('status') or None
+        if status_filter and status_filter not in dict(Approval.STATUS_CHOICES):
+            return Response({'error': 'Invalid status'}, status=400)
+        try:
+            limit = min(int(request.query_params.get('limit') or settings.APPROVAL_INBOX_PAGE_SIZE),
+                        settings.APPROVAL_INBOX_PAGE_SIZE)
+            approvals, next_cursor, previous_cursor = approval_inbox.page(
+                request.user.teacherprofile.pk, status_filter, request.query_params.get('cursor'), max(limit, 1)
+            )
+        except ValueError:
+            return Response({'error': 'Invalid cursor or limit.'}, status=400)
+
+        url = request.build_absolute_uri()
+        return Response({
+            'next': replace_query_param(url, 'cursor', next_cursor) if next_cursor else None,
+            'previous': replace_query_param(url, 'cursor', previous_cursor) if previous_cursor else None,
+            'results': ApprovalReadSerializer(approvals, many=True).data,
+        })
 
 class TeacherApprovalUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated, IsTeacher]
@@ -372,60 +440,356 @@ class TeacherApprovalUpdateView(generics.UpdateAPIView):
 
 
 class GetAttendanceSheetView(APIView):
+    """
+    Monthly attendance sheet for one subject.
+
+    ?layout=compact returns the roster plus one status string per student, where
+    character N-1 is day N: 'P' present, 'A' absent, '-' not marked.
+    Responses carry an ETag so polling clients get 304 Not Modified. There is no Last-Modified:
+    roster changes (enrolments, renamed students) have no timestamp to go in it.
+    """
     permission_classes = [IsAuthenticated, IsTeacher]
 
     def get(self, request):
         subject_id = request.query_params.get('subject_id')
-        month = int(request.query_params.get('month')) # 1-12
-        year = int(request.query_params.get('year'))
+        # Note: not "format", which DRF reserves for choosing the renderer
+        layout = request.query_params.get('layout', 'full')
 
-        if not all([subject_id, month, year]):
+        try:
+            month = int(request.query_params.get('month')) # 1-12
+            year = int(request.query_params.get('year'))
+            num_days = calendar.monthrange(year, month)[1]
+        except (TypeError, ValueError, calendar.IllegalMonthError):
+            return Response({'error': 'Subject, Month, and Year are required.'}, status=400)
+
+        if not subject_id:
             return Response({'error': 'Subject, Month, and Year are required.'}, status=400)
 
+        # Security check: Ensure teacher teaches this subject
+        if not request.user.teacherprofile.subjects.filter(id=subject_id).exists():
+            if not Subject.objects.filter(id=subject_id).exists():
+                return Response({'error': 'Subject not found'}, status=404)
+            return Response({'error': 'You do not teach this subject.'}, status=403)
+
+        first_day = date(year, month, 1)
+
+        # --- Conditional GET ---
+        # The sheet changes when a mark is written/deleted, the enrolment changes or an enrolled
+        # student's profile (name, roll number) changes. The subject's dashboard version covers the
+        # profiles and enrolments made through the ORM; the enrolment aggregate also catches bulk changes.
+        marks_version = attendance_store.month_version(subject_id, first_day)
+        roster_version = StudentProfile.subjects.through.objects.filter(subject_id=subject_id).aggregate(
+            count=Count('id'), last_id=Max('id')
+        )
+        subject_version = dashboard_cache.subject_version(subject_id)
+        etag = quote_etag(hashlib.md5(
+            f"{layout}:{subject_id}:{year}-{month}:{marks_version}:{roster_version}:{subject_version}".encode()
+        ).hexdigest())
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self._with_validators(not_modified, etag)
+
+        # --- Build the sheet from plain tuples (no model instances) ---
+        # Get all enrolled students
+        students = list(
+            StudentProfile.objects.filter(subjects__id=subject_id)
+            .order_by('roll_number')
+            .values_list('user_id', 'full_name', 'roll_number')
+        )
+        # {student_id: (present_mask, recorded_mask)}, bit N-1 = day N
+        masks = attendance_store.month_masks(subject_id, first_day)
+        day_bits = [1 << day_index for day_index in range(num_days)]
+
+        if layout == 'compact':
+            def status_string(present_mask, recorded_mask):
+                return ''.join(
+                    ('P' if present_mask & bit else 'A') if recorded_mask & bit else '-'
+                    for bit in day_bits
+                )
+
+            data = {
+                'layout': 'compact',
+                'days_in_month': num_days,
+                'students': [
+                    {'id': student_id, 'full_name': full_name, 'roll_number': roll_number}
+                    for student_id, full_name, roll_number in students
+                ],
+                'attendance': [status_string(*masks.get(student_id, (0, 0))) for student_id, _, _ in students],
+            }
+        else:
+            # Create a lookup dictionary: {student_id: {day: status}}
+            attendance_map = {
+                student_id: {day.day: status_val for day, status_val in attendance_store.decode(first_day, *pair)}
+                for student_id, pair in masks.items()
+            }
+
+            data = {
+                'students': [
+                    {
+                        'id': student_id,
+                        'full_name': full_name,
+                        'roll_number': roll_number,
+                        'attendance': attendance_map.get(student_id, {})
+                    }
+                    for student_id, full_name, roll_number in students
+                ],
+                'days_in_month': num_days
+            }
+
+        return self._with_validators(Response(data), etag)
+
+    def _with_validators(self, response, etag):
+        response['ETag'] = etag
+        # Clients may keep the sheet but must revalidate before reusing it
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class AttendanceExportView(APIView):
+    """
+    Streams the attendance register (students x days) for a subject and date range.
+    ?subject_id=&start=YYYY-MM-DD&end=YYYY-MM-DD&file_format=csv|xlsx
+    """
+    permission_classes = [IsAuthenticated, IsTeacher]
+
+    CONTENT_TYPES = {
+        'csv': 'text/csv',
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    }
+
+    def get(self, request):
+        subject_id = request.query_params.get('subject_id')
+        # Note: not "format", which DRF reserves for choosing the renderer
+        file_format = request.query_params.get('file_format', 'csv')
+
         try:
-            subject = Subject.objects.get(id=subject_id)
-            # Security check: Ensure teacher teaches this subject
-            if subject not in request.user.teacherprofile.subjects.all():
-                return Response({'error': 'You do not teach this subject.'}, status=403)
+            start = date.fromisoformat(request.query_params.get('start'))
+            end = date.fromisoformat(request.query_params.get('end'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Subject, start and end dates (YYYY-MM-DD) are required.'}, status=400)
+
+        if not subject_id:
+            return Response({'error': 'Subject, start and end dates (YYYY-MM-DD) are required.'}, status=400)
+        if file_format not in self.CONTENT_TYPES:
+            return Response({'error': 'file_format must be csv or xlsx.'}, status=400)
+        if start > end or (end - start).days >= settings.ATTENDANCE_EXPORT_MAX_DAYS:
+            return Response(
+                {'error': f'The date range must be at most {settings.ATTENDANCE_EXPORT_MAX_DAYS} days.'}, status=400
+            )
 
-            # Get all enrolled students
-            students = subject.students.all().order_by('roll_number')
-            
-            # Get existing attendance records for this month
-            attendance_records = Attendance.objects.filter(
-                subject=subject,
-                date__year=year,
-                date__month=month
+        # Security check: Ensure teacher teaches this subject
+        subject = request.user.teacherprofile.subjects.filter(id=subject_id).first()
+        if subject is None:
+            if not Subject.objects.filter(id=subject_id).exists():
+                return Response({'error': 'Subject not found'}, status=404)
+            return Response({'error': 'You do not teach this subject.'}, status=403)
+
+        rows = attendance_export.register_rows(subject.id, start, end)
+        stream = attendance_export.stream_xlsx(rows) if file_format == 'xlsx' else attendance_export.stream_csv(rows)
+
+        response = StreamingHttpResponse(stream, content_type=self.CONTENT_TYPES[file_format])
+        filename = f"attendance_{subject.id}_{start}_{end}.{file_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class AttendanceImportView(APIView):
+    """
+    Imports attendance from an uploaded CSV (roll_number, subject, date, status) for the
+    teacher's own subjects. Rows that can't be imported are returned with their reasons (the first
+    ATTENDANCE_IMPORT_MAX_REJECTS of them) rather than stored anywhere, since they hold student data.
+    For very large files use `manage.py import_attendance`, which does the same without the HTTP timeout.
+    """
+    permission_classes = [IsAuthenticated, IsTeacher]
+
+    def post(self, request):
+        if 'file' not in request.FILES:
+            return Response({'error': 'No CSV file provided'}, status=400)
+
+        teacher = request.user.teacherprofile
+        csv_stream = io.TextIOWrapper(request.FILES['file'].file, encoding='utf-8-sig', newline='')
+
+        with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as rejects:
+            importer = attendance_import.AttendanceImporter(
+                teacher_id=teacher.pk,
+                rejects=rejects,
+                allowed_subject_ids=teacher.subjects.values_list('id', flat=True),
             )
+            error = None
+            try:
+                importer.run(csv_stream)
+            except (ValueError, csv.Error) as e:
+                # Nothing was written if the header is bad; otherwise the rows before the
+                # unreadable line were, and the summary below says which
+                if not importer.counts['rows']:
+                    return Response({'error': f'Could not read the CSV: {e}'}, status=400)
+                error = f"Could not read the CSV after {importer.counts['rows']} rows: {e}"
+
+            rejects.seek(0)
+            rejected_rows = list(itertools.islice(csv.DictReader(rejects), settings.ATTENDANCE_IMPORT_MAX_REJECTS))
+
+        counts = importer.counts
+        summary = {
+            **counts,
+            'rejects': rejected_rows,
+            'rejects_truncated': counts['rejected'] > len(rejected_rows),
+        }
+        if error:
+            return Response({'error': error, **summary}, status=400)
+        return Response(summary)
 
-            # Create a lookup dictionary: {student_id: {day: status}}
-            attendance_map = {}
-            for record in attendance_records:
-                sid = record.student.user_id
-                if sid not in attendance_map:
-                    attendance_map[sid] = {}
-                attendance_map[sid][record.date.day] = record.status
-
-            # Build response data
-            student_data = []
-            for student in students:
-                student_data.append({
-                    'id': student.user_id,
-                    'full_name': student.full_name,
-                    'roll_number': student.roll_number,
-                    'attendance': attendance_map.get(student.user_id, {})
-                })
 
-            # Get number of days in the month
-            num_days = calendar.monthrange(year, month)[1]
+class CohortAnalyticsView(APIView):
+    """
+    At-risk attendance analytics for a whole subject (?subject_id=) or class (?class_name=,
+    across the teacher's subjects). Flags each student/subject that is below AT_RISK_THRESHOLD,
+    dropping over the last 4 weeks, on a long absence streak, or projected to finish the term
+    below the threshold (?term_end=YYYY-MM-DD). ?include_all=true also returns students not at risk.
+    By default only the current period is analysed (everything after the last archived period).
+    """
+    permission_classes = [IsAuthenticated, IsTeacher]
 
-            return Response({
-                'students': student_data,
-                'days_in_month': num_days
+    FLAGS = ['below_threshold', 'dropping', 'absence_streak', 'projected_below_threshold']
+
+    def get(self, request):
+        subject_id = request.query_params.get('subject_id')
+        class_name = request.query_params.get('class_name')
+        include_all = request.query_params.get('include_all') == 'true'
+
+        try:
+            end = date.fromisoformat(request.query_params.get('end') or date.today().isoformat())
+            start = request.query_params.get('start')
+            start = date.fromisoformat(start) if start else None
+            term_end = request.query_params.get('term_end')
+            term_end = date.fromisoformat(term_end) if term_end else None
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+
+        if not subject_id and not class_name:
+            return Response({'error': 'A subject_id or class_name is required.'}, status=400)
+
+        teacher_subjects = request.user.teacherprofile.subjects.all()
+        student_ids = None
+        if subject_id:
+            if not teacher_subjects.filter(id=subject_id).exists():
+                if not Subject.objects.filter(id=subject_id).exists():
+                    return Response({'error': 'Subject not found'}, status=404)
+                return Response({'error': 'You do not teach this subject.'}, status=403)
+            subject_ids = [int(subject_id)]
+        else:
+            subject_ids = list(teacher_subjects.values_list('id', flat=True))
+            student_ids = list(StudentProfile.objects.filter(class_name=class_name).values_list('user_id', flat=True))
+
+        if start is None:
+            last_archived = ArchivedPeriod.objects.filter(end_date__lt=end).aggregate(last=Max('end_date'))['last']
+            start = last_archived + timedelta(days=1) if last_archived else date.min
+
+        marks = cohort_analytics.load_marks(start, end, subject_ids, student_ids)
+        if marks.empty:
+            return Response({'students': [], 'cohort': {'pairs': 0, 'at_risk': 0}})
+
+        stats = cohort_analytics.cohort_stats(marks, today=end, term_end=term_end)
+        cohort = {
+            'pairs': len(stats),
+            'at_risk': int(stats['at_risk'].sum()),
+            **{flag: int(stats[flag].sum()) for flag in self.FLAGS},
+        }
+        if not include_all:
+            stats = stats[stats['at_risk']]
+
+        stats = stats.sort_values('percentage').reset_index()
+        students = {
+            student_id: (roll_number, full_name)
+            for student_id, roll_number, full_name in StudentProfile.objects.filter(
+                user_id__in=stats['student_id'].unique().tolist()
+            ).values_list('user_id', 'roll_number', 'full_name')
+        }
+        subject_names = dict(Subject.objects.filter(id__in=subject_ids).values_list('id', 'name'))
+
+        def rounded(value):
+            return None if pd.isna(value) else round(float(value), 2)
+
+        results = []
+        for row in stats.itertuples(index=False):
+            roll_number, full_name = students.get(row.student_id, (None, None))
+            results.append({
+                'student_id': int(row.student_id),
+                'roll_number': roll_number,
+                'full_name': full_name,
+                'subject_id': int(row.subject_id),
+                'subject_name': subject_names.get(row.subject_id),
+                'present': int(row.present),
+                'total': int(row.total),
+                'percentage': rounded(row.percentage),
+                'recent_percentage': rounded(row.recent_percentage),
+                'trend': rounded(row.trend),
+                'longest_absence_streak': int(row.longest_absence_streak),
+                'current_absence_streak': int(row.current_absence_streak),
+                'projected_percentage': rounded(row.projected_percentage),
+                'flags': [flag for flag in self.FLAGS if getattr(row, flag)],
             })
 
-        except Subject.DoesNotExist:
-            return Response({'error': 'Subject not found'}, status=404)
+        return Response({'cohort': cohort, 'students': results})
+
+
+class AttendanceSyncView(APIView):
+    """
+    Delta sync for offline clients: the attendance and enrolment changes for a subject since
+    ?cursor=, as a compact change log, plus the cursor to send next time.
+    With no cursor (or one older than the retained log) the response is {'reset': true, 'cursor': N}:
+    download the sheet, then sync from N.
+    """
+    permission_classes = [IsAuthenticated, IsTeacher]
+
+    def get(self, request):
+        subject_id = request.query_params.get('subject_id')
+        try:
+            cursor = request.query_params.get('cursor')
+            cursor = int(cursor) if cursor not in (None, '') else None
+            limit = min(int(request.query_params.get('limit') or settings.ATTENDANCE_SYNC_PAGE_SIZE),
+                        settings.ATTENDANCE_SYNC_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'cursor and limit must be integers.'}, status=400)
+
+        if not subject_id:
+            return Response({'error': 'Subject is required.'}, status=400)
+
+        # Security check: Ensure teacher teaches this subject
+        if not request.user.teacherprofile.subjects.filter(id=subject_id).exists():
+            if not Subject.objects.filter(id=subject_id).exists():
+                return Response({'error': 'Subject not found'}, status=404)
+            return Response({'error': 'You do not teach this subject.'}, status=403)
+
+        return Response(attendance_sync.changes_since(int(subject_id), cursor, max(limit, 1)))
+
+
+class AttendanceSubmitView(APIView):
+    """
+    Batched submission for marks queued offline. Body:
+      {"batch_key": "...", "operations": [{"key", "student_id", "subject_id", "date", "status", "marked_at"}]}
+    Replaying a batch (or an operation) that was already applied changes nothing and returns the
+    original counts, so clients can retry freely after a dropped connection.
+    """
+    permission_classes = [IsAuthenticated, IsTeacher]
+
+    def post(self, request):
+        batch_key = request.data.get('batch_key') or None
+        operations = request.data.get('operations')
+
+        if batch_key is not None and (not isinstance(batch_key, str) or len(batch_key) > attendance_submissions.KEY_MAX_LENGTH):
+            return Response({'error': f'batch_key must be a string of at most {attendance_submissions.KEY_MAX_LENGTH} characters.'}, status=400)
+        if not isinstance(operations, list) or not operations:
+            return Response({'error': 'operations must be a non-empty list.'}, status=400)
+        if len(operations) > settings.ATTENDANCE_SUBMIT_MAX_OPERATIONS:
+            return Response({'error': f'A batch can have at most {settings.ATTENDANCE_SUBMIT_MAX_OPERATIONS} operations.'}, status=400)
+
+        teacher = request.user.teacherprofile
+        subject_ids = teacher.subjects.values_list('id', flat=True)
+        result = attendance_submissions.submit(teacher.pk, batch_key, operations, subject_ids)
+        if result is None:
+            return Response({'error': 'This batch is already being applied. Retry shortly.'}, status=409)
+        return Response(result)
+
 
 class BulkAttendanceUpdateView(APIView):
     permission_classes = [IsAuthenticated, IsTeacher]
@@ -444,57 +808,85 @@ class BulkAttendanceUpdateView(APIView):
         teacher = request.user.teacherprofile
 
         try:
-            subjects = Subject.objects.filter(id__in=subject_ids)
+            subject_ids = list(Subject.objects.filter(id__in=subject_ids).values_list('id', flat=True))
 
-            with transaction.atomic():
-                if is_ocr:
-                    ocr_data = request.data.get('ocr_data')
-                    for student_rec in ocr_data:
-                        # Skip if we already know they don't exist (frontend shouldn't send them, but safety check)
-                        if not student_rec.get('db_exists', True): 
-                            continue
+            # Build every (student, subject, date) mark in memory first, then write them in bulk
+            rows = []
+            skipped = 0
+
+            if is_ocr:
+                ocr_data = request.data.get('ocr_data')
 
-                        roll_no = student_rec.get('roll_number')
-                        
-                        # Find Student
+                # Same roll number matching as the OCR validation step (one query at most)
+                resolver = roll_resolver.get_resolver()
+                matches = [resolver.resolve(student_rec.get('roll_number')) for student_rec in ocr_data]
+                # The index may be stale in this process: confirm the matches in one query
+                confirmed = roll_resolver.confirm_matches(
+                    {match['student_id']: match['roll_number'] for match in matches if match}
+                )
+
+                for student_rec, match in zip(ocr_data, matches):
+                    marks = student_rec.get('attendance', [])
+                    student_id = match['student_id'] if match else None
+
+                    # Skip if we already know they don't exist (frontend shouldn't send them, but safety check)
+                    if not student_rec.get('db_exists', True) or student_id not in confirmed:
+                        skipped += len(marks) * len(subject_ids)
+                        continue
+
+                    # Loop through Dates
+                    for att in marks:
                         try:
-                            student = StudentProfile.objects.get(roll_number__iexact=roll_no)
-                        except StudentProfile.DoesNotExist:
-                            try:
-                                student = StudentProfile.objects.get(roll_number__iexact=roll_no.replace(" ", ""))
-                            except StudentProfile.DoesNotExist:
-                                continue 
-
-                        # Loop through Dates
-                        for att in student_rec.get('attendance', []):
-                            try:
-                                date_str = att['date'].replace('/', '-')
-                                date_obj = datetime.strptime(date_str, '%d-%m-%Y').date()
-                                
-                                # Loop through Selected Subjects (Apply to ALL)
-                                for subject in subjects:
-                                    Attendance.objects.update_or_create(
-                                        student=student,
-                                        subject=subject,
-                                        date=date_obj,
-                                        defaults={'status': att['status'], 'teacher': teacher}
-                                    )
-                            except ValueError:
-                                continue
-                else:
-                    # Manual Mode Logic (Usually single subject, but let's support multi if needed)
-                    updates = request.data.get('updates')
-                    for update in updates:
-                        student = StudentProfile.objects.get(user_id=update['student_id'])
-                        for subject in subjects:
-                            Attendance.objects.update_or_create(
-                                student=student,
-                                subject=subject,
-                                date=update['date'],
-                                defaults={'status': update['status'], 'teacher': teacher}
-                            )
+                            date_str = att['date'].replace('/', '-')
+                            date_obj = datetime.strptime(date_str, '%d-%m-%Y').date()
+                        except (KeyError, ValueError):
+                            skipped += len(subject_ids)
+                            continue
+                        if att.get('status') not in attendance_writer.VALID_STATUSES:
+                            skipped += len(subject_ids)
+                            continue
+
+                        # Loop through Selected Subjects (Apply to ALL)
+                        for subject_id in subject_ids:
+                            rows.append((student_id, subject_id, date_obj, att['status'], teacher.pk))
+            else:
+                # Manual Mode Logic (Usually single subject, but let's support multi if needed)
+                updates = request.data.get('updates')
+                parsed = []
+                for update in updates:
+                    try:
+                        student_id = int(update['student_id'])
+                        date_obj = datetime.strptime(str(update['date']), '%Y-%m-%d').date()
+                    except (KeyError, TypeError, ValueError):
+                        skipped += len(subject_ids)
+                        continue
+                    parsed.append((student_id, date_obj, update.get('status')))
+
+                # One query to check every referenced student exists
+                known_students = set(
+                    StudentProfile.objects.filter(
+                        user_id__in={student_id for student_id, _, _ in parsed}
+                    ).values_list('user_id', flat=True)
+                )
+
+                for student_id, date_obj, status_val in parsed:
+                    if student_id not in known_students or status_val not in attendance_writer.VALID_STATUSES:
+                        skipped += len(subject_ids)
+                        continue
+
+                    for subject_id in subject_ids:
+                        rows.append((student_id, subject_id, date_obj, status_val, teacher.pk))
+
+            with transaction.atomic():
+                counts = attendance_writer.upsert_attendance(rows)
             
-            return Response({'message': 'Attendance updated successfully.'})
+            return Response({
+                'message': 'Attendance updated successfully.',
+                'inserted': counts['inserted'],
+                'updated': counts['updated'],
+                'unchanged': counts['unchanged'],
+                'skipped': skipped + counts['archived']
+            })
 
         except Exception as e:
             print(f"Error: {e}")
@@ -502,6 +894,42 @@ class BulkAttendanceUpdateView(APIView):
 
 
 
+# --- HELPER: Flag which OCR records match a student in the DB ---
+def validate_ocr_records(records):
+    # One query (or none, if the resolver is warm) for the whole sheet
+    resolver = roll_resolver.get_resolver()
+    enriched_records = []
+    unknown_students = []
+
+    for record in records:
+        roll_raw = (record.get('roll_number') or '').strip()
+
+        # Exact match ignoring case/spaces/dashes, or with OCR look-alikes (l -> 1, O -> 0) folded
+        match = resolver.resolve(roll_raw)
+        exists = match is not None
+
+        record['db_exists'] = exists # Add flag to response
+        if exists:
+            record['matched_roll_number'] = match['roll_number']
+        else:
+            # Close roll numbers the teacher can pick from
+            record['suggestions'] = [
+                {'roll_number': c['roll_number'], 'name': c['full_name'], 'score': c['score']}
+                for c in resolver.candidates(roll_raw)
+            ]
+
+        enriched_records.append(record)
+
+        if not exists:
+            unknown_students.append({
+                'roll_number': roll_raw,
+                'name': record.get('name'),
+                'suggestions': record['suggestions']
+            })
+
+    return enriched_records, unknown_students
+
+
 class ProcessAttendanceSheetView(APIView):
     permission_classes = [IsAuthenticated, IsTeacher]
 
@@ -510,44 +938,41 @@ class ProcessAttendanceSheetView(APIView):
             return Response({'error': 'No image provided'}, status=400)
 
         uploaded_file = request.FILES['image']
+        task_name = 'ANALYZE_ATTENDANCE_SHEET'
         
         try:
-            img = PIL.Image.open(uploaded_file)
-            
-            # 1. Get raw data from Gemini
-            result = gemini_service.call_gemini_api('ANALYZE_ATTENDANCE_SHEET', context={}, image=img)
-            
-            if "error" in result:
-                return Response(result, status=500)
+            # 1. Shrink the photo (rotate, grayscale, crop to grid, downscale)
+            # so both the upload to Gemini and the model call are cheaper.
+            sheet_bytes, image_stats = image_preprocessing.prepare_attendance_sheet(uploaded_file)
+            logger.debug("Sheet compacted: %s -> %s bytes (%s saved)",
+                         image_stats['original_bytes'], image_stats['processed_bytes'], image_stats['bytes_saved'])
 
-            # 2. VALIDATION LOGIC: Check which students exist in DB
-            enriched_records = []
-            unknown_students = []
+            # 2. Re-uploads of the same photo reuse the stored OCR result.
+            # Only the raw records are cached; db_exists is always recomputed below
+            # because students may have been added since the first upload.
+            cache_key = ocr_cache.build_cache_key(sheet_bytes, task_name)
+            records = ocr_cache.get_cached_records(cache_key, task_name)
+            cached = records is not None
 
-            for record in result.get('records', []):
-                roll_raw = record.get('roll_number', '').strip()
-                
-                # Try to find student (Case insensitive)
-                # We check if a profile exists with this roll number
-                exists = StudentProfile.objects.filter(roll_number__iexact=roll_raw).exists()
-                
-                # Fallback: try removing spaces
-                if not exists:
-                    exists = StudentProfile.objects.filter(roll_number__iexact=roll_raw.replace(" ", "")).exists()
+            if not cached:
+                # Get raw data from Gemini
+                image_blob = {'mime_type': 'image/jpeg', 'data': sheet_bytes}
+                result = gemini_service.call_gemini_api(task_name, context={}, image=image_blob)
 
-                record['db_exists'] = exists # Add flag to response
-                
-                enriched_records.append(record)
-                
-                if not exists:
-                    unknown_students.append({
-                        'roll_number': roll_raw,
-                        'name': record.get('name')
-                    })
+                if "error" in result:
+                    return Response(result, status=500)
+
+                records = result.get('records', [])
+                ocr_cache.store_records(cache_key, task_name, records)
+
+            # 3. VALIDATION LOGIC: Check which students exist in DB
+            enriched_records, unknown_students = validate_ocr_records(records)
 
             return Response({
                 'records': enriched_records,
-                'unknown_students': unknown_students
+                'unknown_students': unknown_students,
+                'cached': cached,
+                'image_stats': image_stats
             })
 
         except Exception as e:
@@ -681,12 +1106,10 @@ class RecognizeFaceView(APIView):
                 teacher = request.user.teacherprofile
                 today = datetime.now().date()
 
-                Attendance.objects.update_or_create(
-                    student=best_match,
-                    subject=subject,
-                    date=today,
-                    defaults={'status': 'present', 'teacher': teacher}
-                )
+                with transaction.atomic():
+                    attendance_writer.upsert_attendance([
+                        (best_match.pk, subject.id, today, 'present', teacher.pk)
+                    ])
 
                 return Response({
                     'status': 'success',
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -53,6 +54,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'attendance_app.middleware.QueryInstrumentationMiddleware', # Only active when REQUEST_PROFILING_SAMPLE_RATE > 0
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -168,4 +170,146 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
\ No newline at end of file
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Transient Gemini failures (unavailable, deadline exceeded, dropped connections) are retried this
+# many times with exponential backoff; any other error fails the call at once
+GEMINI_MAX_RETRIES = 2
+
+# A rate-limited call is retried after the wait Gemini asks for, unless it is longer than this (seconds)
+GEMINI_MAX_RETRY_AFTER = 10
+
+# USD per million tokens, used to estimate the cost of each call in the metrics
+GEMINI_PRICING = {
+    'models/gemini-2.5-pro': {'input_per_million': 1.25, 'output_per_million': 10.00},
+}
+
+# Number of recent Gemini calls kept in memory for the metrics endpoint
+GEMINI_METRICS_LOG_SIZE = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'attendance_app': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# How long an OCR result for an uploaded attendance sheet is reused for
+# identical re-uploads before Gemini is asked again.
+OCR_CACHE_TTL = timedelta(days=7)
+
+# Attendance sheet photos are downscaled so their longest edge is at most this many
+# pixels and re-encoded at this JPEG quality before OCR. ~2000px keeps handwriting legible.
+OCR_IMAGE_MAX_EDGE = 2000
+OCR_IMAGE_JPEG_QUALITY = 80
+
+# Pre-generated assessment questions. Each skill keeps QUESTION_BANK_TARGET_STOCK sets;
+# a set is retired after QUESTION_BANK_MAX_SERVES students have seen it, and the bank
+# is refilled in the background once fewer than QUESTION_BANK_MIN_STOCK sets remain.
+QUESTION_BANK_TARGET_STOCK = 5
+QUESTION_BANK_MIN_STOCK = 2
+QUESTION_BANK_MAX_SERVES = 20
+
+# Attendance marks are upserted in chunks of this many rows (one bulk INSERT ... ON CONFLICT each)
+ATTENDANCE_UPSERT_CHUNK_SIZE = 1000
+
+# The roll number -> student index used to validate OCR sheets is cached per process.
+# It is rebuilt on StudentProfile changes in this process, and at least this often (seconds)
+# to pick up changes made by other processes.
+ROLL_RESOLVER_TTL = 300
+# Maximum edit distance for suggesting a roll number that OCR got slightly wrong
+ROLL_FUZZY_MAX_DISTANCE = 2
+
+# Teacher and student dashboard payloads are cached per user and dropped whenever attendance,
+# enrolment or a profile they show changes (see services/dashboard_cache.py).
+# The file backend is shared by every worker process on the host, so an invalidation in one
+# worker is seen by all of them; a local-memory cache would only be safe with a single process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboards': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('DASHBOARD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'attendai_dashboards')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Attendance storage layout used by services/attendance_store.py:
+#   'rows'    - one Attendance row per student, subject and day
+#   'bitmask' - one AttendanceMonth row per student, subject and month (~30x fewer rows); the
+#               Attendance table is left empty
+# After switching to 'bitmask', run `python manage.py build_attendance_months` to move the existing
+# rows into months. To switch back, set 'rows' and run `build_attendance_months --restore-rows`; month
+# rows only keep their latest marker, so restored marks are attributed to that teacher. Periods can
+# only be archived (`archive_attendance`) in the 'rows' layout.
+ATTENDANCE_STORAGE = os.getenv('ATTENDANCE_STORAGE', 'rows')
+
+# Attendance register exports: the longest range one export may cover, and how many students'
+# marks are read per query while streaming (memory is bounded by batch size x days).
+ATTENDANCE_EXPORT_MAX_DAYS = 366
+ATTENDANCE_EXPORT_BATCH_SIZE = 200
+
+# CSV imports are written in chunks of this many rows, each chunk in its own transaction
+ATTENDANCE_IMPORT_CHUNK_SIZE = 5000
+
+# The import endpoint returns at most this many rejected rows; import_attendance writes them all to a file
+ATTENDANCE_IMPORT_MAX_REJECTS = 1000
+
+# At-risk analytics: a student/subject is flagged below this attendance percentage, when the last
+# 4 weeks are this many points worse than the 4 weeks before, or after this many absences in a row.
+AT_RISK_THRESHOLD = 75
+AT_RISK_DROP_POINTS = 10
+AT_RISK_ABSENCE_STREAK = 5
+
+# Low-attendance alert scanner: pairs with fewer marks than ALERT_MIN_MARKS are not judged yet,
+# marks are processed ALERT_SCAN_CHUNK_SIZE per transaction, and marks written in the last
+# ALERT_SCAN_LAG seconds are left for the next run (their transactions may still be open).
+ALERT_MIN_MARKS = 5
+ALERT_SCAN_CHUNK_SIZE = 5000
+ALERT_SCAN_LAG = 60
+
+# Delta sync for offline clients: changes per response, how long the change log is kept
+# (older cursors have to re-download the sheet), and how many seconds new changes are held
+# back so that ones from still-open transactions aren't skipped. The lag must be longer than the
+# longest transaction that writes attendance (a bulk update commits all its chunks at once).
+ATTENDANCE_SYNC_PAGE_SIZE = 500
+ATTENDANCE_SYNC_RETENTION_DAYS = 90
+ATTENDANCE_SYNC_LAG = 60
+
+# Offline submissions: the most operations one batch may carry, and how long batch/operation
+# idempotency keys are remembered (a replay older than that is applied again, and last-writer-wins
+# on each mark's client timestamp still keeps it from overwriting newer marks).
+ATTENDANCE_SUBMIT_MAX_OPERATIONS = 1000
+IDEMPOTENCY_KEY_RETENTION_DAYS = 30
+
+# Bulk student provisioning (`manage.py provision_students`): password hashes are computed in this
+# many worker processes. None uses every CPU core.
+PROVISIONING_HASH_WORKERS = None
+# The Subject admin action hashes in the request itself, at about 0.45 s per password (PBKDF2, one
+# core), so it takes at most this many students; larger intakes go through the management command.
+PROVISIONING_ADMIN_MAX_STUDENTS = 50
+
+# Per-request SQL instrumentation (attendance_app/middleware.py). A fraction of requests between 0 (off)
+# and 1 (every request) get a Server-Timing header; those slower than their view's threshold in ms
+# ('default' for the rest), or that run one statement REPEATED_QUERY_THRESHOLD times or more, are logged
+# to 'attendance_app.requests' with their REQUEST_PROFILING_TOP_QUERIES slowest statements.
+REQUEST_PROFILING_SAMPLE_RATE = float(os.getenv('REQUEST_PROFILING_SAMPLE_RATE', '0'))
+SLOW_REQUEST_MS = {
+    'default': 1000,
+    'ProcessAttendanceSheetView': 30000, # Gemini OCR
+    'AIEnhanceView': 30000,
+    'AssessmentStartView': 30000,
+    'RecognizeFaceView': 5000,
+    'RegisterFaceView': 5000,
+}
+REPEATED_QUERY_THRESHOLD = 10
+REQUEST_PROFILING_TOP_QUERIES = 3
+
+# Teacher approval inbox: approvals per page (also the largest ?limit= accepted).
+APPROVAL_INBOX_PAGE_SIZE = 25